@@ -60,7 +60,13 @@ class CCSParseClue(CCSThread):
 	def run(self):
 		self.updateStatus(STATUS.PROCESSING)
 		try:
-			solns = self.main.cp.parseClue(synonym_search_depth=self.main.slrSynSearchDepth.value(), **self.main.clueKwargs)
+			kwargs = dict(self.main.clueKwargs, synonym_search_depth=self.main.slrSynSearchDepth.value())
+			known_letters = kwargs.pop('known_letters')
+			# Keep solving the same clue through one session, so that adding known letters just narrows down the
+			#  previous solutions.
+			if self.main.session is None or not self.main.session.matches(**kwargs):
+				self.main.session = self.main.cp.session(**kwargs)
+			solns = self.main.session.solve(known_letters)
 		except SolutionLengthMismatchException:
 			self.updateStatus(STATUS.ERROR_SOLNMISMATCH)
 			return
@@ -86,6 +92,7 @@ class CCSMain(QtGui.QMainWindow):
 		super(CCSMain, self).__init__()
 		uic.loadUi('GUI/ccs.ui', self)
 		self.clueKwargs = {}
+		self.session = None
 		self.halt = False
 
 		# Setup the other threads.
@@ -272,8 +279,11 @@ def run():
 
 	app = QtGui.QApplication(sys.argv)
 	app.setWindowIcon(QtGui.QIcon('GUI/CCS.ico'))
-	_ = CCSMain()
-	sys.exit(app.exec_())
+	main = CCSMain()
+	status = app.exec_()
+	if getattr(main, 'cp', None) is not None:
+		main.cp.close()
+	sys.exit(status)
 
 if __name__ == '__main__':
 	run()
\ No newline at end of file
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+"""
+A small caching module, used to memoise the more expensive WordNet lookups.
+Caches evict their least recently used entries once either their entry budget or their (estimated) byte
+ budget is exceeded, and keep hit/miss/eviction counters so that their effectiveness can be monitored.
+A cache may optionally be backed by a persistent store, which is shared between runs and between processes.
+"""
+
+# Python libraries
+import sys
+import os
+import time
+import json
+import pickle  # module for reading/writing python objects from/to files
+import sqlite3
+import atexit
+import multiprocessing.util  # for flushing from worker processes, which skip atexit
+from collections import OrderedDict
+
+# Other CCS modules
+import log  # module for giving runtime feedback to the user
+
+__author__ = 'Jarek Glowacki'
+logger = log.getLogger(__name__)
+
+
+class LRUCache(object):
+	"""
+	A least-recently-used cache with a configurable entry and/or byte budget.
+	Behaves like a dict for lookups: a miss raises a KeyError, so callers can use the usual try/except pattern.
+	"""
+
+	def __init__(self, name, max_entries=None, max_bytes=None, backing=None):
+		self.name = name
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self.backing = backing  # optional PersistentStore to read through/write behind to
+		self._entries = OrderedDict()  # key -> (value, size in bytes)
+		self.bytes = 0
+		self.resetStats()
+
+	def __getitem__(self, key):
+		try:
+			value, _ = self._entries[key]
+		except KeyError:
+			if self.backing is not None:
+				try:
+					value = self.backing.get(self.name, key)
+				except KeyError:
+					pass
+				else:
+					self.backing_hits += 1
+					self._store(key, value)
+					return value
+			self.misses += 1
+			raise
+		self._entries.move_to_end(key)
+		self.hits += 1
+		return value
+
+	def __setitem__(self, key, value):
+		self._store(key, value)
+		if self.backing is not None:
+			self.backing.put(self.name, key, value)
+
+	def _store(self, key, value):
+		if key in self._entries:
+			self.bytes -= self._entries.pop(key)[1]
+		size = _sizeof(key) + _sizeof(value)
+		self._entries[key] = (value, size)
+		self.bytes += size
+		self._evict()
+
+	def __contains__(self, key):
+		return key in self._entries
+
+	def __len__(self):
+		return len(self._entries)
+
+	def _evict(self):
+		""" Drops least recently used entries until the cache is back within its budgets. """
+
+		while self._entries and ((self.max_entries is not None and len(self._entries) > self.max_entries) or
+					(self.max_bytes is not None and self.bytes > self.max_bytes)):
+			_, (_, size) = self._entries.popitem(last=False)
+			self.bytes -= size
+			self.evictions += 1
+
+	def resize(self, max_entries=None, max_bytes=None):
+		""" Changes the cache's budgets, evicting entries straight away if required. """
+
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self._evict()
+
+	def clear(self):
+		self._entries.clear()
+		self.bytes = 0
+		logger.debug('Cleared %s cache!' % self.name)
+
+	def resetStats(self):
+		self.hits = 0
+		self.backing_hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def stats(self):
+		""" Returns a snapshot of the cache's counters. """
+
+		lookups = self.hits + self.backing_hits + self.misses
+		return {'hits': self.hits,
+				  'backing_hits': self.backing_hits,
+				  'misses': self.misses,
+				  'evictions': self.evictions,
+				  'hit_rate': (self.hits + self.backing_hits) / lookups if lookups else 0.0,
+				  'entries': len(self._entries),
+				  'bytes': self.bytes}
+
+	def __repr__(self):
+		return '<%s %s cache: %i entries, %i bytes>' % (self.__class__.__name__, self.name, len(self._entries), self.bytes)
+
+
+class PersistentStore(object):
+	"""
+	An SQLite-backed store that caches can read through and write behind to.
+	Every entry is tagged with a version stamp, and only entries carrying the current stamp are ever returned,
+	 so results computed against an older wordlist/WordNet are never served.
+	The database runs in write-ahead-logging mode, so several processes can safely read it at the same time
+	 while one of them writes.
+	Writes are batched up, and go out once flush_every of them are pending or flush_interval seconds have passed
+	 since the last flush, as well as when the process exits.
+	Entries under other stamps are left alone (another process may yet be running against an older or newer
+	 wordlist), until the store gets restamped.
+	"""
+
+	def __init__(self, path, stamp, flush_every=500, flush_interval=5):
+		self.path = path
+		self.stamp = stamp
+		self.flush_every = flush_every
+		self.flush_interval = flush_interval
+		self._pending = []
+		self._flushed = time.monotonic()
+		self._conn = None
+		self._pid = None
+		with self._connection() as conn:
+			conn.execute('CREATE TABLE IF NOT EXISTS entries '
+							 '(stamp TEXT, cache TEXT, key TEXT, value BLOB, PRIMARY KEY (stamp, cache, key))')
+		atexit.register(self.close)
+
+	def _connection(self):
+		""" Returns an SQLite connection, opening a fresh one if this is a newly forked process. """
+
+		if self._conn is None or self._pid != os.getpid():
+			if self._pid is not None and self._pid != os.getpid():
+				# Connections must not be shared across a fork; drop (without closing) the inherited one, along with
+				#  any entries that the parent process is still due to write.
+				self._pending = []
+				# Forked (eg. pool worker) processes leave through os._exit, skipping atexit, but multiprocessing
+				#  runs its own finalisers first.
+				multiprocessing.util.Finalize(self, self.close, exitpriority=10)
+			self._conn = sqlite3.connect(self.path, timeout=60)
+			self._conn.execute('PRAGMA journal_mode=WAL')
+			self._pid = os.getpid()
+		return self._conn
+
+	def get(self, cache, key):
+		row = self._connection().execute('SELECT value FROM entries WHERE stamp=? AND cache=? AND key=?',
+													(self.stamp, cache, json.dumps(key))).fetchone()
+		if row is None:
+			raise KeyError(key)
+		return pickle.loads(row[0])
+
+	def put(self, cache, key, value):
+		self._connection()  # first, so that a newly forked process doesn't later drop this entry as inherited
+		self._pending.append((self.stamp, cache, json.dumps(key), pickle.dumps(value)))
+		if len(self._pending) >= self.flush_every or time.monotonic() - self._flushed >= self.flush_interval:
+			self.flush()
+
+	def flush(self):
+		""" Writes any pending entries out to the database. """
+
+		if not self._pending:
+			return
+		self._flushed = time.monotonic()
+		try:
+			with self._connection() as conn:
+				conn.executemany('INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?)', self._pending)
+		except sqlite3.OperationalError as e:
+			# Most likely another process is holding the write lock; hang on to the entries and retry later.
+			logger.warning('Unable to write to persistent cache \'%s\': %s' % (self.path, e))
+			return
+		self._pending = []
+
+	def restamp(self, stamp):
+		"""
+		Switches over to a new version stamp, discarding everything computed under the old one.
+		"""
+
+		self._pending = []
+		self.stamp = stamp
+		with self._connection() as conn:
+			conn.execute('DELETE FROM entries WHERE stamp != ?', (stamp,))
+		logger.debug('Persistent cache \'%s\' restamped: %s' % (self.path, stamp))
+
+	def close(self):
+		if self._conn is not None and self._pid == os.getpid():
+			self.flush()
+			self._conn.close()
+		self._conn = None
+
+
+###
+# Some auxiliary functions.
+###
+
+# Estimates the memory footprint of an object, including the contents of (non-nested) containers.
+def _sizeof(obj):
+	size = sys.getsizeof(obj)
+	if isinstance(obj, dict):
+		size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in obj.items())
+	elif isinstance(obj, (tuple, list, set, frozenset)):
+		size += sum(sys.getsizeof(x) for x in obj)
+	return size
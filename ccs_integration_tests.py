@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 
 import unittest
+import time
+import os
+import tempfile
 import pdb
 
 from clue_parser import ClueParser
 from clue import Clue
+from stats import ParseStats
+from exceptions import UnsupportedClueException
 
 class IntegrationTests(unittest.TestCase):
 	"""
@@ -15,7 +20,7 @@ class IntegrationTests(unittest.TestCase):
 
 	@classmethod
 	def setUpClass(cls):
-		cls.cp = ClueParser()
+		cls.cp = ClueParser(cost_model_path=None)  # so that earlier runs can't change the order checks are tried in
 
 	###
 	# Tests determining whether the solver solves some basic cryptic clues as expected.
@@ -143,6 +148,91 @@ class IntegrationTests(unittest.TestCase):
 		self.assertEqual('deaf', s.solution, 'Wrong solution found at first position!')
 		self.assertEqual('final', s.typ, 'Wrong wordplay type applied!')
 
+	###
+	# Tests determining whether streamed solutions match those returned all at once.
+	###
+
+	def test_clueStreaming(self):
+		streamed = list(self.cp.iterParseClue('Book in Habib Lew\'s handbag.'))
+		self.assertGreater(len(streamed), 0, 'Should find at least one solution!')
+		self.assertEqual('run', streamed[0][0].typ, 'Cheap wordplays should be tried first!')
+		self.assertEqual('bible', streamed[-1][1].solution, 'Wrong best solution at end of stream!')
+		s = self.cp.parseClue('Book in Habib Lew\'s handbag.')
+		self.assertEqual(sorted(x.solution for x, _ in streamed), sorted(x.solution for x in s), 'Streamed solutions differ!')
+
+	def test_streamingConsumerIsNotTimedAsScoring(self):
+		stats = ParseStats()
+		num = 0
+		for _ in self.cp.iterParseClue('Book in Habib Lew\'s handbag.', stats=stats):
+			time.sleep(0.02)  # a slow consumer
+			num += 1
+		self.assertLess(stats.scoring_time, 0.02 * num, 'Time spent by the consumer was booked as scoring!')
+
+	def test_clueTopK(self):
+		s = self.cp.parseClue('Rip lunch, last supper!', 4)
+		for k in [1, 3]:
+			top = self.cp.parseClue('Rip lunch, last supper!', 4, top_k=k)
+			self.assertEqual([(x.solution, x.certainty) for x in s[:k]], [(x.solution, x.certainty) for x in top],
+								  'Top-k solutions should match the top of the full list!')
+
+	def test_clueTimeBudget(self):
+		start = time.monotonic()
+		s, stats = self.cp.parseClue('Initially babies are naked.', 4, budget_ms=1, stats=True)
+		self.assertLess(time.monotonic() - start, 1, 'Time budget should bound the time taken!')
+		self.assertEqual(stats.timeouts, 1, 'Time budget should have run out!')
+
+	def test_slowClueKeepsToTimeBudget(self):
+		self.cp.preload()  # loading isn't part of solving, so it doesn't get timed
+		for clue in ['Seven players step around the course on tiptoe (6)', 'Drunk but not starting some gambling (5)']:
+			start = time.monotonic()
+			s, stats = self.cp.parseClue(clue, budget_ms=100, stats=True)
+			self.assertLess(time.monotonic() - start, 0.13, 'Time budget overrun on \'%s\'!' % clue)
+			self.assertEqual(stats.timeouts, 1, 'Time budget should have run out!')
+
+	def test_clueSession(self):
+		session = self.cp.session('Zoroastrian pairs dancing. (5)')
+		session.solve()
+		for known_letters in ['p????', 'pa???', 'pa??i']:
+			s = self.cp.parseClue('Zoroastrian pairs dancing. (5)', known_letters=known_letters)
+			self.assertEqual([(x.solution, x.certainty) for x in s], [(x.solution, x.certainty) for x in session.solve(known_letters)],
+								  'Narrowed solutions should match solving afresh!')
+		self.assertEqual('parsi', session.solve('pa??i')[0].solution, 'Wrong solution found at first position!')
+		self.assertEqual((4, 1), (session.narrowed, session.recomputed), 'Adding letters should only narrow the solutions!')
+		session.solve('pb???')
+		self.assertEqual(2, session.recomputed, 'Changing a letter should solve the clue afresh!')
+		self.assertRaises(TypeError, self.cp.session, 'Zoroastrian pairs dancing. (5)', top_k=3)
+
+	###
+	# Tests determining whether batches of clues are solved correctly across worker processes.
+	###
+
+	def test_clueBatchParsing(self):
+		clues = ['Book in Habib Lew\'s handbag.', 'Random clue. (3,5)', {'clue': 'A pint makes colour.', 'length': 5}]
+		results = list(self.cp.parseClues(clues, workers=2))
+		self.assertEqual([0, 1, 2], [i for i, _ in results], 'Results should come back in input order!')
+		self.assertEqual('bible', results[0][1][0].solution, 'Wrong solution found at first position!')
+		self.assertIsInstance(results[1][1], UnsupportedClueException, 'Unsupported clue should be reported, not raised!')
+		self.assertEqual('paint', results[2][1][0].solution, 'Wrong solution found at first position!')
+
+	def test_clueBatchParsingUnordered(self):
+		clues = ['Guide graphite', 'Book in Habib Lew\'s handbag.']
+		results = dict(self.cp.parseClues(clues, workers=2, ordered=False))
+		self.assertEqual({0, 1}, set(results), 'Every clue should get a result!')
+		self.assertEqual('bible', results[1][0].solution, 'Wrong solution found at first position!')
+
+	def test_costModelCarriesOver(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			path = os.path.join(tmp, 'costs.json')
+			cp = ClueParser(cost_model_path=path)
+			cp.parseClue('Rip lunch, last supper!', 4)
+			cp.close()
+			self.assertEqual(cp.cost_model.time, ClueParser(cost_model_path=path).cost_model.time,
+								  'The next parser should pick up the learnt costs!')
+			# Pool workers learn from their own clues, and save what they've learnt as they exit.
+			os.remove(path)
+			list(ClueParser(cost_model_path=path).parseClues(['Guide graphite'], workers=1))
+			self.assertTrue(os.path.exists(path), 'Pool workers should save their learnt costs!')
+
 # If this script is executed directly, it will run its test!
 if __name__ == "__main__":
 	# Supposedly the unittest library has a bug where it throws resource warnings
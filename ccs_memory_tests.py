@@ -0,0 +1,42 @@
+__author__ = 'Jarek Glowacki'
+"""
+Reports how much memory each extra worker process adds, with and without the shared (forked) worker pool.
+Resident set size (RSS) counts shared pages in full for every process that maps them, so it overstates the
+ cost of a forked worker. The figures to go by are:
+	-USS: memory private to the worker, ie. what it really adds
+	-PSS: RSS with each shared page split evenly between the processes sharing it
+Linux only, as the figures are read from /proc.
+"""
+import multiprocessing
+from clue_parser import ClueParser, _solveInWorker
+###################################################
+
+WORKER_COUNTS = [1, 2, 4]
+CLUES = ['Book in Habib Lew\'s handbag.', 'A pint makes colour. (5)', 'Guide graphite',
+			'First male orphan on Io. (4)', 'Purchased Game of Thrones, initially. (3)']
+
+# Returns the given process's memory usage in MB, as read from /proc.
+def memoryUsage(pid):
+	fields = {}
+	with open('/proc/%i/smaps_rollup' % pid, 'r') as f:
+		for line in f:
+			parts = line.split()
+			if len(parts) == 3 and parts[2] == 'kB':
+				fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+	return {'rss': fields['Rss'], 'pss': fields['Pss'], 'uss': fields['Private_Clean'] + fields['Private_Dirty']}
+
+if __name__ == '__main__':
+	cp = ClueParser()
+	for shared in [True, False]:
+		print('%s workers:' % ('Shared (forked)' if shared else 'Independent (spawned)'))
+		totals = {}
+		for workers in WORKER_COUNTS:
+			with cp.openPool(workers, shared) as pool:
+				# Give every worker a few clues to chew through, so that its working set is realistic.
+				list(pool.imap_unordered(_solveInWorker, [(i, {'clue': c}) for i, c in enumerate(CLUES * workers)]))
+				usage = [memoryUsage(p.pid) for p in multiprocessing.active_children()]
+			totals[workers] = sum(u['pss'] for u in usage)
+			print('\t%i worker(s): per worker RSS %.0fMB, PSS %.0fMB, USS %.0fMB; total worker PSS %.0fMB' % (
+					workers, *[sum(u[k] for u in usage) / len(usage) for k in ['rss', 'pss', 'uss']], totals[workers]))
+		growth = (totals[WORKER_COUNTS[-1]] - totals[WORKER_COUNTS[0]]) / (WORKER_COUNTS[-1] - WORKER_COUNTS[0])
+		print('\tPSS growth per extra worker: %.0fMB' % growth)
@@ -1,26 +1,42 @@
 # -*- coding: utf-8 -*-
 """
-Reads in a set of puzzles from the downloaded smh puzzles (motherlode) archive,
- parses them, and then feeds the clues one by one into the CCS to test its strength.
-Note that this does not take advantage of solved clues to gain hints on unsolved clues;
- the purpose is merely to test the success rate of solving clues individually.
-The first three solutions output from the CCS are matched against the true solution,
- with the resulting statistics logged at the end.
+Takes a set of puzzles from the clue corpus (see corpus.py), which is extracted from the downloaded smh
+ puzzles (motherlode) archive, and feeds their clues one by one into the CCS to test its strength.
+Note that by default this does not take advantage of solved clues to gain hints on unsolved clues;
+ the purpose is merely to test the success rate of solving clues individually. With --grid, each puzzle is
+ instead solved as a whole (see puzzle_solver.py), so that answers can lend their letters to crossing clues.
+For each clue, the wall time taken, the number of candidate solutions generated and the rank at which
+ the true solution appears among them are recorded, and summarised at the end as accuracy figures
+ alongside latency percentiles.
 Note also that clues that hint at multi-word answers are skipped and not included in the score,
  however clues like 'See 7 across' have yet to be weeded out at this stage.
 A score of 100% is not possible, as these puzzles contain clue types that the CCS does not and
  will not handle, however running this module several times during development and comparing
  the runs should give a rough indication of what progress has been made.
+
+Puzzles are sharded across a pool of worker processes. Each puzzle's results are appended to the results
+ file as soon as it is finished, so an interrupted run picks up where it left off when restarted.
+Usage:
+	py ccs_performance_tests.py [--workers N] [--max-files N] [--sample N [--seed S]] [--grid] [--results FILE] [--restart] [--summary]
 """
 # TODO: Weed out 'See 7 across' type clues.
 
 # Python libraries
-import glob  # library for retrieving file name lists from directories
+import os
+import json
+import time
+import random
+import functools
+import argparse
 import pdb  # live debugging module
 import numpy as np  # numerical module for cleaner mutlidimensional array use
 
 # Other CCS modules
+import clue_parser
 from clue_parser import ClueParser
+from puzzle_solver import PuzzleSolver
+import corpus  # the clue corpus extracted from the puzzle archive
+import wordnet # custom wrapper around NLTK WordNet
 from exceptions import *  # custom CCS exceptions
 import log  # module for giving runtime feedback to the user
 
@@ -29,86 +45,196 @@ __author__ = "Jarek Glowacki"
 logger = log.getLogger(__name__, streamLevel=log.INFO)
 
 ###
-# The below code is somewhat messy as it is not a part of the program, nor is it a unit/integration test
-#  that needs to be run after any change. It's purpose is merely to get a rough idea of how many clues
-#  the program can solve from a huge clue pool. BEWARE: Takes hours to finish!
+# The below code is not a part of the program, nor is it a unit/integration test that needs to be run
+#  after any change. It's purpose is merely to get a rough idea of how many clues the program can solve
+#  from a huge clue pool. BEWARE: Takes hours to finish (divided by the number of workers)!
 ###
 
-MAX_FILES_TO_READ = 2000  # 1662 entries in current archive => 38621 clues.
-PUZZLE_PATH = 'smh/'
-GRID_LEN = 15
-GRID_SIZE = GRID_LEN * GRID_LEN
-
-BLACK = '.'
-numRead = 0
-numAttempted = 0
-numCorrect = [0, 0, 0]  # first guess, second guess, third guess
-
-cp = ClueParser()
-
-for filename in glob.glob(PUZZLE_PATH + '*.puz'):
-	# Open the file, ignoring encoding conversion errors.
-	with open(filename, errors='ignore') as f:
-		text = f.read().split('\x00')
-	offset = 0
-	while len(text[8 + offset]) < GRID_SIZE:
-		offset += 1
-	solved = text[8 + offset][0:GRID_SIZE]
-	solvedGrid = np.array([list(solved[i:i + GRID_LEN]) for i in range(0, GRID_SIZE, GRID_LEN)])
-	# unsolved = text[8][GRID_SIZE:GRID_SIZE*2]
-	clues = [clue for clue in text[11 + offset:]]
-	# for i in range(0, GRID_SIZE, GRID_LEN):
-	#	print(solved[i:i+GRID_LEN])
-	#for i in range(0, GRID_SIZE, GRID_LEN):
-	#	print(unsolved[i:i+GRID_LEN])
-	solns = []
-	for i in range(0, GRID_LEN):
-		for j in range(0, GRID_LEN):
-			if solvedGrid[i, j] == BLACK:
-				continue
-			# Start of a horizontal word?
-			if j == 0 or solvedGrid[i, j - 1] == BLACK:
-				# Scan across to find its end
-				k = j
-				while k < GRID_LEN and solvedGrid[i, k] != BLACK:
-					k += 1
-				if k - j > 1:
-					solns.append(''.join(solvedGrid[i, j:k]))
-			# Start of a vertical word?
-			if i == 0 or solvedGrid[i - 1, j] == BLACK:
-				# Scan down to find its end
-				k = i
-				while k < GRID_LEN and solvedGrid[k, j] != BLACK:
-					k += 1
-				if k - i > 1:
-					solns.append(''.join(solvedGrid[i:k, j]))
-
-	#print('*'*30 + filename[-6:-4] + '*'*30)
-	for i in range(len(solns)):
-		logger.debug('Running clue: %s = %s' % (clues[i], solns[i]))
+MAX_FILES_TO_READ = 2000  # 1662 puzzles in current archive => 48522 clues, 38624 of them single words.
+RESULTS_PATH = 'CCS_benchmark.jsonl'
+MAX_RANK = 3  # how many of the top guesses get a line of their own in the summary
+
+_CORPUS = None
+
+
+def getCorpus():
+	"""
+	Returns the clue corpus, opening it on first use. Forked workers inherit the parent's (memory-mapped) one.
+	"""
+
+	global _CORPUS
+	if _CORPUS is None:
+		_CORPUS = corpus.Corpus()
+	return _CORPUS
+
+def solvePuzzle(puzzle, grid=False):
+	"""
+	Runs every clue of a puzzle through the worker's ClueParser. Returns the puzzle's results record.
+	"""
+
+	cp = clue_parser.workerParser() or ClueParser()
+	if grid:
+		return solveGrid(cp, puzzle)
+	records = []
+	for entry in getCorpus().puzzle(puzzle):
+		clue, soln = entry.clue, entry.answer
+		logger.debug('Running clue: %s = %s' % (clue, soln))
+		record = {'clue': clue, 'solution': soln, 'time': None, 'candidates': None, 'accepted': None, 'solutions': None,
+					 'rank': None}
+		start = time.perf_counter()
 		try:
-			result = cp.parseClue(clues[i])
+			result, stats = cp.parseClue(clue, stats=True)
 		except UnsupportedClueException:
 			logger.debug('Unsupported solution type.')
-			continue
-		numAttempted += 1
-		for guessNo in range(3):
-			try:
-				logger.debug('Guess #%i: %s (certainty: %s)' % (guessNo+1, result[guessNo].solution.upper(), result[guessNo].certainty))
-				if result[guessNo].solution.upper() == solns[i]:
-					numCorrect[guessNo] += 1
-					break # This is important, else other solutions with same string will artificially inflate the count.
-			except IndexError:
-				break
-
-	numRead += 1
-	if numRead >= MAX_FILES_TO_READ:
-		break
-
-logger.info('Attempted crossword clues from %i crosswords.' % numRead)
-(a,b) = (numCorrect[0], numAttempted)
-logger.info('Clues guessed correctly on first attempt: %i/%i (%.2f%%)' % (a, b, a/b * 100))
-(a,b) = (numCorrect[1], numAttempted - numCorrect[0])
-logger.info('Clues guessed correctly on second attempt: %i/%i (%.2f%%)' % (a, b, a/b * 100))
-(a,b) = (numCorrect[2], numAttempted - numCorrect[0] - numCorrect[1])
-logger.info('Clues guessed correctly on third attempt: %i/%i (%.2f%%)' % (a, b, a/b * 100))
\ No newline at end of file
+			record['status'] = 'unsupported'
+		except Exception as e:
+			logger.warning('Failed to parse clue \'%s\': %r' % (clue, e))
+			record['status'] = 'error'
+		else:
+			record['status'] = 'attempted'
+			record['time'] = time.perf_counter() - start
+			# The search effort: candidates generated by the wordplays (and brute forcing), and how many fit the clue.
+			record['candidates'] = sum(stats.candidates.values())
+			record['accepted'] = sum(stats.accepted.values())
+			record['solutions'] = len(result)
+			# Other solutions with the same string mustn't count, so take the first match only.
+			record['rank'] = next((rank for rank, s in enumerate(result, 1) if s.solution.upper() == soln), None)
+		records.append(record)
+	return {'puzzle': puzzle, 'clues': records}
+
+def solveGrid(cp, puzzle):
+	"""
+	Solves a puzzle as a whole. As its clues aren't solved one at a time, only the puzzle as a whole is timed, and
+	 the candidates generated aren't counted per clue either.
+	"""
+
+	entries = getCorpus().puzzle(puzzle)
+	start = time.perf_counter()
+	try:
+		results = PuzzleSolver(cp).solve(entries)
+	except Exception as e:
+		logger.warning('Failed to solve puzzle \'%s\': %r' % (puzzle, e))
+		results = None
+	elapsed = time.perf_counter() - start
+	records = []
+	for i, entry in enumerate(entries):
+		record = {'clue': entry.clue, 'solution': entry.answer, 'time': None, 'candidates': None, 'accepted': None,
+					 'solutions': None, 'rank': None}
+		result = results[i] if results is not None else None
+		if results is None:
+			record['status'] = 'error'
+		elif result is None:
+			record['status'] = 'unsupported'
+		else:
+			record['status'] = 'attempted'
+			record['solutions'] = len(result)
+			record['rank'] = next((rank for rank, s in enumerate(result, 1) if s.solution.upper() == entry.answer), None)
+		records.append(record)
+	return {'puzzle': puzzle, 'clues': records, 'time': elapsed}
+
+def readResults(path):
+	"""
+	Reads back the results checkpointed so far, as a {puzzle: record} dict.
+	A final line left half-written by an interrupted run is ignored.
+	"""
+
+	results = {}
+	try:
+		with open(path, 'r') as f:
+			for line in f:
+				try:
+					record = json.loads(line)
+				except ValueError:
+					logger.warning('Ignoring incomplete results line in %s.' % path)
+					continue
+				results[record['puzzle']] = record
+	except FileNotFoundError:
+		pass
+	return results
+
+def run(workers=None, max_files=MAX_FILES_TO_READ, path=RESULTS_PATH, restart=False, sample=None, seed=None, grid=False):
+	"""
+	Solves every puzzle (among the first max_files, or a random sample of them) that doesn't have results yet,
+	 appending each one's results to the results file.
+	"""
+
+	if restart and os.path.exists(path):
+		os.remove(path)
+	puzzles = list(getCorpus().puzzles)[:max_files]
+	if sample is not None:
+		puzzles = sorted(random.Random(seed).sample(puzzles, min(sample, len(puzzles))))
+	done = readResults(path)
+	todo = [p for p in puzzles if p not in done]
+	logger.info('%i of %i puzzles already done; solving the remaining %i.' % (len(puzzles) - len(todo), len(puzzles), len(todo)))
+	if not todo:
+		return
+
+	cp = ClueParser()
+	# Share similarity/synonym results with previous runs of this script.
+	wordnet.enablePersistentCache()
+	start = time.time()
+	with cp.openPool(workers) as pool, open(path, 'a') as f:
+		for num, record in enumerate(pool.imap_unordered(functools.partial(solvePuzzle, grid=grid), todo), 1):
+			f.write(json.dumps(record) + '\n')
+			f.flush()
+			os.fsync(f.fileno())
+			elapsed = time.time() - start
+			logger.info('Finished %s (%i/%i, ~%.0fs remaining).' % (record['puzzle'], num, len(todo), elapsed / num * (len(todo) - num)))
+		# Let the workers exit by themselves, so that they write out their persistent cache entries.
+		pool.close()
+		pool.join()
+
+def summarise(path=RESULTS_PATH):
+	"""
+	Logs accuracy and latency statistics over all results in the results file.
+	"""
+
+	results = readResults(path)
+	clues = [c for record in results.values() for c in record['clues']]
+	attempted = [c for c in clues if c['status'] == 'attempted']
+	logger.info('Attempted %i of %i crossword clues from %i crosswords (%i unsupported, %i errors).' % (
+			len(attempted), len(clues), len(results), sum(c['status'] == 'unsupported' for c in clues),
+			sum(c['status'] == 'error' for c in clues)))
+	if not attempted:
+		return
+
+	ranks = [c['rank'] for c in attempted]
+	remaining = len(ranks)
+	for rank in range(1, MAX_RANK + 1):
+		a = ranks.count(rank)
+		logger.info('Clues guessed correctly on attempt #%i: %i/%i (%.2f%%)' % (rank, a, remaining, a/remaining * 100 if remaining else 0))
+		remaining -= a
+	a = sum(r is not None and r <= MAX_RANK for r in ranks)
+	logger.info('Clues guessed correctly within top %i: %i/%i (%.2f%%)' % (MAX_RANK, a, len(ranks), a/len(ranks) * 100))
+	a = sum(r is not None for r in ranks)
+	logger.info('Clues with the solution anywhere among the candidates: %i/%i (%.2f%%)' % (a, len(ranks), a/len(ranks) * 100))
+
+	# Clues solved as part of a whole grid aren't timed individually, only their puzzles are.
+	for unit, times in [('clue', [c['time'] for c in attempted if c['time'] is not None]),
+							  ('puzzle', [r['time'] for r in results.values() if r.get('time') is not None])]:
+		if times:
+			times = np.array(times) * 1000
+			p50, p95, p99 = np.percentile(times, [50, 95, 99])
+			logger.info('Time per %s: mean %.0fms, p50 %.0fms, p95 %.0fms, p99 %.0fms, max %.0fms' % (unit, times.mean(), p50, p95, p99, times.max()))
+	# Results from before these were all recorded (or from grid runs, for the candidates) lack some of them.
+	for field, label in [('candidates', 'Candidates generated'), ('accepted', 'Candidates accepted'), ('solutions', 'Solutions')]:
+		counts = np.array([c[field] for c in attempted if c.get(field) is not None])
+		if len(counts):
+			logger.info('%s per clue: mean %.1f, p50 %.0f, p95 %.0f, max %i' % (
+					label, counts.mean(), *np.percentile(counts, [50, 95]), counts.max()))
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Benchmarks the CCS against the SMH puzzle archive.')
+	parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: one per CPU core)')
+	parser.add_argument('--max-files', type=int, default=MAX_FILES_TO_READ, help='maximum number of puzzles to read')
+	parser.add_argument('--sample', type=int, default=None, help='only solve this many puzzles, picked at random')
+	parser.add_argument('--seed', type=int, default=None, help='random seed for --sample')
+	parser.add_argument('--grid', action='store_true', help='solve each puzzle as a whole (best given its own --results file)')
+	parser.add_argument('--results', default=RESULTS_PATH, help='file to checkpoint results to')
+	parser.add_argument('--restart', action='store_true', help='discard previous results instead of resuming')
+	parser.add_argument('--summary', action='store_true', help='only summarise the results collected so far')
+	args = parser.parse_args()
+	if not args.summary:
+		run(args.workers, args.max_files, args.results, args.restart, args.sample, args.seed, args.grid)
+	summarise(args.results)
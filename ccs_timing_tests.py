@@ -1,71 +1,205 @@
 __author__ = 'Jarek Glowacki'
-import timeit
+"""
+Microbenchmarks for the hot paths of the CCS.
+Each benchmark is run for a number of rounds; every round first runs the benchmark's (untimed) setup, which
+ for the 'cold' benchmarks empties the lookup caches, then times a number of calls. The median time per call
+ over the rounds is what gets compared between runs.
+Usage:
+	py ccs_timing_tests.py run [-o RESULTS] [-k SUBSTRING]
+		Runs the benchmarks (optionally only those whose names contain SUBSTRING), writing the results to a
+		 JSON file (CCS_timing.json by default). Keep a copy of a run as the baseline to compare against.
+	py ccs_timing_tests.py compare BASELINE RESULTS [--threshold 0.25]
+		Compares two result files, exiting with a non-zero status if any benchmark's median time grew by more
+		 than the threshold (a fraction of the baseline time).
+"""
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from collections import OrderedDict
 import numpy as np
 ###################################################
-function = 'wordnet.exists'
-setup = """
-import wordnet
 
-def test():
-	wordnet.exists('troubadour')
-"""
-repetitions = 1000000
-print("Average time to execute function '%s' is %.3fus" % (function, np.mean(timeit.Timer('test()', setup=setup).repeat(10, repetitions))/repetitions*1000000))
-###################################################
+RESULTS_PATH = 'CCS_timing.json'
+DEFAULT_THRESHOLD = 0.25
 
-function = 'wordnet.calcSimilarity'
-setup = """
-import wordnet
+BENCHMARKS = OrderedDict()
+def benchmark(name, rounds=10, number=1, setup=None):
+	""" Registers the decorated function as a benchmark. """
 
-def test():
-	wordnet.calcSimilarity('troubadour', 'valkyrie')
-"""
-repetitions = 10000
-print("Average time to execute function '%s' is %.3fms" % (function, np.mean(timeit.Timer('test()', setup=setup).repeat(repetitions, 1))*1000))
-###################################################
+	def register(fn):
+		BENCHMARKS[name] = (fn, rounds, number, setup)
+		return fn
+	return register
 
-function = 'wordnet.getSynonyms'
-setup = """
-import wordnet
+def measure(fn, rounds, number, setup=None):
+	""" Returns the time per call of each round, in seconds. """
+
+	times = []
+	for _ in range(rounds):
+		if setup is not None:
+			setup()
+		start = time.perf_counter()
+		for _ in range(number):
+			fn()
+		times.append((time.perf_counter() - start) / number)
+	return times
 
-def test():
-	wordnet.getSynonyms('parsnip')
+###################################################
+# Startup has to be timed in fresh processes, as module imports only ever happen once per process.
+
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import clue_parser
+clue_parser.ClueParser()
+print(time.perf_counter() - start)
 """
-repetitions = 1000000
-print("Average time to execute function '%s' is %.3fus" % (function, np.mean(timeit.Timer('test()', setup=setup).repeat(repetitions, 1))*1000000))
+@benchmark('startup', rounds=5)
+def startup():
+	subprocess.check_output([sys.executable, '-c', STARTUP_SCRIPT], stderr=subprocess.DEVNULL)
+
 ###################################################
+# Everything else runs against this process's (fully loaded) parser.
 
-function = 'wordnet.getAbbreviations'
-setup = """
 import wordnet
+from clue_parser import ClueParser
+cp = None
+
+def clearCaches():
+	wordnet.clearCaches()
 
-def test():
+@benchmark('wordnet.exists', number=100000)
+def exists():
+	wordnet.exists('troubadour')
+
+@benchmark('wordnet.calcSimilarity (cold)', rounds=50, setup=clearCaches)
+def calcSimilarityCold():
+	wordnet.calcSimilarity('troubadour', 'valkyrie')
+
+@benchmark('wordnet.calcSimilarity (warm)', number=100000)
+def calcSimilarityWarm():
+	wordnet.calcSimilarity('troubadour', 'valkyrie')
+
+for depth in [1, 2, 3]:
+	benchmark('wordnet.getSynonyms (depth %i)' % depth, rounds=20, setup=clearCaches)(
+			lambda depth=depth: wordnet.getSynonyms('parsnip', depth))
+
+@benchmark('wordnet.getAbbreviations', number=100000)
+def getAbbreviations():
 	wordnet.getAbbreviations('tungsten')
-"""
-repetitions = 1000000
-print("Average time to execute function '%s' is %.3fus" % (function, np.mean(timeit.Timer('test()', setup=setup).repeat(repetitions, 1))*1000000))
-###################################################
 
-function = 'wordnet.getWordsWithPattern'
-setup = """
-import wordnet
+@benchmark('wordnet.getWordsWithPattern (known letters)', rounds=20, number=10)
+def getWordsWithPattern():
+	wordnet.getWordsWithPattern('\\A[a-z][a-z][a-z]i[a-z]a\\Z')
+
+@benchmark('wordnet.getWordsWithPattern (regex scan)', rounds=5)
+def getWordsWithPatternScan():
+	wordnet.getWordsWithPattern('\\A[a-z]+ia\\Z')
+
+@benchmark('AnagramWordplay.getPlay', number=10000)
+def anagramGetPlay():
+	cp.wordplays['anagram'].getPlay('pots')
+
+@benchmark('AnagramWordplay.getPartialPlay', number=100)
+def anagramGetPartialPlay():
+	cp.wordplays['anagram'].getPartialPlay('carthorse', spare=None, length=5)
+
+@benchmark('RunWordplay.getPlay', number=1000)
+def runGetPlay():
+	cp.wordplays['run'].getPlay(['book', 'in', 'habib', 'lews', 'handbag'])
+
+@benchmark('CharadeWordplay.getPlay', rounds=10, setup=clearCaches)
+def charadeGetPlay():
+	cp.wordplays['charade'].getPlay(['first', 'male'], ['orphan', 'on', 'io'], 4, cp.wordplays)
+
+# The clues from the integration tests, solved from scratch (ie. with empty caches).
+CLUES = [
+	('bible', "Book in Habib Lew's handbag.", {}),
+	('chariot', 'Punch a Rio Tinto official; find transport. (7)', {}),
+	('paint', 'A pint makes colour.', {'length': 5}),
+	('daily', 'Frida, ILY - said Tom, holding a newspaper.', {'typ': 'run'}),
+	('lead', 'Guide graphite', {}),
+	('chapel', 'House of God in Sencha Pellegrini bar. (6)', {}),
+	('obsolete', 'In job, sole technician, dated.', {'length': 8}),
+	('parsi', 'Zoroastrian pairs dancing.', {'typ': 'anagram'}),
+	('shed', 'Exuviate garage.', {}),
+	('mat', 'First man at carpet.', {'length': 3}),
+	('bare', 'Initially babies are naked.', {'length': 4}),
+	('hammocks', 'Prosciutto teases beds.', {'length': 8}),
+	('tear', 'Rip lunch, last supper!', {'length': 4}),
+	('moon', 'First male orphan on Io. (4)', {}),
+	('got', 'Purchased Game of Thrones, initially. (3)', {}),
+	('deaf', 'Finally purchased Game Arena of hard of hearing. (4)', {'known_letters': '???F'}),
+]
+for name, clue, kwargs in CLUES:
+	benchmark('parseClue (%s)' % name, rounds=3, setup=clearCaches)(
+			lambda clue=clue, kwargs=kwargs: cp.parseClue(clue, **kwargs))
 
-def test():
-	wordnet.getWordsWithPattern('\A[a-z][a-z][a-z]i[a-z]a\Z')
-"""
-repetitions = 10
-print("Average time to execute function '%s' is %.3fms" % (function, np.mean(timeit.Timer('test()', setup=setup).repeat(repetitions, 1))*1000))
 ###################################################
 
-function = 'wordplay.getAnagrams'
-setup = """
-from clue_parser import ClueParser
-cp = ClueParser()
-ana = cp.wordplays['anagram']
+def run(path=RESULTS_PATH, only=None):
+	global cp
+	# Keep the logging out of the way (and out of the timings).
+	import logging
+	logging.disable(logging.INFO)
+	cp = ClueParser()
+	cp.preload()
+	results = OrderedDict()
+	for name, (fn, rounds, number, setup) in BENCHMARKS.items():
+		if only is not None and only not in name:
+			continue
+		times = measure(fn, rounds, number, setup)
+		results[name] = {'median': float(np.median(times)), 'min': min(times), 'mean': float(np.mean(times)),
+							  'rounds': rounds, 'number': number}
+		print('%-50s %s' % (name, formatTime(results[name]['median'])))
+	with open(path, 'w') as f:
+		json.dump({'python': platform.python_version(), 'platform': platform.platform(),
+					  'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'benchmarks': results}, f, indent=1)
+	print('Results written to %s' % path)
 
-def test():
-	ana.getPlay('pots')
-"""
-repetitions = 100000
-print("Average time to execute function '%s' is %.3fus" % (function, np.mean(timeit.Timer('test()', setup=setup).repeat(10, repetitions))/repetitions*1000000))
-###################################################
\ No newline at end of file
+def compare(baseline_path, results_path, threshold=DEFAULT_THRESHOLD):
+	""" Prints a comparison of two result files, returning the names of the benchmarks that regressed. """
+
+	with open(baseline_path, 'r') as f:
+		baseline = json.load(f)['benchmarks']
+	with open(results_path, 'r') as f:
+		results = json.load(f)['benchmarks']
+	regressions = []
+	for name in OrderedDict.fromkeys(list(baseline) + list(results)):
+		if name not in baseline or name not in results:
+			print('%-50s %s' % (name, 'only in baseline' if name in baseline else 'new'))
+			continue
+		old, new = baseline[name]['median'], results[name]['median']
+		ratio = new / old if old else float('inf')
+		regressed = ratio > 1 + threshold
+		if regressed:
+			regressions.append(name)
+		print('%-50s %10s -> %10s  (%+.1f%%)%s' % (name, formatTime(old), formatTime(new), (ratio - 1) * 100,
+																'  REGRESSION' if regressed else ''))
+	print('%i regression(s) beyond %.0f%%.' % (len(regressions), threshold * 100))
+	return regressions
+
+def formatTime(t):
+	for unit, scale in [('s', 1), ('ms', 1e-3), ('us', 1e-6)]:
+		if t >= scale:
+			return '%.3f%s' % (t / scale, unit)
+	return '%.3fns' % (t / 1e-9)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Runs and compares the CCS microbenchmarks.')
+	commands = parser.add_subparsers(dest='command')
+	run_parser = commands.add_parser('run', help='run the benchmarks')
+	run_parser.add_argument('-o', '--output', default=RESULTS_PATH, help='file to write the results to')
+	run_parser.add_argument('-k', dest='only', default=None, help='only run benchmarks whose names contain this')
+	compare_parser = commands.add_parser('compare', help='compare results against a baseline')
+	compare_parser.add_argument('baseline')
+	compare_parser.add_argument('results')
+	compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+										 help='tolerated slowdown, as a fraction of the baseline time')
+	args = parser.parse_args()
+	if args.command == 'compare':
+		sys.exit(1 if compare(args.baseline, args.results, args.threshold) else 0)
+	run(args.output if args.command == 'run' else RESULTS_PATH, args.only if args.command == 'run' else None)
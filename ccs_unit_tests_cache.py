@@ -0,0 +1,109 @@
+__author__ = 'Jarek Glowacki'
+
+import unittest
+import os
+import tempfile
+import multiprocessing
+
+from cache import LRUCache, PersistentStore
+
+# Stores an entry from within a pool worker, in the store inherited from the parent process (as with
+#  wordnet.enablePersistentCache before ClueParser.openPool).
+_STORE = None
+def _putInWorker(i):
+	_STORE.put('similarity', ('word%i' % i, 'other'), i)
+	return os.getpid()
+
+class UnitTestsCache(unittest.TestCase):
+	"""
+	These tests check whether the lookup caches evict and count as expected.
+	"""
+
+	def test_missRaisesKeyError(self):
+		c = LRUCache('test')
+		self.assertRaises(KeyError, c.__getitem__, ('a', 'b'))
+		self.assertEqual(c.stats()['misses'], 1)
+
+	def test_entryBudgetEvictsLeastRecentlyUsed(self):
+		c = LRUCache('test', max_entries=2)
+		c['a'] = 1
+		c['b'] = 2
+		c['a']  # touch 'a', so that 'b' becomes the least recently used entry
+		c['c'] = 3
+		self.assertTrue('a' in c and 'c' in c, 'Recently used entries should survive eviction!')
+		self.assertFalse('b' in c, 'Least recently used entry should have been evicted!')
+		self.assertEqual(c.stats()['evictions'], 1)
+
+	def test_byteBudgetIsEnforced(self):
+		c = LRUCache('test', max_bytes=10000)
+		for i in range(1000):
+			c[('word%i' % i, i)] = {'synonym%i' % j for j in range(10)}
+			self.assertLessEqual(c.bytes, 10000, 'Cache has outgrown its byte budget!')
+		self.assertGreater(c.stats()['evictions'], 0)
+
+	def test_hitRate(self):
+		c = LRUCache('test')
+		c['a'] = 1
+		for _ in range(3):
+			c['a']
+		try:
+			c['b']
+		except KeyError:
+			pass
+		self.assertEqual(c.stats()['hits'], 3)
+		self.assertAlmostEqual(c.stats()['hit_rate'], 0.75)
+
+	def test_persistentStoreSharedAcrossInstances(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			path = os.path.join(tmp, 'cache.db')
+			store = PersistentStore(path, 'v1')
+			c = LRUCache('similarity', backing=store)
+			c[('cool', 'chilly')] = 0.8
+			store.close()
+
+			# A fresh cache (eg. in another process) should read through to the stored value.
+			c = LRUCache('similarity', backing=PersistentStore(path, 'v1'))
+			self.assertEqual(c[('cool', 'chilly')], 0.8)
+			self.assertEqual(c.stats()['backing_hits'], 1)
+			c.backing.close()
+
+	def test_persistentStoreIgnoresStaleStamps(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			path = os.path.join(tmp, 'cache.db')
+			store = PersistentStore(path, 'v1')
+			store.put('synonym', ('carpet', 2), {'rug'})
+			store.flush()
+			self.assertEqual(store.get('synonym', ('carpet', 2)), {'rug'})
+			store.restamp('v2')
+			self.assertRaises(KeyError, store.get, 'synonym', ('carpet', 2))
+			store.close()
+
+	def test_persistentStoreKeepsOtherStampsUntilRestamped(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			path = os.path.join(tmp, 'cache.db')
+			old = PersistentStore(path, 'v1')
+			old.put('synonym', ('carpet', 2), {'rug'})
+			old.flush()
+			# Another process running against a different wordlist mustn't wipe this one's entries.
+			new = PersistentStore(path, 'v2')
+			self.assertEqual(old.get('synonym', ('carpet', 2)), {'rug'})
+			new.restamp('v2')
+			self.assertRaises(KeyError, old.get, 'synonym', ('carpet', 2))
+			old.close()
+			new.close()
+
+	@unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'Needs forked worker processes')
+	def test_persistentStoreFlushedByPoolWorkers(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			path = os.path.join(tmp, 'cache.db')
+			global _STORE
+			store = _STORE = PersistentStore(path, 'v1')
+			pool = multiprocessing.get_context('fork').Pool(2)
+			pids = pool.map(_putInWorker, range(10))
+			pool.close()
+			pool.join()
+			self.assertNotIn(os.getpid(), pids)
+			# Far fewer entries than flush_every, so only the workers' exits can have written them.
+			self.assertEqual([store.get('similarity', ('word%i' % i, 'other')) for i in range(10)], list(range(10)),
+								  'Entries pending in workers should be written out as they exit!')
+			store.close()
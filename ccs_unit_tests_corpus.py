@@ -0,0 +1,84 @@
+__author__ = 'Jarek Glowacki'
+
+import unittest
+import os
+import shutil
+import tempfile
+
+import corpus
+import dictfile
+
+PUZZLES = ['2004-05-03_Mon_RM', '2009-08-29_Sat_DS']
+
+class UnitTestsCorpus(unittest.TestCase):
+	"""
+	These tests check whether puzzles are read correctly, and whether the corpus built from them can be read back.
+	"""
+
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.archive = os.path.join(self.tmp.name, 'smh')
+		os.mkdir(self.archive)
+		for puzzle in PUZZLES:
+			shutil.copy(os.path.join(corpus.ARCHIVE_PATH, puzzle + '.puz'), self.archive)
+		self.path = os.path.join(self.tmp.name, 'corpus.dat')
+		dictfile.register('corpus', corpus.CORPUS_VERSION, lambda: corpus._compileCorpus(self.archive),
+								lambda: corpus.archiveHash(self.archive))
+
+	def tearDown(self):
+		dictfile.register('corpus', corpus.CORPUS_VERSION, corpus._compileCorpus, corpus.archiveHash)
+		dictfile._CONTAINERS.pop(self.path, None)
+		self.tmp.cleanup()
+
+	def test_readPuzzle(self):
+		entries, grid = corpus.readPuzzle(os.path.join(self.archive, PUZZLES[0] + '.puz'))
+		self.assertEqual(len(grid), 15)
+		self.assertEqual(len(entries), 32)
+		self.assertEqual(entries[0], (1, corpus.ACROSS, 0, 0, 'Insect infests ordinary tropical fruit (8)', 'PLANTAIN'))
+		self.assertEqual([e[:2] for e in entries[:3]], [(1, corpus.ACROSS), (1, corpus.DOWN), (2, corpus.DOWN)])
+
+	def test_readPuzzleRejectsOtherFiles(self):
+		path = os.path.join(self.tmp.name, 'bogus.puz')
+		with open(path, 'wb') as f:
+			f.write(b'definitely not a puzzle' * 10)
+		self.assertRaises(ValueError, corpus.readPuzzle, path)
+
+	def test_typographicPunctuation(self):
+		entries, _ = corpus.readPuzzle(os.path.join(self.archive, PUZZLES[1] + '.puz'))
+		self.assertIn('Inking that\'s only intermittently dark (5)', [e[4] for e in entries])
+
+	def test_enumeration(self):
+		self.assertEqual(corpus.enumeration('Shut the eyes to restart yours (4,4,4,2)', 'SHUTYOUREYESTO'), '4,4,4,2')
+		self.assertEqual(corpus.enumeration('See 21-down', 'ABC'), '3')
+
+	def test_corpus(self):
+		c = corpus.Corpus(self.path)
+		self.assertEqual(list(c.puzzles), PUZZLES)
+		self.assertEqual(len(c), len(c.puzzle(0)) + len(c.puzzle(PUZZLES[1])))
+		self.assertEqual([e.answer for e in c], [c[i].answer for i in range(len(c))], 'Streaming and random access disagree!')
+		self.assertEqual(c[-1].index, len(c) - 1)
+		self.assertRaises(IndexError, c.__getitem__, len(c))
+
+		entry = c[0]
+		self.assertEqual((entry.puzzle, entry.number, entry.direction, entry.answer, entry.enumeration),
+							  (PUZZLES[0], 1, 'across', 'PLANTAIN', '8'))
+		# Crossings should point both ways, and agree on the shared letter.
+		for e in c.puzzle(0):
+			for pos, crossing in enumerate(e.crossings):
+				if crossing is not None:
+					other = c[crossing[0]]
+					self.assertEqual(other.answer[crossing[1]], e.answer[pos])
+					self.assertEqual(other.crossings[crossing[1]], (e.index, pos))
+
+	def test_sample(self):
+		c = corpus.Corpus(self.path)
+		sample = c.sample(5, seed=1)
+		self.assertEqual(len(sample), 5)
+		self.assertEqual([e.index for e in sample], sorted(e.index for e in sample))
+		self.assertEqual([e.index for e in sample], [e.index for e in c.sample(5, seed=1)], 'Seeded samples should be repeatable!')
+
+	def test_rebuiltWhenArchiveChanges(self):
+		self.assertEqual(len(corpus.Corpus(self.path).puzzles), 2)
+		os.remove(os.path.join(self.archive, PUZZLES[1] + '.puz'))
+		self.assertTrue(dictfile.isStale('corpus', self.path))
+		self.assertEqual(list(corpus.Corpus(self.path).puzzles), PUZZLES[:1])
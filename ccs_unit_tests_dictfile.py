@@ -0,0 +1,79 @@
+__author__ = 'Jarek Glowacki'
+
+import unittest
+import os
+import tempfile
+
+import numpy as np
+
+import dictfile
+
+class UnitTestsDictfile(unittest.TestCase):
+	"""
+	These tests check whether the dictionary file stores its sections correctly, and notices when they go stale.
+	"""
+
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.tmp.name, 'test.dat')
+		self.builds = []
+		dictfile.register('test_a', 1, lambda: self.build('test_a'))
+		dictfile.register('test_b', 1, lambda: self.build('test_b'))
+
+	def tearDown(self):
+		for name in ['test_a', 'test_b']:
+			del dictfile._SECTIONS[name]
+		dictfile._CONTAINERS.pop(self.path, None)
+		self.tmp.cleanup()
+
+	def build(self, name):
+		self.builds.append(name)
+		return {'numbers': np.arange(10, dtype=np.int32) * len(self.builds), 'grid': np.ones((3, 4), dtype=np.uint8)}
+
+	def test_roundTrip(self):
+		dictfile.build(['test_a'], path=self.path)
+		arrays = dictfile.load('test_a', self.path)
+		self.assertEqual(arrays['numbers'].tolist(), list(range(10)))
+		self.assertEqual(arrays['grid'].shape, (3, 4))
+		self.assertRaises(dictfile.StaleSectionError, dictfile.load, 'test_b', self.path)
+
+	def test_onlyStaleSectionsRebuilt(self):
+		self.assertEqual(dictfile.build(['test_a', 'test_b'], path=self.path), ['test_a', 'test_b'])
+		self.assertEqual(dictfile.build(['test_a', 'test_b'], path=self.path), [], 'Up-to-date sections should not be rebuilt!')
+
+		# Bumping a section's version makes it (and only it) stale.
+		dictfile.register('test_b', 2, lambda: self.build('test_b'))
+		self.assertTrue(dictfile.isStale('test_b', self.path))
+		self.assertEqual(dictfile.build(['test_a', 'test_b'], path=self.path), ['test_b'])
+		self.assertEqual(dictfile.load('test_a', self.path)['numbers'].tolist(), list(range(10)), 'Untouched section got mangled!')
+		self.assertEqual(dictfile.load('test_b', self.path)['numbers'].tolist(), list(range(0, 30, 3)))
+
+	def test_corruptedFileIsRebuilt(self):
+		with open(self.path, 'wb') as f:
+			f.write(b'definitely not a dictionary file')
+		self.assertTrue(dictfile.isStale('test_a', self.path))
+		self.assertEqual(dictfile.fetch('test_a', self.path)['numbers'].tolist(), list(range(10)))
+
+	def test_sortedMultiMap(self):
+		m = dictfile.SortedMultiMap(dictfile.SortedMultiMap.pack({'opst': {'pots', 'stop', 'tops'}, 'act': {'cat'}, 'é': {'é'}}))
+		self.assertEqual(len(m), 3)
+		self.assertEqual(m['opst'], {'pots', 'stop', 'tops'})
+		self.assertEqual(m['é'], {'é'})
+		self.assertRaises(KeyError, m.__getitem__, 'ops')
+		self.assertFalse('zzz' in m)
+		# Keys whose hashes collide must still be told apart.
+		m = dictfile.SortedMultiMap(dictfile.SortedMultiMap.pack({'k97872': {'a'}, 'k15860000': {'b'}}))
+		self.assertEqual(dictfile._keyHash('k97872'), dictfile._keyHash('k15860000'))
+		self.assertEqual((m['k97872'], m['k15860000']), ({'a'}, {'b'}))
+		self.assertFalse('k0' in m)
+
+	def test_rebuildLeavesMappedFileAlone(self):
+		dictfile.build(['test_a'], path=self.path)
+		arrays = dictfile.load('test_a', self.path)
+		first = dictfile._generations(self.path)[-1][1]
+		dictfile.build(['test_b'], path=self.path)
+		# The rebuild goes to a fresh file, so the arrays mapped out of the old one are still good.
+		self.assertNotEqual(dictfile._generations(self.path)[-1][1], first)
+		self.assertEqual(arrays['numbers'].tolist(), list(range(10)))
+		self.assertEqual(dictfile.load('test_b', self.path)['numbers'].tolist(), list(range(0, 20, 2)))
+		self.assertEqual(len(dictfile._generations(self.path)), 1, 'Superseded generations should be cleared away!')
@@ -0,0 +1,62 @@
+__author__ = 'Jarek Glowacki'
+
+import unittest
+
+from clue import Clue
+from solution import Solution
+from exceptions import UnsupportedClueException
+from puzzle_solver import PuzzleSolver
+
+class FakeParser(object):
+	""" Stands in for the ClueParser, answering from a fixed table of candidates. """
+
+	def __init__(self, table):
+		self.table = table
+		self.calls = []
+
+	def parseClue(self, clue, length=None, known_letters=None, brute_force=False, **kwargs):
+		self.calls.append((clue, known_letters, brute_force))
+		if clue == 'Unsupported':
+			raise UnsupportedClueException
+		typ = 'brute-forced' if brute_force else 'anagram'
+		return [Solution(Clue(clue), soln, None, [-1, typ, '---'], certainty)
+				  for soln, certainty in self.table.get((clue, brute_force), [])]
+
+class Entry(object):
+	def __init__(self, clue, crossings):
+		self.clue = clue
+		self.crossings = crossings
+
+class UnitTestsPuzzleSolver(unittest.TestCase):
+	"""
+	These tests check whether answers written into the grid narrow down the candidates of the clues they cross.
+	"""
+
+	def setUp(self):
+		#  C A T
+		#  O . O
+		#  W . E
+		self.entries = [Entry('Pet', [(1, 0), None, (2, 0)]),
+							 Entry('Farm animal', [(0, 0), None, None]),
+							 Entry('Digit', [(0, 2), None, None]),
+							 Entry('Unsupported', [None, None])]
+		self.cp = FakeParser({('Pet', False): [('cat', 0.9), ('dog', 0.5)],
+									 ('Farm animal', False): [('pig', 0.7), ('cow', 0.6)],
+									 ('Digit', True): [('toe', 0.85), ('tip', 0.2)]})
+
+	def test_solve(self):
+		results = PuzzleSolver(self.cp, min_known=0.3).solve(self.entries)
+		self.assertEqual([s.solution for s in results[0]], ['cat'])
+		self.assertEqual([s.solution for s in results[1]], ['cow'], 'Crossing letter should have narrowed the candidates!')
+		self.assertEqual([s.solution for s in results[2]], ['toe', 'tip'])
+		self.assertIsNone(results[3])
+		self.assertIn(('Digit', 't??', True), self.cp.calls, 'Clue without candidates should be brute forced once it has letters!')
+
+	def test_notBruteForcedWithoutEnoughLetters(self):
+		results = PuzzleSolver(self.cp).solve(self.entries)
+		self.assertEqual(results[2], [])
+		self.assertNotIn(True, [brute_force for _, _, brute_force in self.cp.calls])
+
+	def test_unconfidentAnswersNotWrittenIn(self):
+		results = PuzzleSolver(self.cp, min_certainty=0.95).solve(self.entries)
+		self.assertEqual([s.solution for s in results[1]], ['pig', 'cow'])
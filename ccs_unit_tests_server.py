@@ -0,0 +1,114 @@
+__author__ = 'Jarek Glowacki'
+
+import unittest
+import asyncio
+import json
+import time
+
+from server import SolveService, computationKey, poolSubmitter
+from clue_parser import ClueParser
+
+class UnitTestsServer(unittest.TestCase):
+	"""
+	These tests check whether the solving service merges, times out and cancels requests as expected.
+	The actual solving is stood in for by a slow fake, so that no parser is needed.
+	"""
+
+	def setUp(self):
+		self.submitted = []
+
+	async def fakeSubmit(self, args):
+		self.submitted.append(args)
+		await asyncio.sleep(0.1)
+		return [{'solution': args['clue'].split()[0].lower()}]
+
+	def test_computationKeyNormalisesClue(self):
+		self.assertEqual(computationKey({'clue': ' Guide  graphite', 'length': 4}), computationKey({'clue': 'guide graphite', 'length': 4}))
+		self.assertNotEqual(computationKey({'clue': 'Guide graphite', 'length': 4}), computationKey({'clue': 'Guide graphite'}))
+
+	def test_concurrentRequestsAreCoalesced(self):
+		service = SolveService(self.fakeSubmit)
+		async def scenario():
+			return await asyncio.gather(service.solve({'clue': 'Guide graphite'}), service.solve({'clue': 'guide  GRAPHITE '}),
+												 service.solve({'clue': 'Guide graphite', 'length': 4}))
+		results = asyncio.run(scenario())
+		self.assertEqual(len(self.submitted), 2, 'Identical requests should share one computation!')
+		self.assertEqual(results[0], results[1])
+		self.assertEqual(service.stats()['coalesced'], 1)
+		self.assertEqual(service.stats()['inflight'], 0)
+
+	def test_deadlineAbandonsComputation(self):
+		service = SolveService(self.fakeSubmit)
+		async def scenario():
+			with self.assertRaises(asyncio.TimeoutError):
+				await service.solve({'clue': 'Guide graphite', 'deadline_ms': 10})
+			self.assertIn('deadline', self.submitted[0], 'Solver should be given the deadline too!')
+			self.assertEqual(service.stats()['inflight'], 0, 'Abandoned computation should be dropped!')
+		asyncio.run(scenario())
+
+	def test_laterDeadlinesDontJoinEarlierOnes(self):
+		service = SolveService(self.fakeSubmit)
+		async def scenario():
+			return await asyncio.gather(service.solve({'clue': 'Guide graphite', 'deadline_ms': 1000}),
+												 service.solve({'clue': 'Guide graphite', 'deadline_ms': 1000}),
+												 service.solve({'clue': 'Guide graphite', 'deadline_ms': 5000}),
+												 service.solve({'clue': 'Guide graphite'}),
+												 service.solve({'clue': 'Guide graphite', 'deadline_ms': 2000}))
+		asyncio.run(scenario())
+		# The unbounded computation serves the last request too, but no request joins one with an earlier deadline.
+		self.assertEqual([args.get('deadline') is not None for args in self.submitted], [True, True, False])
+		self.assertEqual(service.stats()['coalesced'], 2)
+
+	def test_cancellingOneRequestKeepsSharedComputation(self):
+		service = SolveService(self.fakeSubmit)
+		async def scenario():
+			first = asyncio.ensure_future(service.solve({'clue': 'Guide graphite'}))
+			second = asyncio.ensure_future(service.solve({'clue': 'Guide graphite'}))
+			await asyncio.sleep(0.01)
+			first.cancel()
+			self.assertEqual(await second, [{'solution': 'guide'}])
+		asyncio.run(scenario())
+		self.assertEqual(len(self.submitted), 1)
+		self.assertEqual(service.stats()['cancelled'], 1)
+
+	def test_jsonLinesProtocol(self):
+		service = SolveService(self.fakeSubmit)
+		async def scenario():
+			server = await asyncio.start_server(service.handleConnection, '127.0.0.1', 0)
+			port = server.sockets[0].getsockname()[1]
+			async with server:
+				reader, writer = await asyncio.open_connection('127.0.0.1', port)
+				for request in [{'id': 'a', 'clue': 'Guide graphite'}, {'id': 'b', 'clue': 'Exuviate garage.'},
+									 {'cancel': 'b'}, 'not json', '[1, 2]', '"x"']:
+					writer.write(((json.dumps(request) if isinstance(request, dict) else request) + '\n').encode('utf-8'))
+				await writer.drain()
+				responses = [json.loads(await reader.readline()) for _ in range(5)]
+				writer.close()
+			return responses
+		responses = asyncio.run(scenario())
+		answers = {r['id']: r for r in responses if r['id'] is not None}
+		self.assertEqual(answers['a']['solutions'], [{'solution': 'guide'}], 'Bad lines should not bring the connection down!')
+		self.assertEqual(answers['b']['error'], 'cancelled')
+		self.assertEqual(['malformed']*3, [r['error'].split()[0] for r in responses if r['id'] is None])
+
+
+class UnitTestsServerPool(unittest.TestCase):
+	"""
+	This test runs the service over a real (single worker) pool, checking that abandoned computations free it up.
+	"""
+
+	def test_abandonedComputationStopsWorker(self):
+		with ClueParser(cost_model_path=None).openPool(1) as pool:
+			service = SolveService(poolSubmitter(pool))
+			async def scenario():
+				# Brute forcing every six letter word takes the worker well over ten seconds, if left to finish.
+				slow = asyncio.ensure_future(service.solve({'clue': 'Seven players step around the course on tiptoe',
+																		  'length': 6, 'known_letters': '??????', 'brute_force': True}))
+				await asyncio.sleep(0.5)
+				slow.cancel()
+				start = time.monotonic()
+				solutions = await service.solve({'clue': 'Guide graphite', 'length': 4})
+				return solutions, time.monotonic() - start
+			solutions, elapsed = asyncio.run(scenario())
+		self.assertIn('lead', [s['solution'] for s in solutions])
+		self.assertLess(elapsed, 3, 'The abandoned computation should have stopped, freeing up the worker!')
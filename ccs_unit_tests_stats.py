@@ -0,0 +1,77 @@
+__author__ = 'Jarek Glowacki'
+
+import unittest
+import pickle
+import os
+import tempfile
+
+from stats import ParseStats, CostModel
+
+class UnitTestsStats(unittest.TestCase):
+	"""
+	These tests check whether per-clue statistics records add up correctly across a batch.
+	"""
+
+	def makeRecord(self, typ, t, candidates, accepted, sim_hits, sim_misses):
+		record = ParseStats()
+		record.clues = 1
+		record.time = t
+		record.wordplay_time[typ] += t
+		record.candidates[typ] += candidates
+		record.accepted[typ] += accepted
+		before = {'similarity': {'hits': 10, 'backing_hits': 0, 'misses': 10}}
+		after = {'similarity': {'hits': 10 + sim_hits, 'backing_hits': 0, 'misses': 10 + sim_misses}}
+		record.recordLookups(before, after)
+		return record
+
+	def test_lookupDeltas(self):
+		record = self.makeRecord('run', 1.0, 5, 2, 3, 1)
+		self.assertEqual(record.calls('similarity'), 4)
+		self.assertAlmostEqual(record.hitRate('similarity'), 0.75)
+		self.assertEqual(record.calls('synonym'), 0, 'Unrecorded caches should count as unused!')
+
+	def test_aggregation(self):
+		records = [self.makeRecord('run', 1.0, 5, 2, 3, 1), self.makeRecord('charade', 2.0, 7, 7, 0, 4),
+					  self.makeRecord('run', 0.5, 1, 0, 1, 0)]
+		total = sum(records)
+		self.assertEqual(total.clues, 3)
+		self.assertAlmostEqual(total.time, 3.5)
+		self.assertAlmostEqual(total.wordplay_time['run'], 1.5)
+		self.assertEqual(total.candidates, {'run': 6, 'charade': 7})
+		self.assertEqual(total.accepted['charade'], 7)
+		self.assertEqual(total.calls('similarity'), 9)
+		self.assertAlmostEqual(total.hitRate('similarity'), 4 / 9)
+		self.assertEqual(records[0].clues, 1, 'Summing should leave the individual records untouched!')
+
+	def test_picklesForWorkerProcesses(self):
+		record = self.makeRecord('run', 1.0, 5, 2, 3, 1)
+		self.assertEqual(pickle.loads(pickle.dumps(record)).asDict(), record.asDict())
+
+	def test_costModelLearnsPriorities(self):
+		model = CostModel({'cheap': 1, 'dear': 100})
+		self.assertGreater(model.priority('cheap'), model.priority('dear'), 'Priors should favour the cheaper wordplay!')
+		for _ in range(100):
+			model.record('cheap', 0.001, 0.0)
+			model.record('dear', 0.01, 1.0)
+		self.assertGreater(model.priority('dear'), model.priority('cheap'), 'Fruitless checks should lose priority!')
+
+	def test_costModelSaveLoad(self):
+		model = CostModel({'run': 1})
+		model.record('run', 0.5, 1.0)
+		with tempfile.TemporaryDirectory() as tmp:
+			path = os.path.join(tmp, 'costs.json')
+			model.save(path)
+			loaded = CostModel.load(path)
+		self.assertAlmostEqual(loaded.priority('run'), model.priority('run'))
+		self.assertEqual(loaded.updates, 0, 'A freshly loaded model has nothing new to save!')
+
+	def test_costModelLoadFallsBackOnPriors(self):
+		model = CostModel({'run': 1})
+		model.record('run', 0.5, 1.0)
+		with tempfile.TemporaryDirectory() as tmp:
+			path = os.path.join(tmp, 'costs.json')
+			model.save(path)
+			self.assertEqual(os.listdir(tmp), ['costs.json'], 'Saving should leave no temporary files behind!')
+			loaded = CostModel.load(path, {'run': 1, 'charade': 100})
+		self.assertAlmostEqual(loaded.priority('run'), model.priority('run'), msg='Saved averages should beat the priors!')
+		self.assertAlmostEqual(loaded.priority('charade'), CostModel({'charade': 100}).priority('charade'))
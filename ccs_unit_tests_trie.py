@@ -0,0 +1,45 @@
+__author__ = 'Jarek Glowacki'
+
+import unittest
+
+from trie import DoubleArrayTrie, AhoCorasickAutomaton
+
+WORDS = ['a', 'an', 'and', 'ant', 'bat', 'bath', 'ice_cream', 'zoo']
+
+class UnitTestsTrie(unittest.TestCase):
+	"""
+	These tests check whether the double-array trie stores and retrieves words correctly.
+	"""
+
+	def test_membership(self):
+		t = DoubleArrayTrie.build(WORDS)
+		self.assertEqual(len(t), len(WORDS))
+		for word in WORDS:
+			self.assertTrue(word in t, '\'%s\' should be in the trie!' % word)
+		for word in ['', 'b', 'ba', 'anty', 'ice', 'zo', 'Zoo', 'z00']:
+			self.assertFalse(word in t, '\'%s\' should not be in the trie!' % word)
+
+	def test_prefixTraversal(self):
+		t = DoubleArrayTrie.build(WORDS)
+		node = t.find('ba')
+		self.assertGreaterEqual(node, 0, 'Prefix \'ba\' should lead somewhere!')
+		self.assertFalse(t.isWord(node))
+		self.assertTrue(t.isWord(t.child(node, 't')))
+		self.assertEqual(t.child(node, 'q'), -1)
+		self.assertEqual(t.find('bz'), -1)
+
+	def test_arrayRoundTrip(self):
+		t = DoubleArrayTrie.fromArrays(DoubleArrayTrie.build(WORDS).toArrays())
+		self.assertEqual(len(t), len(WORDS))
+		self.assertEqual(sorted(w for w in WORDS if w in t), sorted(WORDS))
+
+	def test_ahoCorasickScan(self):
+		a = AhoCorasickAutomaton.build(WORDS)
+		string = 'xbathandzoo'
+		expected = sorted((i, j) for i in range(len(string)) for j in range(i + 1, len(string) + 1) if string[i:j] in WORDS)
+		self.assertEqual(a.scan(string), expected)
+		self.assertEqual(a.scan('ba7th'), [(1, 2)], 'Words must not span characters outside the alphabet!')
+
+	def test_ahoCorasickArrayRoundTrip(self):
+		a = AhoCorasickAutomaton.fromArrays(AhoCorasickAutomaton.build(WORDS).toArrays())
+		self.assertEqual(a.scan('andzoo'), [(0, 1), (0, 2), (0, 3), (3, 6)])
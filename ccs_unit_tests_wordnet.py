@@ -1,6 +1,7 @@
 __author__ = 'Jarek Glowacki'
 
 import unittest
+import re
 
 import wordnet
 
@@ -49,3 +50,43 @@ class UnitTestsWordnet(unittest.TestCase):
 		for pair in [('cot', 'c?t'), ('obsolete', 'ob????t?'), ('north', 'n????')]:
 			self.assertTrue(pair[0] in wordnet.getWordsWithPattern('\A' + pair[1].replace('?','[a-z]') + '\Z'), '\'%s\' is not found to match \'%s\'!' % (pair[0], pair[1]))
 
+	def test_patternIndexMatchesRegexScan(self):
+		for pattern in ['??a?e', 'c?t', '???????', 'zq???']:
+			regex = '\\A' + pattern.replace('?','[a-z]') + '\\Z'
+			expected = [word for word in wordnet.WORDLIST_SORTED if re.search(regex, word)]
+			self.assertEqual(wordnet.getWordsWithPattern(regex), expected, 'Pattern index disagrees with regex scan for \'%s\'!' % pattern)
+
+	def test_patternArbitraryRegex(self):
+		self.assertTrue('north' in wordnet.getWordsWithPattern('\\An.rth\\Z'), 'Arbitrary regex patterns are no longer supported!')
+
+	def test_cacheStats(self):
+		before = wordnet.getCacheStats()['similarity']
+		wordnet.calcSimilarity('cool', 'chilly')
+		wordnet.calcSimilarity('chilly', 'cool')
+		after = wordnet.getCacheStats()['similarity']
+		self.assertEqual(after['hits'] + after['misses'], before['hits'] + before['misses'] + 2)
+		self.assertGreater(after['hits'], before['hits'], 'Repeated (commuted) similarity request should hit the cache!')
+
+	def test_prefixCompletion(self):
+		for prefix, length in [('n', 5), ('st', 8), ('cat', None), ('zzzq', 6)]:
+			expected = [w for w in wordnet.WORDLIST_SORTED if w.startswith(prefix) and (length is None or len(w) == length)]
+			self.assertEqual(wordnet.getWordsWithPrefix(prefix, length), expected, 'Wrong completions for \'%s\' (length %s)!' % (prefix, length))
+
+	def test_prefixTrie(self):
+		prefixes = wordnet.getPrefixTrie()
+		for word in ['troubadour', 'moon', 'ice_cream']:
+			self.assertTrue(word in prefixes, '\'%s\' is missing from the prefix trie!' % word)
+		self.assertTrue(prefixes.find('troub') >= 0 and not prefixes.isWord(prefixes.find('troub')))
+		self.assertTrue(prefixes.find('zzzq') < 0, 'No word starts with \'zzzq\'!')
+
+	def test_snapshotMatchesReader(self):
+		words = ['frog', 'tadpole', 'cool', 'chilly', 'geese', 'purchased', 'glasses', 'drapes', 'run', 'troubadour']
+		results = []
+		for use_snapshot in [True, False]:
+			wordnet.useSnapshot(use_snapshot)
+			wordnet.clearCaches()
+			results.append(([wordnet.isPlural(w) for w in words], [wordnet.getSynonyms(w, 1) for w in words],
+								 [wordnet.calcSimilarity(w1, w2) for w1 in words for w2 in words]))
+		wordnet.useSnapshot()
+		wordnet.clearCaches()
+		self.assertEqual(results[0], results[1], 'The WordNet snapshot disagrees with NLTK\'s reader!')
@@ -1,8 +1,11 @@
 __author__ = 'Jarek Glowacki'
 
 import unittest
+from itertools import combinations
 
 import wordplay
+import wordnet
+from clue import Clue
 
 class UnitTestsWordnet(unittest.TestCase):
 	"""
@@ -19,6 +22,18 @@ class UnitTestsWordnet(unittest.TestCase):
 		for pair in [('magnate','magenta'), ('daffodil', 'lidoffda'), ('pots', 'stop')]:
 			self.assertTrue(pair[0] in wp.getPlay(pair[1]), '\'%s\' is not considered an anagram of \'%s\'!' % (pair[0], pair[1]))
 
+	def test_anagramPartialPlay(self):
+		wp = wordplay.AnagramWordplay()
+		self.assertEqual(wp.getPartialPlay('stop'), wp.getPlay('stop'), 'Exact partial anagrams should match the anagram groups!')
+		self.assertIn('horse', wp.getPartialPlay('carthorse', remove='cart'))
+		self.assertEqual(wp.getPartialPlay('pots', remove='x'), set(), 'Can\'t remove letters that aren\'t there!')
+		formable = wp.getPartialPlay('magenta', spare=None, length=6)
+		self.assertIn('magnet', formable)
+		self.assertTrue(all(len(w) == 6 for w in formable), 'Length filter not applied!')
+		with_extra = wp.getPartialPlay('pots', extra=1, length=5)
+		self.assertTrue({'posts', 'stoop'} <= with_extra)
+		self.assertNotIn('stop', with_extra)
+		self.assertIn('stop', wp.getPartialPlay('pots', extra=1))
 
 	def test_runWordplay(self):
 		wp = wordplay.RunWordplay()
@@ -28,4 +43,33 @@ class UnitTestsWordnet(unittest.TestCase):
 		for pair in [('obsolete',['job', 'sole', 'technician']), ('chariot', ['punch', 'a', 'rio', 'tinto']), ('post', ['lipo', 'stemography'])]:
 			self.assertTrue(pair[0] in [w[0] for w in wp.getPlay(pair[1])], '\'%s\' is not considered a run of \'%s\'!' % (pair[0], pair[1]))
 
-	# The remaining wordplays are too deeply intertwined with other modules to test here. They get sufficiently tested in the integration tests though.
\ No newline at end of file
+	def test_combinations(self):
+		wp = wordplay.AnagramWordplay()
+		tokens = ['ab', 'c', 'ab', 'def']
+		everything = [combo for combo, _ in wp.getCombinations(tokens)]
+		self.assertEqual(len(everything), len(set(everything)), 'Combinations should be distinct!')
+		self.assertEqual(len(everything), 13, 'Expected every distinct non-empty combination!')
+		self.assertEqual({combo for combo, _ in wp.getCombinations(tokens, 3)}, {('ab', 'c'), ('c', 'ab'), ('def',)})
+		self.assertEqual(dict(wp.getCombinations(tokens, 3, extend=lambda key, token: ''.join(sorted(key + token)))),
+							  {('ab', 'c'): 'abc', ('c', 'ab'): 'abc', ('def',): 'def'})
+		# Combinations ruled out by extend are never extended.
+		self.assertEqual({combo for combo, _ in wp.getCombinations(tokens, extend=lambda s, token: None if token == 'c' else s)},
+							  {('ab',), ('ab', 'ab'), ('ab', 'ab', 'def'), ('ab', 'def'), ('def',)})
+
+	def test_lazyLoading(self):
+		wp = wordplay.AnagramWordplay()
+		self.assertFalse('dictionary' in vars(wp) or 'keywords' in vars(wp), 'Wordplay data should not be loaded until needed!')
+		self.assertTrue('stop' in wp.getPlay('pots'))
+		self.assertTrue('dictionary' in vars(wp), 'Wordplay dictionary should be loaded once needed!')
+
+	def test_initialFinalWordplay(self):
+		tokens = ['moon', 'orphan', 'on', 'zzz', 'io', 'male', 'east', 'trap']
+		for wp, pick in [(wordplay.InitialWordplay(), lambda t: t[0]), (wordplay.FinalWordplay(), lambda t: t[-1])]:
+			# The trie-guided search should find exactly the combinations whose letters spell a word.
+			for length in [3, 4]:
+				expected = {(''.join(pick(t) for t in combo), combo) for combo in combinations(tokens, length)
+								if wordnet.exists(''.join(pick(t) for t in combo))}
+				found = {(s.solution, tuple(s.applied_to)) for s in wp.check(Clue('', length), {'<': tokens})}
+				self.assertEqual(found, expected, 'Wrong %s solutions of length %i!' % (wp.__typ__, length))
+
+	# The double definition and charade wordplays are too deeply intertwined with other modules to test here. They get sufficiently tested in the integration tests though.
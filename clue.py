@@ -11,16 +11,14 @@ It performs a degree of validation on incoming clues, and is also capable of che
 import re  # regex library
 import pdb
 
-# Dictionary libraries
-from nltk.tokenize import RegexpTokenizer
-
 # Other CCS modules
 from exceptions import *  # custom CCS exceptions
 import log  # module for giving runtime feedback to the user
 
 __author__ = "Jarek Glowacki"
 logger = log.getLogger(__name__)
-tokenizer = RegexpTokenizer(r'\w+')
+# Same behaviour as NLTK's RegexpTokenizer(r'\w+'), without the cost of importing NLTK.
+tokenizer = re.compile(r'\w+', re.UNICODE | re.MULTILINE | re.DOTALL)
 
 
 class Clue(object):
@@ -54,9 +52,13 @@ class Clue(object):
 		self.known_letters = known_letters
 
 		# Tokenise.
-		self.tokens = tokenizer.tokenize(self.clue.replace("'", '').lower())
+		self.tokens = tokenizer.findall(self.clue.replace("'", '').lower())
 		self.token_set = set(self.tokens) # for efficiency later
 
+		# Keep count of the proposed solutions, for performance statistics.
+		self.num_checked = 0
+		self.num_accepted = 0
+
 	def checkSolution(self, soln):
 		"""
 		Returns true iff the given soln satisfies the constraints presented by the clue.
@@ -69,6 +71,7 @@ class Clue(object):
 		  first place.
 		"""
 
+		self.num_checked += 1
 		soln = soln.replace('_', '')
 		# Filter out if solution is just a token from the original clue.
 		if soln in self.token_set:
@@ -81,6 +84,7 @@ class Clue(object):
 		# Filter by length.
 		elif (self.length and len(soln) != self.length) or len(soln) < 3:
 			return False
+		self.num_accepted += 1
 		return True
 
 	def __repr__(self):
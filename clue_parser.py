@@ -8,6 +8,24 @@ A new ClueParser instance can be initialised as follows:
 	cp = ClueParser()
 After this, clues can be submitted for solving by typing (for example):
 	cp.parseClue('Zoroastrian pairs dancing. (5)')
+To return within a fixed time (with the best solutions found by then), give a time budget:
+	cp.parseClue('Zoroastrian pairs dancing. (5)', budget_ms=200)
+Solutions can also be streamed as they're found, along with the best one so far:
+	for solution, best in cp.iterParseClue('Zoroastrian pairs dancing. (5)'):
+		...
+To also find out where the time went, ask for a ParseStats record alongside the solutions:
+	solutions, stats = cp.parseClue('Zoroastrian pairs dancing. (5)', stats=True)
+A clue whose known letters keep filling in (eg. from crossing answers) is best solved through a session, which
+ narrows down its previous solutions instead of starting afresh each time:
+	session = cp.session('Zoroastrian pairs dancing. (5)')
+	session.solve()
+	session.solve('p????')
+Batches of clues can be solved in parallel, across a pool of worker processes:
+	for index, solutions in cp.parseClues(['Zoroastrian pairs dancing. (5)', 'Guide graphite'], workers=4):
+		...
+The parser learns how long each type of wordplay takes to check, so as to try the best value ones first. Closing it
+ saves what it's learnt for the next run:
+	cp.close()
 
 The parser employs certain heuristics to speed up computation:
 	-Minimum solution length is 3 letters (not counting hyphens/apostrophes).
@@ -19,6 +37,11 @@ The parser employs certain heuristics to speed up computation:
 
 # Python libraries
 import inspect  # for parsing through the contents of python modules
+import multiprocessing  # for solving batches of clues in parallel
+import multiprocessing.util  # for saving what workers have learnt as they exit, as they skip atexit
+import gc  # garbage collector, frozen before forking workers so that it leaves shared pages alone
+import time
+import heapq  # priority queue, for keeping track of the best solutions in top-k mode
 import pdb  # live debugging module
 
 # Dictionary libraries
@@ -27,6 +50,7 @@ import wordnet # custom wrapper around NLTK WordNet
 # Other CCS modules
 from clue import Clue
 from solution import Solution
+from stats import ParseStats, CostModel
 from exceptions import BruteForceWithoutKnownLettersException
 import wordplay
 import log  # module for giving runtime feedback to the user
@@ -35,23 +59,117 @@ __author__ = 'Jarek Glowacki'
 logger = log.getLogger(__name__, streamLevel=log.INFO)
 
 DEFINITION_MAX_LEN = 3
+COST_MODEL_PATH = 'dict/custom/costs.json'
+CANCEL_SLOTS = 1024  # number of tasks in a pool from openPool() that can be called off at once
 
 class ClueParser(object):
-	def __init__(self, gui_thread=None):
+	def __init__(self, gui_thread=None, cost_model_path=COST_MODEL_PATH):
 		self.gui_thread = gui_thread
+		self.cost_model_path = cost_model_path
 
 		# Create an instance of each existing wordplay type, based on what's
 		#  been defined in the wordplay module.
 		self.wordplays = {mem.__typ__: mem() for _, mem in inspect.getmembers(wordplay, inspect.isclass) \
 								if issubclass(mem, wordplay.Wordplay) and mem is not wordplay.Wordplay}
+		# Learns how long each wordplay's checks take, and how fruitful they are, to schedule the best value ones first.
+		#  Picks up from where previous runs left off (see close()), if there are any.
+		priors = {typ: wp.cost for typ, wp in self.wordplays.items()}
+		self.cost_model = CostModel(priors)
+		if cost_model_path is not None:
+			try:
+				self.cost_model = CostModel.load(cost_model_path, priors)
+			except FileNotFoundError:
+				pass
+			except (ValueError, KeyError) as e:
+				logger.warning('Unable to read cost model \'%s\', starting afresh: %r' % (cost_model_path, e))
 
 		logger.debug('%s instance initialised.' % self.__class__.__name__)
 
+	def close(self):
+		"""
+		Saves whatever the cost model has learnt, so that the next run can make use of it.
+		Workers of a pool from openPool() do this for their own parsers as they exit.
+		"""
+
+		if self.cost_model_path is not None and self.cost_model.updates:
+			self.cost_model.save(self.cost_model_path)
+
+	def preload(self):
+		"""
+		Loads every read-only structure that would otherwise be loaded on first use (wordlist, dictionaries,
+		 keyword lists, WordNet, etc.).
+		"""
+
+		wordnet.preload()
+		for wp in self.wordplays.values():
+			wp.preload()
+
 
-	def parseClue(self, clue, length=None, typ=None, known_letters=None, brute_force=False, **kwargs):
+	def parseClue(self, clue, length=None, typ=None, known_letters=None, brute_force=False, stats=False, top_k=None,
+					  budget_ms=None, deadline=None, cancelled=None, **kwargs):
 		"""
 		This is the core method that handles input clues, interprets them, then passes them off to other
 		 modules to dissect. It then re-assimilates all solutions, sorts them, then returns them to the user.
+		If stats is set, a (solutions, ParseStats) pair is returned instead, recording where the time went.
+		If top_k is set, only the best top_k solutions are returned (exactly as they'd appear at the top of the
+		 full list). This is a lot quicker, as candidates that can't make the cut are never scored.
+		To bound the time taken, give either a budget_ms or a deadline (a time.monotonic() timestamp). Once it passes,
+		 the best solutions found so far are returned. To make the most of the time available, the wordplay
+		 checks are scheduled by their expected yield per unit time (see CostModel).
+		A cancelled function may also be given, which gets polled in the same way; once it returns True, the solve
+		 is called off, likewise returning the solutions found so far (see workerCancelled).
+		"""
+
+		deadline = _deadline(budget_ms, deadline)
+		record = ParseStats()
+		caches_before = wordnet.getCacheStats()
+		start = time.perf_counter()
+		try:
+			# Sort solutions by certainty score, with brute-forced solutions trailing the rest. Ties are broken by
+			#  the order in which the definitions and interpretations were laid out, rather than the order in which
+			#  they happened to be tried.
+			found = sorted(self._iterSolutions(clue, length, typ, known_letters, brute_force, record, top_k, deadline,
+															  cancelled, **kwargs),
+								key=lambda x: (x[0][0], -x[1].certainty, x[0]))
+			solutions = [soln for _, soln in found][:top_k]
+		finally:
+			record.clues += 1
+			record.time += time.perf_counter() - start
+			record.recordLookups(caches_before, wordnet.getCacheStats())
+		record.solutions = len(solutions)
+
+		if solutions:
+			logger.info('%i solution(s) found. Best solution is \'%s\' (certainty: %f)' % (len(solutions), solutions[0].solution, solutions[0].certainty))
+		else:
+			logger.info('Unsuccessful in resolving clue.')
+		return (solutions, record) if stats else solutions
+
+	def iterParseClue(self, clue, length=None, typ=None, known_letters=None, brute_force=False, stats=None, top_k=None,
+							budget_ms=None, deadline=None, cancelled=None, **kwargs):
+		"""
+		Streaming version of parseClue. Yields (solution, best) pairs as soon as each solution is found, where best
+		 is the highest scoring solution found so far.
+		The cheapest wordplays (runs, anagrams, etc.) are tried first, so the likely answer tends to turn up
+		 early, while charades and brute forcing keep refining it afterwards.
+		If a ParseStats record is given, it gets filled in along the way.
+		With top_k set, the wordplays are all checked before any scoring starts, and solutions that can't make the
+		 top_k are skipped (though a few that don't make it may still be yielded).
+		The stream ends early once the time budget (budget_ms) or deadline, if any, runs out, or once it's cancelled.
+		"""
+
+		deadline = _deadline(budget_ms, deadline)
+		best = None
+		for _, soln in self._iterSolutions(clue, length, typ, known_letters, brute_force, stats or ParseStats(), top_k,
+																 deadline, cancelled, **kwargs):
+			if best is None or soln.certainty > best.certainty:
+				best = soln
+			yield soln, best
+
+	def _iterSolutions(self, clue, length, typ, known_letters, brute_force, stats, top_k=None, deadline=None, cancelled=None,
+							 **kwargs):
+		"""
+		Yields (order, solution) pairs, best value wordplay checks first. The order key places each solution where
+		 it would fall if every definition and interpretation were tried in turn.
 		"""
 
 		logger.info('Parsing clue: %s' % clue)
@@ -60,9 +178,14 @@ class ClueParser(object):
 		if not isinstance(clue, Clue):
 			clue = Clue(clue, length, typ, known_letters)
 			logger.debug('Converted clue to Clue object: %s' % clue)
+		if brute_force and known_letters is None:
+			raise BruteForceWithoutKnownLettersException
+		# Everything polls the GUI's halt flag; with a deadline, the watchdog raises it once time is up (or once the
+		#  solve is cancelled).
+		gui = self.gui_thread if deadline is None and cancelled is None else _Watchdog(self.gui_thread, deadline, stats, cancelled)
 
-		# Loop through all possible definitions.
-		solutions = []
+		# Lay out every wordplay to check, for all possible definitions.
+		checks = []
 		raw_solns = set() # for bruteforcing later
 		raw_definitions = [] # for bruteforcing later
 		for defpos in filter(lambda x: x!=0, range(-DEFINITION_MAX_LEN, DEFINITION_MAX_LEN+1)):
@@ -82,60 +205,184 @@ class ClueParser(object):
 			# Consider each interpretation.
 			for kwpos, typs in interpretations.items():
 				for typ, subplay in typs.items():
-					if self.gui_thread:
-						if self.gui_thread.halt():
-							return solutions
-						self.gui_thread.updateStatus(typ=typ)
-					for soln in self.wordplays[typ].check(clue, subplay, wordplays=self.wordplays, gui=self.gui_thread, **kwargs):
-						if self.gui_thread and self.gui_thread.halt():
-							return solutions
-						certainty = wordnet.calcSimilarity(soln.solution, definition) * soln.certainty
-						if certainty > 0:
-							solutions.append(
-									Solution(clue,
-												soln.solution,
-												defpos,
-												[(kwpos + (defpos if defpos > 0 else 0)) if kwpos >= 0 else -1, typ,
-													' '.join(soln.applied_to)],
-												certainty
-									)
-							)
-							raw_solns.add(soln.solution)
+					checks.append((len(checks), defpos, definition, kwpos, typ, subplay))
 
-		# Sort solutions by certainty score.
-		solutions = sorted(solutions, key=lambda s: s.certainty, reverse=True)
+		# Work through the checks, best value first.
+		ranked = sorted(checks, key=lambda c: -self.cost_model.priority(c[4]))
+		if top_k is None:
+			for check in ranked:
+				if gui:
+					if gui.halt():
+						return
+					gui.updateStatus(typ=check[4])
+				order, defpos, definition, kwpos, typ, subplay = check
+				candidates = self._runCheck(clue, check, stats, gui, **kwargs)
+				for i, soln in enumerate(candidates):
+					if gui and gui.halt():
+						return
+					# Timed on its own, so that neither the consumer's time between yields nor an early return gets
+					#  in the way.
+					scoring_start = time.perf_counter()
+					certainty = wordnet.calcSimilarity(soln.solution, definition) * soln.certainty
+					scoring_time = time.perf_counter() - scoring_start
+					stats.scoring_time += scoring_time
+					stats.defpos_time[defpos] += scoring_time
+					if certainty > 0:
+						raw_solns.add(soln.solution)
+						yield (0, order, i), self._makeSolution(clue, check, soln, certainty)
+		else:
+			# Gather up all the candidates first, so that they can be scored in descending order of wordplay
+			#  certainty. As similarity never exceeds 1, a candidate's wordplay certainty bounds its final
+			#  certainty; once that falls short of the k-th best certainty so far, no remaining candidate can
+			#  make the cut.
+			# With a deadline, there might not be time to run every check before scoring anything, so instead
+			#  each check's candidates get scored (in the same way) as soon as it's done.
+			best = [] # min-heap of the top_k certainties so far
+			for batch in ([ranked] if deadline is None else [[check] for check in ranked]):
+				pending = []
+				for check in batch:
+					if gui:
+						if gui.halt():
+							return
+						gui.updateStatus(typ=check[4])
+					pending.extend((soln.certainty, check, i, soln) for i, soln in enumerate(self._runCheck(clue, check, stats, gui, **kwargs)))
+				pending.sort(key=lambda p: (-p[0], p[1][0], p[2]))
+				for num, (bound, check, i, soln) in enumerate(pending):
+					if bound <= 0 or (len(best) == top_k and bound < best[0]):
+						stats.pruned += len(pending) - num
+						break
+					if gui and gui.halt():
+						return
+					scoring_start = time.perf_counter()
+					certainty = wordnet.calcSimilarity(soln.solution, check[2]) * soln.certainty
+					scoring_time = time.perf_counter() - scoring_start
+					stats.scoring_time += scoring_time
+					stats.defpos_time[check[1]] += scoring_time
+					if certainty > 0:
+						raw_solns.add(soln.solution)
+						heapq.heappush(best, certainty)
+						if len(best) > top_k:
+							heapq.heappop(best)
+						yield (0, check[0], i), self._makeSolution(clue, check, soln, certainty)
+			if len(best) == top_k:
+				# Brute-forced solutions always trail the others, so there's no room left for them.
+				return
 
 		# Consider brute-forcing solutions.
 		if brute_force:
-			if known_letters is None:
-				raise BruteForceWithoutKnownLettersException
-			if self.gui_thread:
-				if self.gui_thread.halt():
-					return solutions
-				self.gui_thread.updateStatus(typ='brute-forcing')
+			if gui:
+				if gui.halt():
+					return
+				gui.updateStatus(typ='brute-forcing')
+			brute_force_start = time.perf_counter()
 			# Get a brute-forced list of solutions.
 			brute_solns = set(wordnet.getWordsWithPattern(clue.regex)) - raw_solns
-			brute_forced_solutions = []
-			for soln in brute_solns:
-				if self.gui_thread and self.gui_thread.halt():
-					return solutions
+			stats.candidates['brute-forced'] += len(brute_solns)
+			for i, soln in enumerate(brute_solns):
+				if gui and gui.halt():
+					return
 				soln_certainty = max([(0,None)]+[(wordnet.calcSimilarity(soln, d[1]), d[0]) for d in raw_definitions], key=lambda x:x[0])
-				brute_forced_solutions.append(
-						Solution(clue,
-									soln,
-									soln_certainty[1] if soln_certainty[0] > 0 else None,
-									[-1, 'brute-forced',	'---'],
-									soln_certainty[0]
-						)
-				)
-			solutions.extend(sorted(brute_forced_solutions, key=lambda s: s.certainty, reverse=True))
+				yield (1, i), Solution(clue,
+											  soln,
+											  soln_certainty[1] if soln_certainty[0] > 0 else None,
+											  [-1, 'brute-forced',	'---'],
+											  soln_certainty[0]
+									)
+			stats.brute_force_time += time.perf_counter() - brute_force_start
 
-		if solutions:
-			logger.info('%i solution(s) found. Best solution is \'%s\' (certainty: %f)' % (len(solutions), solutions[0].solution, solutions[0].certainty))
+	def _runCheck(self, clue, check, stats, gui, **kwargs):
+		""" Runs a single wordplay check, returning its candidate solutions. """
+
+		order, defpos, definition, kwpos, typ, subplay = check
+		checked, accepted = clue.num_checked, clue.num_accepted
+		check_start = time.perf_counter()
+		candidates = self.wordplays[typ].check(clue, subplay, wordplays=self.wordplays, gui=gui, **kwargs)
+		check_time = time.perf_counter() - check_start
+		if not (gui and gui.halt()):
+			# Halted checks only got partway through, so they'd skew the averages.
+			self.cost_model.record(typ, check_time, max([soln.certainty for soln in candidates] + [0]))
+		stats.wordplay_time[typ] += check_time
+		stats.defpos_time[defpos] += check_time
+		stats.candidates[typ] += clue.num_checked - checked
+		stats.accepted[typ] += clue.num_accepted - accepted
+		return candidates
+
+	def _makeSolution(self, clue, check, soln, certainty):
+		order, defpos, definition, kwpos, typ, subplay = check
+		return Solution(clue,
+							 soln.solution,
+							 defpos,
+							 [(kwpos + (defpos if defpos > 0 else 0)) if kwpos >= 0 else -1, typ, ' '.join(soln.applied_to)],
+							 certainty
+				 )
+
+	def openPool(self, workers=None, shared=True):
+		"""
+		Starts a pool of worker processes for solving clues (one per CPU core by default).
+		In shared mode, this parser first preloads everything, then the workers are forked straight from this
+		 process. They thus all share its read-only structures copy-on-write, so each extra worker costs little
+		 more memory than its own working set. Where forking isn't available (or with shared=False), every worker
+		 is spawned afresh and loads its own ClueParser.
+		The pool comes with an array of CANCEL_SLOTS flags (as its cancel_flags attribute), shared with the workers.
+		 A task given one of the slots can be called off by setting its flag (see workerCancelled).
+		"""
+
+		global _WORKER_PARSER
+		if shared and 'fork' in multiprocessing.get_all_start_methods():
+			self.preload()
+			_WORKER_PARSER = self
+			context = multiprocessing.get_context('fork')
+			cancel_flags = context.Array('b', CANCEL_SLOTS, lock=False)
+			# Move everything into the collector's permanent generation, otherwise its bookkeeping writes would
+			#  gradually copy every shared object into each worker.
+			gc.collect()
+			gc.freeze()
+			try:
+				pool = context.Pool(workers, initializer=_initWorker, initargs=(cancel_flags, False))
+			finally:
+				gc.unfreeze()
 		else:
-			logger.info('Unsuccessful in resolving clue.')
-		return solutions
+			context = multiprocessing.get_context('spawn')
+			cancel_flags = context.Array('b', CANCEL_SLOTS, lock=False)
+			pool = context.Pool(workers, initializer=_initWorker, initargs=(cancel_flags, True))
+		pool.cancel_flags = cancel_flags
+		return pool
 
+	def parseClues(self, clues, workers=None, chunksize=1, ordered=True, shared=True, **kwargs):
+		"""
+		Solves a batch of clues, fanning them out across a pool of worker processes, each of which holds its own
+		 warm ClueParser instance. By default there is one worker per CPU core; with workers=0 the clues are
+		 instead solved one by one in this process.
+		Each clue may be given as a string, a Clue object, or a dict of parseClue arguments
+		 (eg. {'clue': 'Guide graphite', 'length': 4}). Any other keyword arguments are passed on to parseClue
+		 for every clue.
+		Yields (index, result) pairs, where index is the clue's position in the input, and result is either the
+		 clue's list of solutions or the exception raised while solving it (so one bad clue never aborts the batch).
+		 Passing stats=True makes each successful result a (solutions, ParseStats) pair, as with parseClue; the
+		 records can then be summed up into statistics for the whole batch.
+		Results are yielded in input order, unless ordered=False, in which case they're yielded as they complete.
+		See openPool() for the shared flag.
+		"""
+
+		tasks = ((i, dict(kwargs, **(clue if isinstance(clue, dict) else {'clue': clue}))) for i, clue in enumerate(clues))
+		if workers == 0:
+			for task in tasks:
+				yield _solve(self, task)
+			return
+		with self.openPool(workers, shared) as pool:
+			yield from (pool.imap if ordered else pool.imap_unordered)(_solveInWorker, tasks, chunksize)
+			# Let the workers exit by themselves (writing out any persistent cache entries) rather than be terminated.
+			pool.close()
+			pool.join()
+
+	def session(self, clue, length=None, typ=None, brute_force=False, **kwargs):
+		"""
+		Returns a ClueSession, for solving the given clue repeatedly as its known letters change.
+		Other parseClue arguments are passed on to every solve, except for top_k, which is given to each
+		 ClueSession.solve call instead (narrowing a pruned list of solutions wouldn't match solving afresh).
+		"""
+
+		return ClueSession(self, clue, length, typ, brute_force, **kwargs)
 
 	def interpret(self, clue, wp_tokens):
 		"""
@@ -190,3 +437,143 @@ class ClueParser(object):
 
 		wordnet.recompileWordList(**kwargs)
 		self.recompileDictionaries(**kwargs)
+
+
+class ClueSession(object):
+	"""
+	Solves a single clue over and over as its known letters change, as they do while the user types them in or
+	 as crossing answers arrive.
+	The solutions from the last solve are kept. When known letters are only added, the new solutions are just
+	 those of the old ones that fit the new letters (which is exactly what solving afresh would give), so this
+	 costs time in proportion to the number of old solutions rather than to the size of the dictionary. The clue
+	 is only solved from scratch when a known letter is removed or changed, or when the last solve didn't run
+	 to completion (because it was halted or ran out of time).
+	"""
+
+	def __init__(self, cp, clue, length=None, typ=None, brute_force=False, **kwargs):
+		if 'top_k' in kwargs:
+			raise TypeError('top_k is an argument of ClueSession.solve, not of the session')
+		self.cp = cp
+		self.clue = clue
+		self.length = length
+		self.typ = typ
+		self.brute_force = brute_force
+		self.kwargs = kwargs  # any other parseClue arguments (eg. budget_ms)
+		self.known_letters = None
+		self.solutions = []
+		self.complete = False  # whether the last solve ran to completion
+		self.stats = ParseStats()  # accumulated over every solve of the session
+		self.narrowed = 0  # number of solves answered by narrowing
+		self.recomputed = 0  # number of solves done from scratch
+
+	def matches(self, clue, length=None, typ=None, brute_force=False, **kwargs):
+		""" Checks whether this session solves the given clue, with the given parseClue arguments. """
+
+		return (clue, length, typ, brute_force, kwargs) == (self.clue, self.length, self.typ, self.brute_force, self.kwargs)
+
+	def solve(self, known_letters=None, top_k=None):
+		"""
+		Returns the clue's solutions given the known letters (as a pattern, eg. 'p??s?'), best first.
+		"""
+
+		known_letters = known_letters.lower() if known_letters else None
+		if self._tightens(known_letters):
+			clue = Clue(self.clue, self.length, self.typ, known_letters)
+			self.solutions = [soln for soln in self.solutions if clue.checkSolution(soln.solution)]
+			self.narrowed += 1
+		else:
+			self.complete = False
+			self.solutions, record = self.cp.parseClue(self.clue, self.length, self.typ, known_letters, self.brute_force,
+																	 stats=True, **self.kwargs)
+			self.stats += record
+			self.complete = not (record.timeouts or (self.cp.gui_thread is not None and self.cp.gui_thread.halt()))
+			self.recomputed += 1
+		self.known_letters = known_letters
+		return self.solutions[:top_k]
+
+	def _tightens(self, known_letters):
+		""" Checks whether the given known letters keep every constraint of the last (complete) solve. """
+
+		if not self.complete or known_letters is None:
+			return self.complete and self.known_letters is None
+		if self.known_letters is None:
+			return True
+		return len(known_letters) == len(self.known_letters) and \
+				 all(old == '?' or old == new for old, new in zip(self.known_letters, known_letters))
+
+
+###
+# Time budget helpers.
+###
+
+# Works out the deadline (as a time.monotonic() timestamp) from a time budget and/or an explicit deadline.
+def _deadline(budget_ms, deadline):
+	if budget_ms is not None:
+		budget_deadline = time.monotonic() + budget_ms / 1000
+		deadline = budget_deadline if deadline is None else min(deadline, budget_deadline)
+	return deadline
+
+# Stands in for the GUI thread (passing everything on to it, if there is one), additionally calling a halt once
+#  the deadline (if any) passes, or once the cancelled function (if any) says so.
+class _Watchdog(object):
+	def __init__(self, gui_thread, deadline, stats, cancelled=None):
+		self.gui_thread = gui_thread
+		self.deadline = deadline
+		self.stats = stats
+		self.cancelled = cancelled
+		self.expired = False
+
+	def halt(self):
+		if not self.expired and self.deadline is not None and time.monotonic() >= self.deadline:
+			logger.info('Time budget exhausted; returning the best solutions found so far.')
+			self.expired = True
+			self.stats.timeouts += 1
+		return self.expired or (self.cancelled is not None and self.cancelled()) or \
+				 (self.gui_thread is not None and self.gui_thread.halt())
+
+	def updateStatus(self, **kwargs):
+		if self.gui_thread is not None:
+			self.gui_thread.updateStatus(**kwargs)
+
+
+###
+# Batch solving helpers. These live at module level so that worker processes can find them.
+###
+
+# Solves a single (index, parseClue arguments) task, handing back any exception instead of raising it.
+def _solve(parser, task):
+	index, args = task
+	try:
+		return index, parser.parseClue(**args)
+	except Exception as e:
+		logger.debug('Clue #%i (%s) failed: %r' % (index, args.get('clue'), e))
+		return index, e
+
+_WORKER_PARSER = None
+def workerParser():
+	"""
+	Returns the ClueParser owned by this worker process, for tasks submitted directly to a pool from openPool().
+	"""
+
+	return _WORKER_PARSER
+
+_CANCEL_FLAGS = None
+def workerCancelled(slot):
+	"""
+	Returns a function that checks whether the task given the cancel slot has been called off, for passing on to
+	 parseClue as its cancelled argument, in a worker of a pool from openPool().
+	"""
+
+	flags = _CANCEL_FLAGS
+	return lambda: flags[slot] != 0
+
+def _initWorker(cancel_flags, spawned):
+	global _WORKER_PARSER, _CANCEL_FLAGS
+	if spawned:
+		_WORKER_PARSER = ClueParser()
+	_CANCEL_FLAGS = cancel_flags
+	# Workers leave through os._exit, skipping atexit, but multiprocessing runs its own finalisers first.
+	multiprocessing.util.Finalize(_WORKER_PARSER, _WORKER_PARSER.close, exitpriority=10)
+
+def _solveInWorker(task):
+	return _solve(_WORKER_PARSER, task)
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+"""
+The clue corpus: every clue from the archive of SMH puzzles (in Across Lite .puz format), extracted once and
+ stored as a section of its own dictionary file (see dictfile), so that benchmarks can start instantly.
+Each entry records:
+	-the puzzle it comes from, its number and direction, and the grid cell it starts at
+	-the clue text (as printed, enumeration included) and the enumeration on its own
+	-the answer
+	-its crossings: for each letter of the answer, the crossing entry and the letter's position within it
+Entries are numbered in the order they appear in their puzzle's clue list (across and down interleaved, by
+ clue number), puzzle after puzzle. They can be accessed at random (corpus[i]), streamed (iter(corpus)),
+ fetched a puzzle at a time, or sampled.
+The corpus is rebuilt automatically whenever the archive changes. Run this module directly to (re)build it.
+"""
+
+# Python libraries
+import os
+import re  # regex library
+import glob  # library for retrieving file name lists from directories
+import struct
+import random
+import hashlib
+import numpy as np  # numerical module, used for the corpus arrays
+
+# Other CCS modules
+import dictfile  # container for the precompiled dictionary structures
+import log  # module for giving runtime feedback to the user
+
+__author__ = 'Jarek Glowacki'
+logger = log.getLogger(__name__, streamLevel=log.INFO)
+
+ARCHIVE_PATH = 'smh/'
+CORPUS_PATH = 'dict/custom/corpus.dat'
+CORPUS_VERSION = 1
+
+ACROSS, DOWN = 0, 1
+DIRECTIONS = ('across', 'down')
+BLACK = '.'
+
+# The fixed part of a .puz file: checksum, magic, checksums, version, reserved, scrambled checksum, reserved,
+#  width, height, number of clues, puzzle type and scrambled state.
+_HEADER = struct.Struct('<H12sH8s4s2sH12sBBHHH')
+_MAGIC = b'ACROSS&DOWN\x00'
+# The puzzles' text is Windows-1252, whose typographic punctuation the solver doesn't expect.
+_PUNCTUATION = str.maketrans({'‘': "'", '’': "'", '“': '"', '”': '"', '–': '-', '—': '-',
+										'…': '...', '\xa0': ' '})
+
+
+class Entry(object):
+	"""
+	A single clue from the corpus, along with its answer and its place in the grid.
+	"""
+
+	def __init__(self, index, puzzle, number, direction, row, col, clue, enumeration, answer, crossings):
+		self.index = index
+		self.puzzle = puzzle
+		self.number = number
+		self.direction = direction  # 'across' or 'down'
+		self.row = row
+		self.col = col
+		self.clue = clue
+		self.enumeration = enumeration
+		self.answer = answer
+		self.crossings = crossings  # for each letter: (index of the crossing entry, position within it), or None
+
+	def __repr__(self):
+		return '<%s: %s %i%s \'%s\' = %s>' % (self.__class__.__name__, self.puzzle, self.number, self.direction[0], self.clue,
+														  self.answer)
+
+
+class Corpus(object):
+	"""
+	A read-only view of the corpus arrays, building them first if they're missing or out of date.
+	"""
+
+	def __init__(self, path=CORPUS_PATH):
+		arrays = dictfile.fetch('corpus', path)
+		self.puzzles = dictfile.StringTable(arrays['puzzles'], arrays['puzzle_offsets'])
+		self._puzzle_entries = arrays['puzzle_entries']
+		self._puzzle = arrays['entry_puzzle']
+		self._number = arrays['entry_number']
+		self._direction = arrays['entry_direction']
+		self._row = arrays['entry_row']
+		self._col = arrays['entry_col']
+		self._clues = dictfile.StringTable(arrays['clues'], arrays['clue_offsets'])
+		self._enumerations = dictfile.StringTable(arrays['enumerations'], arrays['enumeration_offsets'])
+		self._answers = dictfile.StringTable(arrays['answers'], arrays['answer_offsets'])
+		self._crossing_offsets = arrays['crossing_offsets']
+		self._crossing_entry = arrays['crossing_entry']
+		self._crossing_pos = arrays['crossing_pos']
+		self._puzzle_index = None
+
+	def __len__(self):
+		return len(self._number)
+
+	def __getitem__(self, i):
+		if i < 0:
+			i += len(self)
+		if not 0 <= i < len(self):
+			raise IndexError('corpus index out of range')
+		start, end = int(self._crossing_offsets[i]), int(self._crossing_offsets[i+1])
+		crossings = tuple((int(e), int(p)) if e >= 0 else None
+								for e, p in zip(self._crossing_entry[start:end], self._crossing_pos[start:end]))
+		return Entry(i, self.puzzles[int(self._puzzle[i])], int(self._number[i]), DIRECTIONS[self._direction[i]],
+						 int(self._row[i]), int(self._col[i]), self._clues[i], self._enumerations[i], self._answers[i], crossings)
+
+	def __iter__(self):
+		for i in range(len(self)):
+			yield self[i]
+
+	def puzzle(self, puzzle):
+		""" Returns the entries of the given puzzle (an id, or a position in self.puzzles). """
+
+		if isinstance(puzzle, str):
+			if self._puzzle_index is None:
+				self._puzzle_index = {name: p for p, name in enumerate(self.puzzles)}
+			puzzle = self._puzzle_index[puzzle]
+		return [self[i] for i in range(self._puzzle_entries[puzzle], self._puzzle_entries[puzzle+1])]
+
+	def sample(self, n, seed=None):
+		""" Returns n distinct entries picked at random (reproducibly, if given a seed), in corpus order. """
+
+		return [self[i] for i in sorted(random.Random(seed).sample(range(len(self)), min(n, len(self))))]
+
+
+def readPuzzle(filename):
+	"""
+	Reads a .puz file, returning its entries as a list of (number, direction, row, col, clue, answer) tuples,
+	 in the order of its clue list, along with the grid solution (a list of rows).
+	Raises a ValueError if the file isn't a readable .puz file.
+	"""
+
+	with open(filename, 'rb') as f:
+		data = f.read()
+	try:
+		fields = _HEADER.unpack_from(data)
+	except struct.error:
+		raise ValueError('%s is too short to be a .puz file' % filename)
+	magic, width, height, num_clues, scrambled = fields[1], fields[8], fields[9], fields[10], fields[12]
+	if magic != _MAGIC:
+		raise ValueError('%s is not a .puz file' % filename)
+	if scrambled:
+		raise ValueError('The solution to %s is scrambled' % filename)
+
+	# The solution grid is followed by the player's grid, then by the NUL-terminated strings: title, author,
+	#  copyright, the clues in order, and the notes.
+	size = width * height
+	solution = _decode(data[_HEADER.size:_HEADER.size + size])
+	grid = [solution[r * width:(r + 1) * width] for r in range(height)]
+	strings = data[_HEADER.size + 2 * size:].split(b'\x00')
+	clues = [_decode(s) for s in strings[3:3 + num_clues]]
+
+	entries = []
+	number = 0
+	for r in range(height):
+		for c in range(width):
+			if grid[r][c] == BLACK:
+				continue
+			across = (c == 0 or grid[r][c-1] == BLACK) and c + 1 < width and grid[r][c+1] != BLACK
+			down = (r == 0 or grid[r-1][c] == BLACK) and r + 1 < height and grid[r+1][c] != BLACK
+			if not (across or down):
+				continue
+			number += 1
+			if across:
+				entries.append((number, ACROSS, r, c, _scan(grid, r, c, 0, 1)))
+			if down:
+				entries.append((number, DOWN, r, c, _scan(grid, r, c, 1, 0)))
+	if len(entries) != len(clues):
+		raise ValueError('%s has %i clues for %i grid entries' % (filename, len(clues), len(entries)))
+	return [(number, direction, r, c, clue, answer) for (number, direction, r, c, answer), clue in zip(entries, clues)], grid
+
+def enumeration(clue, answer):
+	""" Returns the enumeration given at the end of the clue, or else the length of the answer. """
+
+	match = re.search(r'\(([\d,\- ]+)\)\s*\Z', clue)
+	return match.group(1).replace(' ', '') if match else str(len(answer))
+
+def archiveHash(path=ARCHIVE_PATH):
+	"""
+	Returns a hash of the names, sizes and modification times of the archive's puzzles, which identifies the
+	 archive the corpus was built from.
+	"""
+
+	h = hashlib.sha1()
+	for filename in sorted(glob.glob(os.path.join(path, '*.puz'))):
+		st = os.stat(filename)
+		h.update(('%s:%i:%i\n' % (os.path.basename(filename), st.st_size, st.st_mtime_ns)).encode('utf-8'))
+	return h.hexdigest()
+
+
+###
+# Some auxiliary functions.
+###
+
+def _decode(raw):
+	return raw.decode('cp1252', errors='replace').translate(_PUNCTUATION)
+
+# Returns the word starting at (r, c) and running in the direction (dr, dc).
+def _scan(grid, r, c, dr, dc):
+	letters = []
+	while r < len(grid) and c < len(grid[r]) and grid[r][c] != BLACK:
+		letters.append(grid[r][c])
+		r, c = r + dr, c + dc
+	return ''.join(letters)
+
+# Reads every puzzle in the archive, returning the corpus arrays.
+def _compileCorpus(path=ARCHIVE_PATH):
+	puzzles, puzzle_entries = [], [0]
+	numbers, directions, rows, cols, clues, enumerations, answers = [], [], [], [], [], [], []
+	crossing_entry, crossing_pos, crossing_offsets = [], [], [0]
+	for filename in sorted(glob.glob(os.path.join(path, '*.puz'))):
+		try:
+			entries, grid = readPuzzle(filename)
+		except ValueError as e:
+			logger.warning('Skipping puzzle: %s' % e)
+			continue
+
+		# Note which entry (and which of its letters) covers each cell, in either direction.
+		first = len(answers)
+		cells = {}
+		for i, (number, direction, r, c, clue, answer) in enumerate(entries, first):
+			dr, dc = (0, 1) if direction == ACROSS else (1, 0)
+			for pos in range(len(answer)):
+				cells[(r + pos * dr, c + pos * dc, direction)] = (i, pos)
+		for i, (number, direction, r, c, clue, answer) in enumerate(entries, first):
+			dr, dc = (0, 1) if direction == ACROSS else (1, 0)
+			for pos in range(len(answer)):
+				entry, other = cells.get((r + pos * dr, c + pos * dc, 1 - direction), (-1, 0))
+				crossing_entry.append(entry)
+				crossing_pos.append(other)
+			crossing_offsets.append(len(crossing_entry))
+			numbers.append(number)
+			directions.append(direction)
+			rows.append(r)
+			cols.append(c)
+			clues.append(clue)
+			enumerations.append(enumeration(clue, answer))
+			answers.append(answer)
+		puzzles.append(os.path.splitext(os.path.basename(filename))[0])
+		puzzle_entries.append(len(answers))
+
+	arrays = {'puzzle_entries': np.array(puzzle_entries, dtype='<i8'),
+				 'entry_puzzle': np.repeat(np.arange(len(puzzles), dtype='<i4'), np.diff(puzzle_entries)),
+				 'entry_number': np.array(numbers, dtype=np.uint16),
+				 'entry_direction': np.array(directions, dtype=np.uint8),
+				 'entry_row': np.array(rows, dtype=np.uint8),
+				 'entry_col': np.array(cols, dtype=np.uint8),
+				 'crossing_offsets': np.array(crossing_offsets, dtype='<i8'),
+				 'crossing_entry': np.array(crossing_entry, dtype='<i4'),
+				 'crossing_pos': np.array(crossing_pos, dtype=np.uint8)}
+	for name, strings in [('puzzle', puzzles), ('clue', clues), ('enumeration', enumerations), ('answer', answers)]:
+		arrays[name + 's'], arrays[name + '_offsets'] = dictfile.StringTable.pack(strings)
+	logger.info('Compiled %i clues from %i puzzles.' % (len(answers), len(puzzles)))
+	return arrays
+
+dictfile.register('corpus', CORPUS_VERSION, _compileCorpus, archiveHash)
+
+
+# If this script is executed directly, bring the corpus up to date.
+if __name__ == '__main__':
+	rebuilt = dictfile.build(['corpus'], path=CORPUS_PATH)
+	c = Corpus()
+	logger.info('Corpus %s: %i clues from %i puzzles.' % ('rebuilt' if rebuilt else 'already up to date', len(c), len(c.puzzles)))
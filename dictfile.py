@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+
+"""
+The container format for all of CCS's precompiled dictionary structures (pattern index, anagram groups,
+ run automaton, etc.), which are derived from the wordlist and are too slow to rebuild on every run.
+Each structure is stored as a named section made up of flat arrays. The file starts with a small header,
+ recording the container format version, and for each section its version, the hash of the source it was
+ built from (the wordlist, unless its owner says otherwise), and the offsets of its arrays. The arrays
+ themselves are memory-mapped straight out of the file without being copied, so loading is practically
+ instantaneous and their pages are shared between processes.
+A section is considered stale (and gets rebuilt) if it is missing, if its version differs from the one its
+ owner registered, or if its source has changed since it was built.
+A file that's mapped can't be replaced everywhere (Windows refuses to), and the arrays of its sections stay in use
+ for as long as the process runs. So the file is never overwritten: each rebuild writes out a fresh generation of it
+ alongside (eg. ccs.3.dat in place of ccs.dat or ccs.2.dat), and the newest generation is the one that gets read.
+ Older generations are deleted once nothing has them mapped any more.
+Run this module directly to bring every section up to date.
+"""
+
+# Python libraries
+import os
+import re  # regex library
+import glob  # library for retrieving file name lists from directories
+import mmap
+import json
+import struct
+import hashlib
+import zlib  # for the crc32 hash of SortedMultiMap keys
+from collections import OrderedDict
+import numpy as np  # numerical module, used for the zero-copy array views
+
+# Other CCS modules
+import log  # module for giving runtime feedback to the user
+
+__author__ = 'Jarek Glowacki'
+logger = log.getLogger(__name__, streamLevel=log.INFO)
+
+FORMAT_VERSION = 2
+DICT_PATH = 'dict/custom/ccs.dat'
+WORDLIST_PATH = 'dict/wordlist.dic'
+
+_MAGIC = b'CCSDICT\x00'
+_PREAMBLE = struct.Struct('<8sII')  # magic, format version, header length
+_ALIGNMENT = 64
+
+
+class StaleSectionError(LookupError):
+	"""
+	Raised when a requested section is missing from the dictionary file, or is out of date.
+	"""
+	pass
+
+
+###
+# Section registry and the build entry point.
+###
+
+_SECTIONS = OrderedDict()  # name -> (version, builder, source)
+def register(name, version, builder, source=None):
+	"""
+	Registers a section, along with the function that builds it.
+	The builder takes no arguments and returns a dict of numpy arrays.
+	Bump the version whenever the layout of the section's arrays changes.
+	Sections built from something other than the wordlist should also pass a source function, returning a
+	 hash that identifies what the section is built from (see wordlistHash).
+	"""
+
+	_SECTIONS[name] = (version, builder, source or wordlistHash)
+
+def build(names=None, force=False, path=DICT_PATH):
+	"""
+	Rebuilds those registered sections that are out of date (or all of them, if forced), leaving the
+	 rest untouched. Returns the names of the sections that were rebuilt.
+	"""
+
+	names = list(_SECTIONS) if names is None else names
+	rebuilt = OrderedDict()
+	for name in names:
+		if force or isStale(name, path):
+			logger.info('Building \'%s\' dictionary section..' % name)
+			rebuilt[name] = _SECTIONS[name][1]()
+	if rebuilt:
+		_write(path, rebuilt)
+	return list(rebuilt)
+
+def isStale(name, path=DICT_PATH):
+	""" Checks whether the given section needs to be rebuilt. """
+
+	try:
+		load(name, path)
+	except (FileNotFoundError, StaleSectionError):
+		return True
+	return False
+
+def load(name, path=DICT_PATH):
+	"""
+	Returns the arrays of the given section as read-only, memory-mapped numpy arrays.
+	Raises a FileNotFoundError if there is no dictionary file yet, or a StaleSectionError if the section
+	 is missing or out of date.
+	"""
+
+	container = _open(path)
+	try:
+		section = container.header['sections'][name]
+	except KeyError:
+		raise StaleSectionError('No \'%s\' section in %s' % (name, path))
+	if section['version'] != _SECTIONS[name][0] or section['source'] != _SECTIONS[name][2]():
+		raise StaleSectionError('The \'%s\' section in %s is out of date' % (name, path))
+	return {arr: np.frombuffer(container.mapping, dtype=meta['dtype'], count=int(np.prod(meta['shape'])),
+										offset=meta['offset']).reshape(meta['shape'])
+			  for arr, meta in section['arrays'].items()}
+
+def store(name, arrays, path=DICT_PATH):
+	"""
+	Writes a freshly built section out to the dictionary file, keeping all other sections as they are.
+	"""
+
+	_write(path, {name: arrays})
+
+def fetch(name, path=DICT_PATH):
+	"""
+	Loads the given section, first (re)building it if it's out of date.
+	"""
+
+	try:
+		return load(name, path)
+	except FileNotFoundError:
+		logger.info('No pre-compiled dictionary file present.. building new one!')
+	except StaleSectionError as e:
+		logger.info('%s.. rebuilding it!' % e)
+	build([name], force=True, path=path)
+	return load(name, path)
+
+_WORDLIST_HASH = (None, None)
+def wordlistHash(path=WORDLIST_PATH):
+	"""
+	Returns a hash of the wordlist file, which identifies the wordlist that the sections were built from.
+	"""
+
+	global _WORDLIST_HASH
+	st = os.stat(path)
+	key = (path, st.st_size, st.st_mtime_ns)
+	if _WORDLIST_HASH[0] != key:
+		with open(path, 'rb') as f:
+			_WORDLIST_HASH = (key, hashlib.sha1(f.read()).hexdigest())
+	return _WORDLIST_HASH[1]
+
+
+###
+# Zero-copy string containers, for storing word lists inside sections.
+###
+
+class StringTable(object):
+	"""
+	A read-only sequence of strings, stored as one byte blob plus an array of offsets into it.
+	"""
+
+	def __init__(self, blob, offsets):
+		self._blob = memoryview(blob)
+		self._offsets = memoryview(offsets)
+
+	@staticmethod
+	def pack(strings):
+		""" Returns the (blob, offsets) arrays for the given strings. """
+
+		encoded = [s.encode('utf-8') for s in strings]
+		offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+		np.cumsum([len(e) for e in encoded], out=offsets[1:])
+		return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+	def __getitem__(self, i):
+		return str(self._blob[self._offsets[i]:self._offsets[i+1]], 'utf-8')
+
+	def __len__(self):
+		return len(self._offsets) - 1
+
+
+class SortedMultiMap(object):
+	"""
+	A read-only mapping from strings to sets of strings, stored as two string tables: the sorted keys, and
+	 their values laid out group by group. Lookups go through a sorted array of key hashes (which numpy can
+	 search without decoding any keys along the way), with the positions of their keys alongside.
+	"""
+
+	def __init__(self, arrays):
+		self._keys = StringTable(arrays['keys'], arrays['key_offsets'])
+		self._values = StringTable(arrays['values'], arrays['value_offsets'])
+		self._groups = memoryview(arrays['groups'])
+		self._hashes = arrays['key_hashes']
+		self._hashList = memoryview(arrays['key_hashes'])  # for fast element access
+		self._order = memoryview(arrays['hash_order'])
+
+	@staticmethod
+	def pack(mapping):
+		""" Returns the arrays representing the given dict of sets. """
+
+		keys = sorted(mapping)
+		arrays = {}
+		arrays['keys'], arrays['key_offsets'] = StringTable.pack(keys)
+		arrays['values'], arrays['value_offsets'] = StringTable.pack([v for k in keys for v in sorted(mapping[k])])
+		arrays['groups'] = np.zeros(len(keys) + 1, dtype='<i8')
+		np.cumsum([len(mapping[k]) for k in keys], out=arrays['groups'][1:])
+		hashes = np.array([_keyHash(k) for k in keys], dtype='<u4')
+		arrays['hash_order'] = np.argsort(hashes, kind='stable').astype('<i8')
+		arrays['key_hashes'] = hashes[arrays['hash_order']]
+		return arrays
+
+	def __getitem__(self, key):
+		h = _keyHash(key)
+		i = int(self._hashes.searchsorted(np.uint32(h)))
+		# Distinct keys may (very rarely) share a hash, so check each candidate's actual key.
+		while i < len(self._hashList) and self._hashList[i] == h:
+			pos = self._order[i]
+			if self._keys[pos] == key:
+				return {self._values[j] for j in range(self._groups[pos], self._groups[pos+1])}
+			i += 1
+		raise KeyError(key)
+
+	def __contains__(self, key):
+		try:
+			self[key]
+		except KeyError:
+			return False
+		return True
+
+	def __len__(self):
+		return len(self._keys)
+
+
+###
+# Some auxiliary functions.
+###
+
+# Returns the 32 bit hash that SortedMultiMap files its keys under (stable across processes, unlike hash()).
+def _keyHash(key):
+	return zlib.crc32(key.encode('utf-8'))
+
+# An open dictionary file: its parsed header and its memory map.
+class _Container(object):
+	def __init__(self, header, mapping, stat):
+		self.header = header
+		self.mapping = mapping
+		self.stat = stat
+
+_CONTAINERS = {}
+# Returns the (cached) open container at the given path, re-opening it if a newer generation has since been written.
+def _open(path):
+	while True:
+		filename = _generations(path)[-1][1]
+		try:
+			st = os.stat(filename)
+			break
+		except FileNotFoundError:
+			# Unless it's just been superseded (and cleared away) by another process, there's no file yet.
+			if _generations(path)[-1][1] == filename:
+				raise
+	stat = (filename, st.st_ino, st.st_size, st.st_mtime_ns)
+	container = _CONTAINERS.get(path)
+	if container is None or container.stat != stat:
+		try:
+			with open(filename, 'rb') as f:
+				mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			magic, version, header_len = _PREAMBLE.unpack_from(mapping)
+			if magic != _MAGIC:
+				raise ValueError('Not a CCS dictionary file: %s' % filename)
+			header = json.loads(bytes(mapping[_PREAMBLE.size:_PREAMBLE.size + header_len]).decode('utf-8'))
+		except (struct.error, ValueError) as e:
+			logger.warning('Dictionary file %s is corrupted (%s); ignoring it.' % (filename, e))
+			mapping, version, header = None, None, {'sections': {}}
+		if version != FORMAT_VERSION:
+			# Written by a different version of CCS; every section will need to be rebuilt.
+			header = {'sections': {}}
+		container = _CONTAINERS[path] = _Container(header, mapping, stat)
+	return container
+
+# Writes the dictionary file, replacing the given sections and carrying over all other (still valid) ones.
+def _write(path, sections):
+	try:
+		old = _open(path)
+	except FileNotFoundError:
+		old = None
+
+	# Gather up every section's arrays, along with the metadata that goes into the header.
+	contents = OrderedDict()
+	if old is not None:
+		for name, section in old.header['sections'].items():
+			if name not in sections:
+				arrays = {arr: old.mapping[meta['offset']:meta['offset'] + meta['nbytes']]
+							 for arr, meta in section['arrays'].items()}
+				contents[name] = (section, arrays)
+	for name, arrays in sections.items():
+		arrays = {arr: np.ascontiguousarray(a) for arr, a in arrays.items()}
+		section = {'version': _SECTIONS[name][0], 'source': _SECTIONS[name][2](),
+					  'arrays': {arr: {'dtype': a.dtype.str, 'shape': list(a.shape), 'nbytes': a.nbytes}
+									 for arr, a in arrays.items()}}
+		contents[name] = (section, {arr: a.reshape(-1).view(np.uint8) for arr, a in arrays.items()})
+
+	# Lay the arrays out after the header. As the offsets are stored in the header itself, grow the
+	#  space reserved for it until everything fits.
+	reserved = 4096
+	while True:
+		offset = _align(_PREAMBLE.size + reserved)
+		header = {'sections': OrderedDict()}
+		for name, (section, arrays) in contents.items():
+			start = offset
+			section = dict(section, arrays={arr: dict(meta) for arr, meta in section['arrays'].items()})
+			for arr, meta in section['arrays'].items():
+				meta['offset'] = offset
+				offset = _align(offset + meta['nbytes'])
+			section['offset'], section['length'] = start, offset - start
+			header['sections'][name] = section
+		encoded = json.dumps(header).encode('utf-8')
+		if len(encoded) <= reserved:
+			break
+		reserved *= 2
+
+	# Write to a temporary file first, so that other processes never see a half-written dictionary.
+	tmp = '%s.%i.tmp' % (path, os.getpid())
+	with open(tmp, 'wb') as f:
+		f.write(_PREAMBLE.pack(_MAGIC, FORMAT_VERSION, len(encoded)))
+		f.write(encoded)
+		for name, (section, arrays) in contents.items():
+			for arr, meta in header['sections'][name]['arrays'].items():
+				f.seek(meta['offset'])
+				f.write(arrays[arr])
+		f.truncate(offset)
+
+	# Move it in as the next generation, rather than over the current one, which may well be mapped.
+	generations = _generations(path)
+	generation = generations[-1][0] + 1
+	while True:
+		filename = _generationName(path, generation)
+		try:
+			os.replace(tmp, filename)
+			break
+		except PermissionError:
+			# Another process has just written (and mapped) this generation; move on past it.
+			generation += 1
+	for _, old_filename in generations:
+		try:
+			os.remove(old_filename)
+		except OSError:
+			pass  # still mapped (or already gone); it'll be cleared away by a later write
+	logger.debug('Wrote dictionary file %s (sections: %s)' % (filename, ', '.join(header['sections'])))
+
+# Returns the (generation, filename) pairs of the existing generations of the dictionary file at the given path,
+#  oldest first. The path itself counts as generation 0, and is also what's returned if there are none at all.
+def _generations(path):
+	base, ext = os.path.splitext(path)
+	pattern = re.compile(re.escape(base) + r'\.(\d+)' + re.escape(ext))
+	generations = [(int(match.group(1)), filename) for filename in glob.glob(glob.escape(base) + '.*' + ext)
+						for match in [pattern.fullmatch(filename)] if match]
+	if os.path.exists(path) or not generations:
+		generations.append((0, path))
+	return sorted(generations)
+
+def _generationName(path, generation):
+	base, ext = os.path.splitext(path)
+	return '%s.%i%s' % (base, generation, ext)
+
+def _align(offset):
+	return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+# If this script is executed directly, bring every dictionary section up to date.
+if __name__ == '__main__':
+	import dictfile  # the registry lives in the imported module, not in __main__
+	import wordnet, wordplay  # importing these registers their sections
+	rebuilt = dictfile.build()
+	logger.info('Rebuilt sections: %s' % (', '.join(rebuilt) if rebuilt else 'none (all up to date)'))
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""
+Solves whole puzzles, rather than clues in isolation, by letting the clues' answers constrain one another
+ through the letters they share.
+Every clue is first solved on its own. Then, most confident answer first, answers are written into the grid:
+ their letters become known letters of the crossing clues, whose candidates are narrowed down (in place) to
+ those that fit. A clue whose candidates all get ruled out is solved again once enough of its letters are
+ known, this time brute forcing the wordlist for words that fit. This carries on until no answer left is
+ confident enough to write in.
+The grid is filled in greedily: an answer, once written in, is never taken back.
+A puzzle can be solved straight from the clue corpus:
+	solver = PuzzleSolver(ClueParser())
+	candidates = solver.solve(corpus.Corpus().puzzle('2004-05-03_Mon_RM'))
+"""
+
+# Python libraries
+import re  # regex library
+import pdb  # live debugging module
+
+# Other CCS modules
+from clue_parser import ClueParser
+from exceptions import *  # custom CCS exceptions
+import log  # module for giving runtime feedback to the user
+
+__author__ = 'Jarek Glowacki'
+logger = log.getLogger(__name__, streamLevel=log.INFO)
+
+MIN_CERTAINTY = 0.8  # answers less certain than this are never written into the grid
+MIN_KNOWN = 0.5  # fraction of a clue's letters that must be known before it's brute forced
+
+
+class PuzzleSolver(object):
+	def __init__(self, cp=None, min_certainty=MIN_CERTAINTY, min_known=MIN_KNOWN):
+		self.cp = cp or ClueParser()
+		self.min_certainty = min_certainty
+		self.min_known = min_known
+
+	def solve(self, entries, **kwargs):
+		"""
+		Solves the given puzzle entries together. Each entry needs a clue, and its crossings: for each letter
+		 of its answer, the (index, position) of the crossing entry's letter, or None if it's unchecked.
+		 Indices may refer either to positions in the given list or to corpus indices (see corpus.Entry).
+		Any keyword arguments are passed on to parseClue (eg. budget_ms).
+		Returns each entry's candidate solutions, best first (or None for clues the parser doesn't support). Those
+		 of an entry whose answer got written into the grid start with that answer.
+		"""
+
+		slots = [_Slot(entry.clue, len(entry.crossings)) for entry in entries]
+		local = {getattr(entry, 'index', i): i for i, entry in enumerate(entries)}
+		for slot, entry in zip(slots, entries):
+			slot.crossings = [(local[c[0]], c[1]) if c is not None and c[0] in local else None for c in entry.crossings]
+
+		# Start off with every clue solved on its own.
+		for slot in slots:
+			self._solveSlot(slot, **kwargs)
+
+		while True:
+			# Write in the most confident answer left, preferring wordplay over brute forcing.
+			open_slots = [slot for slot in slots if slot.answer is None and slot.candidates]
+			if open_slots:
+				slot = max(open_slots, key=lambda s: _rank(s.candidates[0]))
+				if slot.candidates[0].certainty >= self.min_certainty:
+					self._commit(slot, slots)
+					continue
+
+			# Nothing left to write in, so try brute forcing the clues that have since gained enough letters.
+			stale = [slot for slot in slots if slot.answer is None and not slot.unsupported and not slot.candidates
+						and slot.solved_with != slot.pattern() and slot.knownFraction() >= self.min_known]
+			if not stale:
+				break
+			for slot in stale:
+				self._solveSlot(slot, brute_force=True, **kwargs)
+
+		logger.info('Wrote %i of %i answers into the grid.' % (sum(slot.answer is not None for slot in slots), len(slots)))
+		return [None if slot.unsupported else slot.candidates for slot in slots]
+
+	def _solveSlot(self, slot, brute_force=False, **kwargs):
+		""" (Re-)solves a slot's clue, given the letters known so far. """
+
+		pattern = slot.pattern()
+		known = pattern if '?' not in pattern or brute_force else None
+		try:
+			solutions = self.cp.parseClue(slot.clue, length=slot.length, known_letters=known, brute_force=brute_force, **kwargs)
+		except (UnsupportedClueException, SolutionLengthMismatchException) as e:
+			logger.debug('Skipping clue \'%s\': %r' % (slot.clue, e))
+			slot.unsupported = True
+			return
+		slot.solved_with = pattern
+		slot.candidates = solutions
+		slot.narrow()
+
+	def _commit(self, slot, slots):
+		""" Writes a slot's best candidate into the grid, narrowing down the candidates of the slots it crosses. """
+
+		best = slot.candidates[0]
+		slot.answer = _letters(best.solution)
+		slot.candidates = [best] + [s for s in slot.candidates[1:] if _letters(s.solution) == slot.answer]
+		logger.debug('Writing in %s for \'%s\' (certainty: %f)' % (slot.answer.upper(), slot.clue, best.certainty))
+		for pos, crossing in enumerate(slot.crossings):
+			if crossing is None:
+				continue
+			other = slots[crossing[0]]
+			if other.known[crossing[1]] is None:
+				other.known[crossing[1]] = slot.answer[pos]
+				if other.answer is None:
+					other.narrow()
+
+
+###
+# Some auxiliary functions.
+###
+
+# A puzzle entry being solved: its clue, the letters known so far and its remaining candidates.
+class _Slot(object):
+	def __init__(self, clue, length):
+		self.clue = clue
+		self.length = length
+		self.known = [None] * length
+		self.crossings = []
+		self.candidates = []
+		self.answer = None
+		self.unsupported = False
+		self.solved_with = None  # the known letters pattern when the clue was last solved
+
+	def pattern(self):
+		return ''.join(letter or '?' for letter in self.known)
+
+	def knownFraction(self):
+		return sum(letter is not None for letter in self.known) / self.length
+
+	def narrow(self):
+		""" Drops the candidates that don't fit the known letters (or the slot). """
+
+		self.candidates = [s for s in self.candidates if _fits(_letters(s.solution), self.known)]
+
+def _letters(solution):
+	return re.sub('[^a-z]', '', solution.lower())
+
+def _fits(letters, known):
+	return len(letters) == len(known) and all(k is None or k == l for l, k in zip(letters, known))
+
+# Brute-forced solutions rank below all others, as in ClueParser.parseClue.
+def _rank(solution):
+	return (solution.typ != 'brute-forced', solution.certainty)
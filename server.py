@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+
+"""
+A local solving service, speaking JSON lines over TCP, for front ends that would rather not embed the CCS.
+Start it with:
+	py server.py [--host 127.0.0.1] [--port 8765] [--workers N]
+Each request is one JSON object per line:
+	{"id": 1, "clue": "Zoroastrian pairs dancing. (5)", "top_k": 3, "deadline_ms": 500}
+Besides 'clue', the optional fields are 'length', 'typ', 'known_letters', 'brute_force' and 'top_k' (as for
+ ClueParser.parseClue), and 'deadline_ms', the time within which a response is due. Each request is answered by
+ one line carrying the same id, with either a list of 'solutions' or an 'error'. Responses go out as soon as
+ they're ready, so they may arrive out of order.
+A request can be withdrawn with {"cancel": <id>}, and {"stats": true} returns the service's counters.
+
+The clues are solved by a warm pool of worker processes (see ClueParser.openPool). Concurrent requests for the
+ same clue with the same options are merged into a single computation, whose answer goes to all of them. Its time
+ budget is set by whichever request started it, so a request only joins a computation that's allowed to run about
+ as long as the request would be (otherwise it'd get a cut short answer); requests that join it still get their
+ response by their own deadline, or a 'deadline exceeded' error if it isn't ready by then. A computation that every
+ one of its requests has given up on is abandoned, and its worker is told to stop solving it.
+"""
+
+# Python libraries
+import re  # regex library
+import json
+import time
+import asyncio
+import argparse
+import pdb  # live debugging module
+
+# Other CCS modules
+import clue_parser
+from clue_parser import ClueParser
+import log  # module for giving runtime feedback to the user
+
+__author__ = 'Jarek Glowacki'
+logger = log.getLogger(__name__, streamLevel=log.INFO)
+
+HOST = '127.0.0.1'
+PORT = 8765
+OPTIONS = ('length', 'typ', 'known_letters', 'brute_force', 'top_k')
+DEADLINE_SHARE = 0.8  # fraction of the time left that the solver may use, leaving the rest for overheads
+COALESCE_SLACK = 0.05  # seconds by which a computation's deadline may fall short of a request's, for it to join
+
+
+class SolveService(object):
+	"""
+	Handles requests, merging concurrent ones for the same clue and options into a single computation.
+	The actual solving is done by the given submit coroutine function, which takes a dict of parseClue
+	 arguments and returns the list of solutions (as plain dicts).
+	"""
+
+	def __init__(self, submit):
+		self.submit = submit
+		self._inflight = {}  # computation key -> _Computation
+		self.counters = {'requests': 0, 'computations': 0, 'coalesced': 0, 'cancelled': 0, 'timeouts': 0, 'errors': 0}
+
+	async def solve(self, request):
+		"""
+		Returns the solutions to the given request (a dict, as described in the module docstring).
+		Raises an asyncio.TimeoutError if they aren't ready by the request's deadline.
+		"""
+
+		self.counters['requests'] += 1
+		args = {'clue': request['clue']}
+		args.update((option, request[option]) for option in OPTIONS if request.get(option) is not None)
+		timeout = request['deadline_ms'] / 1000 if request.get('deadline_ms') is not None else None
+		deadline = time.time() + timeout * DEADLINE_SHARE if timeout is not None else None
+
+		key = computationKey(args)
+		computation = self._inflight.get(key)
+		if computation is None or not computation.allows(deadline):
+			# Any computation already under way stays with the requests waiting on it.
+			if deadline is not None:
+				args['deadline'] = deadline
+			computation = self._inflight[key] = _Computation(asyncio.ensure_future(self.submit(args)), deadline)
+			computation.task.add_done_callback(lambda _: self._forget(key, computation))
+			self.counters['computations'] += 1
+		else:
+			self.counters['coalesced'] += 1
+
+		computation.waiters += 1
+		try:
+			return await asyncio.wait_for(asyncio.shield(computation.task), timeout)
+		except asyncio.TimeoutError:
+			self.counters['timeouts'] += 1
+			raise
+		except asyncio.CancelledError:
+			self.counters['cancelled'] += 1
+			raise
+		finally:
+			computation.waiters -= 1
+			if computation.waiters == 0 and not computation.task.done():
+				logger.debug('Abandoning computation for %s' % (key,))
+				computation.task.cancel()
+				self._forget(key, computation)
+
+	def _forget(self, key, computation):
+		if self._inflight.get(key) is computation:
+			del self._inflight[key]
+
+	def stats(self):
+		return dict(self.counters, inflight=len(self._inflight))
+
+	async def handleConnection(self, reader, writer):
+		"""
+		Serves one client connection, answering each request line as soon as its solutions are ready.
+		"""
+
+		requests = {}  # id -> task
+		lock = asyncio.Lock()
+
+		async def respond(response):
+			async with lock:
+				if writer.is_closing():
+					return
+				writer.write((json.dumps(response) + '\n').encode('utf-8'))
+				await writer.drain()
+
+		async def answer(rid, request):
+			try:
+				response = {'id': rid, 'solutions': await self.solve(request)}
+			except asyncio.TimeoutError:
+				response = {'id': rid, 'error': 'deadline exceeded'}
+			except Exception as e:
+				self.counters['errors'] += 1
+				response = {'id': rid, 'error': '%s: %s' % (e.__class__.__name__, e)}
+			finally:
+				requests.pop(rid, None)
+			await respond(response)
+
+		try:
+			num = 0
+			async for line in reader:
+				num += 1
+				try:
+					request = json.loads(line.decode('utf-8'))
+				except ValueError:
+					request = None
+				if not isinstance(request, dict):
+					await respond({'id': None, 'error': 'malformed request (line %i)' % num})
+					continue
+				if request.get('stats'):
+					await respond({'id': request.get('id'), 'stats': self.stats()})
+				elif 'cancel' in request:
+					# Answered here, as a task cancelled before it gets going never runs at all.
+					task = requests.pop(request['cancel'], None)
+					if task is not None:
+						task.cancel()
+						await respond({'id': request['cancel'], 'error': 'cancelled'})
+				elif 'clue' in request:
+					rid = request.get('id', num)
+					requests[rid] = asyncio.ensure_future(answer(rid, request))
+				else:
+					await respond({'id': request.get('id'), 'error': 'request has no clue'})
+		except ConnectionError:
+			pass
+		finally:
+			# The client has gone; there's no one left to answer.
+			for task in list(requests.values()):
+				task.cancel()
+			writer.close()
+
+
+def computationKey(args):
+	"""
+	Returns the key identifying the computation for the given parseClue arguments: the normalised clue (lower
+	 case, single spaced) along with the solving options.
+	"""
+
+	clue = re.sub(r'\s+', ' ', args['clue']).strip().lower()
+	return (clue, json.dumps({k: v for k, v in args.items() if k in OPTIONS}, sort_keys=True))
+
+def poolSubmitter(pool):
+	"""
+	Returns a submit coroutine function (see SolveService) that hands the work to a pool from ClueParser.openPool.
+	Each job holds one of the pool's cancel slots while it's queued or running, so that when its computation is
+	 abandoned (cancelling the submit call), the worker stops solving it too.
+	"""
+
+	free_slots = list(range(len(pool.cancel_flags)))
+
+	async def submit(args):
+		loop = asyncio.get_running_loop()
+		future = loop.create_future()
+		# Should every slot be taken, the job just runs to completion even if abandoned.
+		slot = free_slots.pop() if free_slots else None
+		if slot is not None:
+			pool.cancel_flags[slot] = 0
+		def settle(method, value):
+			# The job is over, so its slot can go to another.
+			if slot is not None:
+				free_slots.append(slot)
+			if not future.done():
+				method(value)
+		pool.apply_async(solveInWorker, (args, slot),
+							  callback=lambda result: loop.call_soon_threadsafe(settle, future.set_result, result),
+							  error_callback=lambda e: loop.call_soon_threadsafe(settle, future.set_exception, e))
+		try:
+			return await future
+		except asyncio.CancelledError:
+			if slot is not None:
+				pool.cancel_flags[slot] = 1
+			raise
+	return submit
+
+def solveInWorker(args, slot=None):
+	"""
+	Solves a clue in a pool worker, returning its solutions as plain dicts.
+	An absolute 'deadline' (a time.time() timestamp) is turned into a time budget for the solver here, so that
+	 time spent queueing counts against it. The solver gives up early if the given cancel slot's flag gets set.
+	"""
+
+	args = dict(args)
+	deadline = args.pop('deadline', None)
+	if deadline is not None:
+		args['budget_ms'] = max(0, deadline - time.time()) * 1000
+	if slot is not None:
+		args['cancelled'] = clue_parser.workerCancelled(slot)
+	return [{'solution': s.solution, 'certainty': s.certainty, 'typ': s.typ, 'definition': s.definition,
+				'wordplay': s.wordplay, 'applied_to': s.applied_to}
+			  for s in clue_parser.workerParser().parseClue(**args)]
+
+###
+# Some auxiliary functions.
+###
+
+class _Computation(object):
+	""" A solve in progress, along with its deadline (if any) and the number of requests waiting on it. """
+
+	def __init__(self, task, deadline=None):
+		self.task = task
+		self.deadline = deadline
+		self.waiters = 0
+
+	def allows(self, deadline):
+		""" Checks whether this computation gets (about) as long to run as a request with the given deadline would. """
+
+		return self.deadline is None or (deadline is not None and self.deadline >= deadline - COALESCE_SLACK)
+
+async def serve(host=HOST, port=PORT, workers=None):
+	cp = ClueParser()
+	with cp.openPool(workers) as pool:
+		service = SolveService(poolSubmitter(pool))
+		server = await asyncio.start_server(service.handleConnection, host, port)
+		logger.info('Serving on %s:%i' % (host, port))
+		async with server:
+			await server.serve_forever()
+
+
+# If this script is executed directly, start up the service.
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Runs the CCS as a local JSON-lines solving service.')
+	parser.add_argument('--host', default=HOST)
+	parser.add_argument('--port', type=int, default=PORT)
+	parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: one per CPU core)')
+	args = parser.parse_args()
+	try:
+		asyncio.run(serve(args.host, args.port, args.workers))
+	except KeyboardInterrupt:
+		pass
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""
+Performance statistics gathered while parsing clues, showing where the time went: which wordplay types
+ and definition splits it was spent on, how much went into scoring candidates against definitions and into
+ brute forcing, how many candidates were generated and how many of them satisfied the clue, and how well
+ the WordNet lookup caches fared.
+ClueParser.parseClue returns one of these records per clue when asked to (with stats=True). Records can be
+ added together, so the statistics for a whole batch of clues are simply the sum of its clues' records.
+Also home to the cost model, which keeps running averages of how long each wordplay type's checks take and
+ how promising their candidates are, so that the parser can try the best value checks first.
+"""
+
+# Python libraries
+import os
+import json
+from collections import Counter
+
+# Other CCS modules
+import log  # module for giving runtime feedback to the user
+
+__author__ = 'Jarek Glowacki'
+logger = log.getLogger(__name__)
+
+LOOKUP_COUNTERS = ('hits', 'backing_hits', 'misses')
+
+
+class ParseStats(object):
+	"""
+	Timings (in seconds) and counters for one or more parsed clues.
+	"""
+
+	def __init__(self):
+		self.clues = 0
+		self.time = 0.0
+		self.wordplay_time = Counter()  # wordplay type -> time spent generating its candidates
+		self.defpos_time = Counter()  # definition split (defpos) -> time spent on it
+		self.scoring_time = 0.0  # time spent scoring candidates against definitions
+		self.brute_force_time = 0.0
+		self.candidates = Counter()  # wordplay type -> number of candidates put to Clue.checkSolution
+		self.accepted = Counter()  # wordplay type -> number of candidates that satisfied the clue
+		self.pruned = 0  # number of candidates left unscored, as they couldn't make the top k
+		self.timeouts = 0  # number of clues whose time budget ran out
+		self.solutions = 0
+		self.lookups = {}  # cache name -> Counter of hits, backing_hits and misses
+
+	def recordLookups(self, before, after):
+		"""
+		Adds the difference between two snapshots of wordnet.getCacheStats() to the lookup counters.
+		"""
+
+		for name, stats in after.items():
+			counts = self.lookups.setdefault(name, Counter())
+			for counter in LOOKUP_COUNTERS:
+				counts[counter] += stats[counter] - before.get(name, {}).get(counter, 0)
+
+	def calls(self, cache):
+		""" Returns the number of lookups through the given cache (eg. 'similarity' or 'synonym'). """
+
+		return sum(self.lookups.get(cache, {}).values())
+
+	def hitRate(self, cache):
+		""" Returns the fraction of lookups through the given cache that were served from it. """
+
+		calls = self.calls(cache)
+		return (calls - self.lookups[cache]['misses']) / calls if calls else 0.0
+
+	def __iadd__(self, other):
+		self.clues += other.clues
+		self.time += other.time
+		self.wordplay_time.update(other.wordplay_time)
+		self.defpos_time.update(other.defpos_time)
+		self.scoring_time += other.scoring_time
+		self.brute_force_time += other.brute_force_time
+		self.candidates.update(other.candidates)
+		self.accepted.update(other.accepted)
+		self.pruned += other.pruned
+		self.timeouts += other.timeouts
+		self.solutions += other.solutions
+		for name, counts in other.lookups.items():
+			self.lookups.setdefault(name, Counter()).update(counts)
+		return self
+
+	def __add__(self, other):
+		total = ParseStats()
+		total += self
+		total += other
+		return total
+
+	def __radd__(self, other):
+		# Only reached when adding to sum()'s initial 0.
+		return self + ParseStats()
+
+	def asDict(self):
+		""" Returns the statistics as plain (JSON serialisable) data. """
+
+		return {'clues': self.clues,
+				  'time': self.time,
+				  'wordplay_time': dict(self.wordplay_time),
+				  'defpos_time': {str(k): v for k, v in self.defpos_time.items()},
+				  'scoring_time': self.scoring_time,
+				  'brute_force_time': self.brute_force_time,
+				  'candidates': dict(self.candidates),
+				  'accepted': dict(self.accepted),
+				  'pruned': self.pruned,
+				  'timeouts': self.timeouts,
+				  'solutions': self.solutions,
+				  'lookups': {name: dict(counts, calls=self.calls(name), hit_rate=self.hitRate(name))
+								  for name, counts in self.lookups.items()}}
+
+	def __str__(self):
+		lines = ['%i clue(s) parsed in %.3fs, yielding %i solution(s) (%i timed out).' % (self.clues, self.time, self.solutions,
+																														 self.timeouts)]
+		for typ, t in self.wordplay_time.most_common():
+			lines.append('\t%-18s %8.3fs  %i candidate(s), %i accepted' % (typ, t, self.candidates[typ], self.accepted[typ]))
+		lines.append('\t%-18s %8.3fs  %i candidate(s) pruned' % ('scoring', self.scoring_time, self.pruned))
+		lines.append('\t%-18s %8.3fs  %i candidate(s)' % ('brute-forcing', self.brute_force_time, self.candidates['brute-forced']))
+		for defpos, t in sorted(self.defpos_time.items()):
+			lines.append('\t%-18s %8.3fs' % ('defpos %+i' % defpos, t))
+		for name in sorted(self.lookups):
+			lines.append('\t%s lookups: %i (hit rate %.1f%%)' % (name, self.calls(name), self.hitRate(name) * 100))
+		return '\n'.join(lines)
+
+	def __repr__(self):
+		return '<%s: %i clue(s), %.3fs>' % (self.__class__.__name__, self.clues, self.time)
+
+
+class CostModel(object):
+	"""
+	Running (exponentially weighted) averages, per wordplay type, of the time taken by a check and of its yield,
+	 ie. the highest wordplay certainty among the candidates it produced (0 if none).
+	The averages start off from the given prior costs (in milliseconds) and a neutral yield, and can be saved
+	 and reloaded so that they carry over between runs.
+	"""
+
+	PRIOR_YIELD = 0.5
+
+	def __init__(self, priors, smoothing=0.1):
+		self.smoothing = smoothing
+		self.time = {typ: cost / 1000 for typ, cost in priors.items()}
+		self.yields = {typ: self.PRIOR_YIELD for typ in priors}
+		self.updates = 0  # number of checks recorded since the model was created or loaded
+
+	def record(self, typ, seconds, yielded):
+		""" Folds a finished check into the averages for its wordplay type. """
+
+		a = self.smoothing
+		self.time[typ] = (1 - a) * self.time.get(typ, seconds) + a * seconds
+		self.yields[typ] = (1 - a) * self.yields.get(typ, self.PRIOR_YIELD) + a * yielded
+		self.updates += 1
+
+	def priority(self, typ):
+		""" Returns the expected yield per second of a check of the given wordplay type. """
+
+		return self.yields.get(typ, self.PRIOR_YIELD) / max(self.time.get(typ, 1.0), 1e-6)
+
+	def save(self, path):
+		# Written out whole before replacing the old file, as several processes may be saving at once.
+		tmp = '%s.%i.tmp' % (path, os.getpid())
+		with open(tmp, 'w') as f:
+			json.dump({'smoothing': self.smoothing, 'time': self.time, 'yields': self.yields}, f, indent=1)
+		os.replace(tmp, path)
+
+	@classmethod
+	def load(cls, path, priors=None):
+		""" Loads a saved model. Any wordplay types that it doesn't cover start off from the given priors. """
+
+		with open(path, 'r') as f:
+			data = json.load(f)
+		model = cls(priors or {}, data['smoothing'])
+		model.time.update(data['time'])
+		model.yields.update(data['yields'])
+		return model
+
+	def __repr__(self):
+		return '<%s: %s>' % (self.__class__.__name__, ', '.join('%s %.1fms/%.2f' % (typ, self.time[typ] * 1000, self.yields[typ])
+																					  for typ in sorted(self.time)))
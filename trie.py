@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+"""
+A compact, array-backed trie (a 'double-array' trie) for fast letter-by-letter traversal of the wordlist.
+The whole trie consists of two flat integer arrays:
+	-base[node] + code gives the slot of the node's child along the letter with that code
+	-check[slot] holds the parent of the node in that slot (or -1 if the slot is free)
+As there are no per-node Python objects, the arrays can be stored in the dictionary file as-is and memory-mapped
+ straight back in, which makes loading practically instantaneous and lets several processes share the same pages.
+The trie can be extended into an Aho-Corasick automaton, which finds every word embedded in a string in a
+ single pass over it.
+"""
+
+# Python libraries
+from array import array
+from operator import itemgetter
+from bisect import bisect_left # function for performing binary search
+from collections import deque
+import numpy as np  # numerical module, used to hand the arrays over to the dictionary file
+
+# Other CCS modules
+import log  # module for giving runtime feedback to the user
+
+__author__ = 'Jarek Glowacki'
+logger = log.getLogger(__name__)
+
+# Letters map to codes 1-26 and the multi-word separator to 27. Code 0 is reserved for the word terminator.
+CODES = {c: i + 1 for i, c in enumerate('abcdefghijklmnopqrstuvwxyz_')}
+TERMINATOR = 0
+MAX_CODE = len(CODES)
+ROOT = 0
+
+_FREE = -1
+
+
+class DoubleArrayTrie(object):
+	"""
+	A read-only double-array trie over a set of words.
+	Construct one with DoubleArrayTrie.build() or DoubleArrayTrie.fromArrays().
+	"""
+
+	_ARRAYS = ('base', 'check')  # the per-slot arrays making up the structure
+
+	def __init__(self, arrays, num_words):
+		for name in self._ARRAYS:
+			setattr(self, name, arrays[name])
+		self.num_words = num_words
+
+	@classmethod
+	def build(cls, words):
+		"""
+		Constructs a trie over the given words.
+		"""
+
+		base, check, _ = _place(words)
+		return cls({'base': base, 'check': check}, len(words))
+
+	@classmethod
+	def fromArrays(cls, arrays):
+		"""
+		Wraps previously built arrays (eg. memory-mapped out of the dictionary file) without copying them.
+		"""
+
+		return cls({name: memoryview(arrays[name]) for name in cls._ARRAYS}, int(arrays['num_words'][0]))
+
+	def toArrays(self):
+		""" Returns the trie's arrays, in a form that can be stored in the dictionary file. """
+
+		arrays = {name: np.frombuffer(getattr(self, name), dtype=np.int32) for name in self._ARRAYS}
+		arrays['num_words'] = np.array([self.num_words], dtype=np.int64)
+		return arrays
+
+	def child(self, node, letter):
+		"""
+		Returns the child of the given node along the given letter, or -1 if there is no such child.
+		"""
+
+		try:
+			slot = self.base[node] + CODES[letter]
+		except KeyError:
+			return -1
+		return slot if self.check[slot] == node else -1
+
+	def isWord(self, node):
+		""" Checks whether the path to the given node spells out a complete word. """
+
+		return self.check[self.base[node] + TERMINATOR] == node
+
+	def find(self, prefix):
+		"""
+		Returns the node reached by following the given prefix from the root, or -1 if it leads nowhere.
+		"""
+
+		node = ROOT
+		for letter in prefix:
+			node = self.child(node, letter)
+			if node < 0:
+				break
+		return node
+
+	def __contains__(self, word):
+		node = self.find(word)
+		return node >= 0 and self.isWord(node)
+
+	def __len__(self):
+		return self.num_words
+
+
+class AhoCorasickAutomaton(DoubleArrayTrie):
+	"""
+	A double-array trie extended with the extra per-slot arrays of an Aho-Corasick automaton:
+		-fail[node] is the node for the longest proper suffix of node's string that is also in the trie
+		-output[node] is the node for the longest proper suffix of node's string that is a word (or the root)
+		-depth[node] is the length of node's string
+	"""
+
+	_ARRAYS = ('base', 'check', 'fail', 'output', 'depth')
+
+	@classmethod
+	def build(cls, words):
+		"""
+		Constructs the automaton over the given words.
+		The failure links are derived in breadth-first order, so that every link a node depends on is already set.
+		"""
+
+		base, check, order = _place(words)
+		size = len(base)
+		fail = array('i', [ROOT]) * size
+		output = array('i', [ROOT]) * size
+		depth = array('i', [0]) * size
+		for node, parent, code in order:
+			depth[node] = depth[parent] + 1
+			if parent == ROOT:
+				continue
+			f = fail[parent]
+			while f != ROOT and check[base[f] + code] != f:
+				f = fail[f]
+			if check[base[f] + code] == f:
+				fail[node] = base[f] + code
+			out = fail[node]
+			output[node] = out if check[base[out] + TERMINATOR] == out else output[out]
+		return cls({'base': base, 'check': check, 'fail': fail, 'output': output, 'depth': depth}, len(words))
+
+	def scan(self, string):
+		"""
+		Finds every word embedded anywhere in the given string, in a single pass over it.
+		Returns a list of (start, end) offsets, ordered by start and then by end.
+		"""
+
+		base, check, fail, output, depth = self.base, self.check, self.fail, self.output, self.depth
+		hits = []
+		node = ROOT
+		for end, letter in enumerate(string, 1):
+			try:
+				code = CODES[letter]
+			except KeyError:
+				# No word can span this character.
+				node = ROOT
+				continue
+			while check[base[node] + code] != node and node != ROOT:
+				node = fail[node]
+			if check[base[node] + code] == node:
+				node = base[node] + code
+			# Report the word ending here (if any), along with all words that are suffixes of it.
+			if check[base[node] + TERMINATOR] == node:
+				hits.append((end - depth[node], end))
+			out = output[node]
+			while out != ROOT:
+				hits.append((end - depth[out], end))
+				out = output[out]
+		hits.sort(key=itemgetter(0, 1))
+		return hits
+
+
+###
+# Some auxiliary functions.
+###
+
+# Lays out a trie over the given words in double-array form.
+# Nodes are placed breadth-first, each at the first base offset where all of its children's slots are free.
+# Returns the base and check arrays, along with the (node, parent, code) of each non-terminator node in placement order.
+def _place(words):
+	words = sorted(words)
+	capacity = 1024
+	base = array('i', [0]) * capacity
+	check = array('i', [_FREE]) * capacity
+	check[ROOT] = -2  # the root has no parent, but its slot is taken
+	first_free = 1
+	size = 1
+	order = []
+
+	# Each queue entry is a node, along with the range of (sorted) words passing through it and its depth.
+	queue = deque([(ROOT, 0, len(words), 0)])
+	while queue:
+		node, lo, hi, depth = queue.popleft()
+
+		# Group the node's words by the letter that follows.
+		children = []
+		i = lo
+		if i < hi and len(words[i]) == depth:
+			# Only the first word in the range can end here, as the words are sorted.
+			children.append((TERMINATOR, None))
+			i += 1
+		while i < hi:
+			letter = words[i][depth]
+			j = bisect_left(words, words[i][:depth] + chr(ord(letter) + 1), i, hi)
+			children.append((CODES[letter], (i, j)))
+			i = j
+		if not children:
+			continue
+
+		# Find a base offset at which every child slot is free.
+		codes = [code for code, _ in children]
+		pos = first_free
+		while True:
+			b = pos - codes[0]
+			if b >= 1:
+				if b + MAX_CODE + 1 >= capacity:
+					base.extend(array('i', [0]) * capacity)
+					check.extend(array('i', [_FREE]) * capacity)
+					capacity *= 2
+				if all(check[b + code] == _FREE for code in codes):
+					break
+			pos += 1
+			while check[pos] != _FREE:
+				pos += 1
+
+		# Claim the slots.
+		base[node] = b
+		for code, rng in children:
+			slot = b + code
+			check[slot] = node
+			if rng is not None:
+				queue.append((slot, rng[0], rng[1], depth + 1))
+				order.append((slot, node, code))
+		size = max(size, b + MAX_CODE + 1)
+		while check[first_free] != _FREE:
+			first_free += 1
+
+	# Trim the arrays, leaving enough room past the last base for any lookup to stay in bounds.
+	logger.debug('Built trie over %i words (%i slots).' % (len(words), size))
+	return base[:size], check[:size], order
@@ -11,31 +11,95 @@ This includes:
 	-synonym generation
 	-word abbreviation
 	-pattern matching (returning words in the wordlist that match a given pattern)
+	-a prefix trie over the wordlist, for building up words a letter at a time
+Importing this module is cheap: NLTK, inflect, the wordlist, the pattern index and the prefix trie are all loaded
+ on first use.
+WordNet lookups (synsets, their relations and lemma names, Wu-Palmer similarity and plurality checks) are answered
+ from a snapshot of the parts of WordNet the CCS uses, compiled out of NLTK's reader into the dictionary file
+ (see dictfile), rather than by the reader itself, which parses WordNet's text files and is slow to get going.
+ The reader remains available as a fallback (see useSnapshot).
 """
 
 # Python libraries
-import sys
-from itertools import product
+from itertools import product, accumulate
+from bisect import bisect_left # function for performing binary search
 from glob import glob  # library for retrieving file name lists from directories
 import re  # regex library
+import os
 import pdb
-
-# Dictionary libraries
-import nltk
-nltk.data.path.append('dict/nltk_data')
-from nltk.corpus import wordnet as wn # Source code: http://www.nltk.org/_modules/nltk/corpus/reader/wordnet.html
-from nltk.stem import PorterStemmer
-from nltk.stem import WordNetLemmatizer
-import inflect
+import hashlib
+import numpy as np  # numerical module, used for the vectorised lookup indices
 
 # Other CCS modules
 import log  # module for giving runtime feedback to the user
+import cache  # LRU caches for the expensive lookups
+import dictfile  # container for the precompiled dictionary structures
+import trie  # array-backed trie, used for the prefix trie over the wordlist
 
 __author__ = 'Jarek Glowacki'
 logger = log.getLogger(__name__, streamLevel=log.DEBUG)
-stemmer = PorterStemmer()
-lemmatiser = WordNetLemmatizer()
-pluraliser = inflect.engine()
+
+
+class _Lazy(object):
+	"""
+	A stand-in for an object that is slow to create (usually because of slow library imports).
+	The object itself is only created the first time one of its attributes is accessed.
+	"""
+
+	def __init__(self, factory):
+		self._factory = factory
+		self._obj = None
+
+	def __getattr__(self, name):
+		return getattr(self._resolve(), name)
+
+	def _resolve(self):
+		""" Returns the underlying object, creating it if that hasn't happened yet. """
+
+		if self._obj is None:
+			self._obj = self._factory()
+		return self._obj
+
+# Dictionary libraries (NLTK and inflect take seconds to import, so defer this until they're needed)
+def _loadWordNet():
+	_findWordNet() # make sure the bundled WordNet data is on NLTK's path
+	from nltk.corpus import wordnet # Source code: http://www.nltk.org/_modules/nltk/corpus/reader/wordnet.html
+	return wordnet
+
+# Returns the path of the WordNet data that NLTK reads (a directory, or a zip file).
+def _findWordNet():
+	import nltk
+	if 'dict/nltk_data' not in nltk.data.path:
+		nltk.data.path.append('dict/nltk_data')
+	pointer = nltk.data.find('corpora/wordnet')
+	return pointer.path if hasattr(pointer, 'path') else pointer.zipfile.filename
+
+def _loadStemmer():
+	from nltk.stem import PorterStemmer
+	return PorterStemmer()
+
+def _loadLemmatiser():
+	_loadWordNet() # make sure the bundled WordNet data is on NLTK's path
+	from nltk.stem import WordNetLemmatizer
+	return WordNetLemmatizer()
+
+def _loadPluraliser():
+	import inflect
+	return inflect.engine()
+
+wn = _Lazy(_loadWordNet)
+stemmer = _Lazy(_loadStemmer)
+lemmatiser = _Lazy(_loadLemmatiser)
+pluraliser = _Lazy(_loadPluraliser)
+
+# NLTK keeps WordNet's data files open, and a forked process would share their read positions with its parent
+#  (and siblings), garbling lookups. So have forked processes close their copies; they get reopened on demand.
+def _closeInheritedFiles():
+	data_files = vars(wn._obj).get('_data_file_map', {}) if wn._obj is not None else {}
+	for f in data_files.values():
+		f.close()
+	data_files.clear()
+os.register_at_fork(after_in_child=_closeInheritedFiles)
 
 def recompileWordList(cat_dir='dict/categorised/', comp_dir='dict/complete/'):
 	"""
@@ -79,24 +143,79 @@ def recompileWordList(cat_dir='dict/categorised/', comp_dir='dict/complete/'):
 		if word.replace('_','').isalpha():
 			words.add(word)
 
-	global WORDLIST_SORTED
-	global WORDLIST
-	WORDLIST_SORTED = sorted(words)
-	WORDLIST = words
+	_setWordList(sorted(words))
 	# Write the resulting list out to a file.
 	with open('dict/wordlist.dic', 'w+') as f:
 		f.writelines([word + '\n' for word in WORDLIST_SORTED])
 
+	# The pattern index and prefix trie are derived from the wordlist, so they must be rebuilt alongside it.
+	recompilePatternIndex()
+	recompilePrefixTrie()
+
+	# Anything cached so far may have been computed against the old wordlist.
+	clearCaches()
+	if _PERSISTENT_CACHE is not None:
+		_PERSISTENT_CACHE.restamp(getVersionStamp())
+
+
+def recompilePatternIndex():
+	"""
+	Rebuilds the positional bitmap index over the wordlist, which speeds up known-letter pattern matching.
+	The index is saved to the dictionary file so that it doesn't have to be rebuilt at the start of each run.
+	"""
+
+	global _PATTERN_INDEX
+	dictfile.store('pattern', _compilePatternIndex())
+	_PATTERN_INDEX = _openPatternIndex(dictfile.load('pattern'))
+	logger.debug('Recompiled pattern index!')
+
+def recompilePrefixTrie():
+	"""
+	Rebuilds the prefix trie over the wordlist, saving it to the dictionary file.
+	"""
+
+	global _PREFIX_TRIE
+	dictfile.store('prefix', _compilePrefixTrie())
+	_PREFIX_TRIE = trie.DoubleArrayTrie.fromArrays(dictfile.load('prefix'))
+	logger.debug('Recompiled prefix trie!')
+
 
 def exists(word):
 	""" Checks whether a given word exists in the dictionary."""
 
+	if not _WORDLIST_LOADED:
+		_loadWordList()
 	return word in WORDLIST
 
+def getWordsWithPrefix(prefix, length=None):
+	"""
+	Returns (in sorted order) all words in the wordlist that start with the given prefix.
+	If a length is given, only words of exactly that many characters are returned; these are looked up in
+	 the length-partitioned wordlist, so the cost is proportional to the number of results.
+	"""
+
+	if not _WORDLIST_LOADED:
+		_loadWordList()
+	words = WORDLIST_SORTED if length is None else _WORDLIST_BY_LENGTH.get(length, [])
+	# '~' sorts after every character that can appear in a word, bounding the range of prefixed words.
+	return words[bisect_left(words, prefix):bisect_left(words, prefix + '~')]
+
+_PREFIX_TRIE = None
+def getPrefixTrie():
+	"""
+	Returns a trie over the wordlist (a trie.DoubleArrayTrie), for building up words a letter at a time: a word
+	 under construction can be given up on as soon as its letters so far lead nowhere in the trie.
+	"""
+
+	global _PREFIX_TRIE
+	if _PREFIX_TRIE is None:
+		_PREFIX_TRIE = trie.DoubleArrayTrie.fromArrays(dictfile.fetch('prefix'))
+	return _PREFIX_TRIE
+
 def isPlural(word):
 	""" Checks whether a given word is in plural form."""
 
-	return word is not lemmatiser.lemmatize(word, 'n')
+	return _wordNet().isPlural(word)
 
 def pluralise(to_pluralise):
 	"""
@@ -126,37 +245,36 @@ def literalStem(word):
 	return None
 
 
-_SIM_CACHE = {}
+_SIM_CACHE = cache.LRUCache('similarity', max_bytes=50000000)
 def calcSimilarity(word1, word2):
 	"""
 	Computes a certainty score determining how similar two input words are to one another.
 	Employs some basic caching to speed up repeated requests.
 	"""
 
-	word1, word2 = sorted([word1, word2])
+	key = tuple(sorted([word1, word2]))
 	try:
-		return _SIM_CACHE['%s,%s' % (word1, word2)]
+		return _SIM_CACHE[key]
 	except KeyError:
-		ss1 = wn.synsets(word1)
-		ss2 = wn.synsets(word2)
+		word1, word2 = key
+		wordnet = _wordNet()
+		ss1 = wordnet.synsets(word1)
+		ss2 = wordnet.synsets(word2)
 
 		# Consider literal stems too (eg. gutsy -> guts).
 		ls = literalStem(word1)
 		if ls:
-			ss1.extend(wn.synsets(ls))
+			ss1.extend(wordnet.synsets(ls))
 		ls = literalStem(word2)
 		if ls:
-			ss2.extend(wn.synsets(ls))
-		# Flush cache if it's getting too big
-		if sys.getsizeof(_SIM_CACHE) > 50000000:
-			_SIM_CACHE.clear()
-			logger.debug('Flushed similarity cache!')
-		_SIM_CACHE['%s,%s' % (word1, word2)] = _nmax(sim for sim in [_path_similarity(s1, s2) for (s1, s2) in product(ss1, ss2)])
-		return _SIM_CACHE['%s,%s' % (word1, word2)]
+			ss2.extend(wordnet.synsets(ls))
+		similarity = wordnet.similarity(ss1, ss2)
+		_SIM_CACHE[key] = similarity
+		return similarity
 
 
-_SYN_CACHE = {}
-def getSynonyms(word, synonym_search_depth=2):
+_SYN_CACHE = cache.LRUCache('synonym', max_bytes=50000000)
+def getSynonyms(word, synonym_search_depth=2, halt=None):
 	"""
 	Returns a list of words/phrases with similar meanings to the given word/phrase.
 	These 'synonyms' are constructed from WordNet's synset, hypernym/hyponym,
@@ -164,60 +282,169 @@ def getSynonyms(word, synonym_search_depth=2):
 	The degree of separation threshold can be provided to specify how close
 	 in meaning the synonyms are to be.
 	Employs some basic caching to speed up repeated requests.
+	If a halt function is given, it's polled along the way; once it returns True, the search is abandoned and no
+	 synonyms are returned (nor cached).
 	"""
 
+	key = (word, synonym_search_depth)
 	try:
-		return _SYN_CACHE[word + str(synonym_search_depth)]
+		return _SYN_CACHE[key]
 	except KeyError:
-		synsets = set(wn.synsets(word))
+		wordnet = _wordNet()
+		synsets = set(wordnet.synsets(word))
 		plural = isPlural(word)
-		synsets |= {sim for syn in synsets for sim in syn.similar_tos()}
+		synsets |= wordnet.related('similar_tos', synsets)
 		for i in range(synonym_search_depth):
+			if halt is not None and halt():
+				return set()
 			# Expand the set of hypernyms/hyponyms for the word of interest.
-			hypernyms = {hyp for syn in synsets for hyp in syn.hypernyms()}
-			hyponyms = {hyp for syn in synsets for hyp in syn.hyponyms()}
+			hypernyms = wordnet.related('hypernyms', synsets)
+			hyponyms = wordnet.related('hyponyms', synsets)
 
 			# Pack them with similar words at each step.
-			hypernyms |= {sim for hyp in synsets for sim in hyp.similar_tos()}
-			hyponyms |= {sim for hyp in synsets for sim in hyp.similar_tos()}
+			similar = wordnet.related('similar_tos', synsets)
+			hypernyms |= similar
+			hyponyms |= similar
 
 			synsets |= hypernyms | hyponyms
-		results = {lemma.lower() for syn in synsets for lemma in syn.lemma_names()}
+		results = {lemma.lower() for lemma in wordnet.lemmaNames(synsets)}
 		if plural:
-			results = pluralise(results)
-		# Flush cache if it's getting too big
-		if sys.getsizeof(_SYN_CACHE) > 500000:
-			_SYN_CACHE.clear()
-			logger.debug('Flushed synonym cache!')
-		_SYN_CACHE[word + str(synonym_search_depth)] = results
-		return _SYN_CACHE[word + str(synonym_search_depth)]
+			# Pluralising takes a while, so poll the halt flag word by word.
+			pluralised = set()
+			for result in results:
+				if halt is not None and halt():
+					return set()
+				pluralised.add(pluralise(result))
+			results = pluralised
+		_SYN_CACHE[key] = results
+		return results
 
 _ABBREVIATION_LIST = {}
+_ABBR_CACHE = cache.LRUCache('abbreviation', max_entries=100000)
 def getAbbreviations(word):
 	"""
 	Returns the abbreviations of a word if any exist in the abbreviation list.
 	Loads in full abbreviation list when method first called.
 	"""
 
-	global _ABBREVIATION_LIST
-	if not _ABBREVIATION_LIST:
-		try:
-			with open('keywords/abbreviations.kwords', 'r') as f:
-				[_ABBREVIATION_LIST.setdefault(word, set()).add(ac) for ac,word in [line.rstrip(' *+\n').split(': ') for line in f.readlines()]]
-		except FileNotFoundError:
-			logger.error('Missing abbreviations list: \'keywords/%abbreviations.kwords\'')
-			raise
 	try:
-		return _ABBREVIATION_LIST[word]
+		return _ABBR_CACHE[word]
 	except KeyError:
-		return {}
+		pass
+	if not _ABBREVIATION_LIST:
+		_loadAbbreviations()
+	abbreviations = _ABBREVIATION_LIST.get(word, {})
+	_ABBR_CACHE[word] = abbreviations
+	return abbreviations
+
+def preload():
+	"""
+	Loads every lazily loaded structure (wordlist, pattern index, prefix trie, abbreviation list, WordNet
+	 snapshot and the NLTK helpers) straight away. Call this before forking worker processes, so that they all
+	 share one copy.
+	"""
+
+	if not _WORDLIST_LOADED:
+		_loadWordList()
+	if not _ABBREVIATION_LIST:
+		_loadAbbreviations()
+	global _PATTERN_INDEX
+	if _PATTERN_INDEX is None:
+		_PATTERN_INDEX = _openPatternIndex(dictfile.fetch('pattern'))
+	getPrefixTrie()
+	if isinstance(_wordNet(), _WordNetReader):
+		wn.ensure_loaded()
+	for lazy in [stemmer, lemmatiser, pluraliser]:
+		lazy._resolve()
+
+_PERSISTENT_CACHE = None
+def enablePersistentCache(path='dict/custom/cache.db'):
+	"""
+	Backs the similarity and synonym caches with an on-disk store, so that results are shared between runs
+	 and between concurrently running processes.
+	The store is keyed by the current version stamp, and is invalidated whenever the wordlist is recompiled.
+	"""
+
+	global _PERSISTENT_CACHE
+	if _PERSISTENT_CACHE is None or _PERSISTENT_CACHE.path != path:
+		_PERSISTENT_CACHE = cache.PersistentStore(path, getVersionStamp())
+	_SIM_CACHE.backing = _PERSISTENT_CACHE
+	_SYN_CACHE.backing = _PERSISTENT_CACHE
+	return _PERSISTENT_CACHE
+
+def disablePersistentCache():
+	"""
+	Detaches the on-disk store from the caches, writing out anything still pending.
+	"""
+
+	global _PERSISTENT_CACHE
+	if _PERSISTENT_CACHE is not None:
+		_PERSISTENT_CACHE.close()
+	_PERSISTENT_CACHE = None
+	_SIM_CACHE.backing = None
+	_SYN_CACHE.backing = None
+
+def getVersionStamp():
+	"""
+	Returns a stamp identifying the current wordlist and WordNet data.
+	Anything derived from either of these should be considered stale once the stamp changes.
+	"""
 
+	return 'wn%s-%s' % (_wordNet().version(), dictfile.wordlistHash())
+
+def useSnapshot(enabled=True):
+	"""
+	Chooses whether WordNet lookups are answered from the precompiled WordNet snapshot (the default), which
+	 is memory-mapped out of the dictionary file, or by NLTK's WordNet reader. Both give the same results.
+	"""
+
+	global _WORDNET
+	_WORDNET = None if enabled else _WordNetReader()
+
+def getCacheStats():
+	"""
+	Returns the hit/miss/eviction counters of each of the lookup caches, keyed by cache name.
+	"""
+
+	return {c.name: c.stats() for c in [_SIM_CACHE, _SYN_CACHE, _ABBR_CACHE]}
+
+def clearCaches():
+	"""
+	Empties the in-memory lookup caches (but not the persistent store behind them, if any).
+	"""
+
+	for c in [_SIM_CACHE, _SYN_CACHE, _ABBR_CACHE]:
+		c.clear()
+
+_PATTERN_INDEX = None
+_KNOWN_LETTERS_PATTERN = re.compile(r'\\A((?:\[a-z\]|[a-z])*)\\Z')
+_KNOWN_LETTERS_SLOT = re.compile(r'\[a-z\]|[a-z]')
 def getWordsWithPattern(pattern):
 	"""
 	Returns all instances in the wordlist that match the given pattern.
 	The pattern should be provided as a regular expression.
+	Known-letter patterns (as generated by the Clue class, eg. '\\A[a-z]a[a-z]\\Z') are answered from the
+	 positional bitmap index; any other pattern falls back to a full regex scan of the wordlist.
 	"""
 
+	global _PATTERN_INDEX
+	if not _WORDLIST_LOADED:
+		_loadWordList()
+	match = _KNOWN_LETTERS_PATTERN.fullmatch(pattern)
+	if match:
+		if _PATTERN_INDEX is None:
+			_PATTERN_INDEX = _openPatternIndex(dictfile.fetch('pattern'))
+		slots = _KNOWN_LETTERS_SLOT.findall(match.group(1))
+		try:
+			words, bits = _PATTERN_INDEX[len(slots)]
+		except KeyError:
+			return []
+		known = [bits[pos, ord(slot) - ord('a')] for pos, slot in enumerate(slots) if slot != '[a-z]']
+		if not known:
+			return words.tolist()
+		hits = np.unpackbits(np.bitwise_and.reduce(known), count=len(words))
+		return words[hits.astype(bool)].tolist()
+
 	results = []
 	for word in WORDLIST_SORTED:
 		if re.search(pattern, word):
@@ -228,6 +455,25 @@ def getWordsWithPattern(pattern):
 # Some auxiliary functions.
 ###
 
+# Installs a new (sorted) wordlist, along with the lookup structures derived directly from it.
+def _setWordList(words_sorted):
+	global WORDLIST_SORTED, WORDLIST, _WORDLIST_BY_LENGTH, _WORDLIST_LOADED
+	_WORDLIST_LOADED = True
+	WORDLIST_SORTED = words_sorted
+	WORDLIST = set(words_sorted)
+	_WORDLIST_BY_LENGTH = {}
+	for word in words_sorted:
+		_WORDLIST_BY_LENGTH.setdefault(len(word), []).append(word)
+
+# Reads in the abbreviation list, as a {word: set of abbreviations} dict.
+def _loadAbbreviations():
+	try:
+		with open('keywords/abbreviations.kwords', 'r') as f:
+			[_ABBREVIATION_LIST.setdefault(word, set()).add(ac) for ac,word in [line.rstrip(' *+\n').split(': ') for line in f.readlines()]]
+	except FileNotFoundError:
+		logger.error('Missing abbreviations list: \'keywords/%abbreviations.kwords\'')
+		raise
+
 # Custom 'max' function that ignore 'None' entries, and defaults to zero if empty.
 def _nmax(v):
 	return max([x for x in v if x is not None] + [0])
@@ -237,13 +483,335 @@ def _path_similarity(x, y):
 	return _nmax([x.wup_similarity(y), y.wup_similarity(x)])
 
 
+# Builds the positional bitmap index over the wordlist.
+# Words are bucketed by length, and each bucket stores a packed bitset per (position, letter) pair,
+#  marking which of the bucket's words have that letter at that position.
+def _compilePatternIndex():
+	if not _WORDLIST_LOADED:
+		_loadWordList()
+	buckets = {}
+	for word in WORDLIST_SORTED:
+		# Multi-word entries can never match a known-letter pattern, so leave them out.
+		if word.isalpha():
+			buckets.setdefault(len(word), []).append(word)
+
+	arrays = {}
+	alphabet = np.arange(26, dtype=np.uint8)[:, None]
+	for length, words in buckets.items():
+		letters = np.frombuffer(''.join(words).encode('ascii'), dtype=np.uint8).reshape(len(words), length) - ord('a')
+		bits = np.empty((length, 26, (len(words) + 7) // 8), dtype=np.uint8)
+		for pos in range(length):
+			bits[pos] = np.packbits(letters[:, pos] == alphabet, axis=1)
+		arrays['words%i' % length] = np.array(words)
+		arrays['bits%i' % length] = bits
+	return arrays
+
+# Unpacks the pattern index arrays into a {length: (words, bits)} lookup.
+def _openPatternIndex(arrays):
+	return {int(key[5:]): (arrays[key], arrays['bits' + key[5:]]) for key in arrays if key.startswith('words')}
+
+dictfile.register('pattern', 1, _compilePatternIndex)
+
+# Builds the prefix trie over the wordlist, returning its arrays.
+def _compilePrefixTrie():
+	if not _WORDLIST_LOADED:
+		_loadWordList()
+	return trie.DoubleArrayTrie.build(WORDLIST_SORTED).toArrays()
+
+dictfile.register('prefix', 1, _compilePrefixTrie)
+
+
 ###
-# Load a comprehensive word list on import.
+# The WordNet snapshot: the parts of WordNet that the CCS uses, precompiled into flat arrays.
 ###
-try:
-	with open('dict/wordlist.dic', 'r') as wlist:
-		WORDLIST_SORTED = [line.rstrip() for line in wlist.readlines()]
-	WORDLIST = set(WORDLIST_SORTED)
-except FileNotFoundError:
-	logger.info('No pre-compiled word list present.. recompiling new one!')
-	recompileWordList()
\ No newline at end of file
+
+# WordNet's parts of speech, in the order NLTK looks synsets up in. Adjective satellites are indexed as adjectives.
+_POS = 'nvar'
+# WordNet's detachment rules, as applied by NLTK's morphy (exceptions aside): (suffix, replacement) pairs.
+_SUBSTITUTIONS = {'n': [('s', ''), ('ses', 's'), ('ves', 'f'), ('xes', 'x'), ('zes', 'z'), ('ches', 'ch'), ('shes', 'sh'),
+								('men', 'man'), ('ies', 'y')],
+						'v': [('s', ''), ('ies', 'y'), ('es', 'e'), ('es', ''), ('ed', 'e'), ('ed', ''), ('ing', 'e'), ('ing', '')],
+						'a': [('er', ''), ('est', ''), ('er', 'e'), ('est', 'e')],
+						'r': []}
+_RELATIONS = ('hypernyms', 'hyponyms', 'similar_tos')
+_FAR = 1 << 20  # the distance from a synset to one that isn't among its hypernyms
+
+_WORDNET = None
+def _wordNet():
+	"""
+	Returns the source of WordNet lookups: the snapshot, unless it's been switched off (see useSnapshot) or
+	 can't be written, in which case NLTK's reader answers them instead.
+	"""
+
+	global _WORDNET
+	if _WORDNET is None:
+		try:
+			_WORDNET = _WordNetSnapshot(dictfile.fetch('wordnet'))
+		except OSError as e:
+			logger.warning('Can\'t open the WordNet snapshot (%s); falling back on NLTK\'s reader.' % e)
+			_WORDNET = _WordNetReader()
+	return _WORDNET
+
+class _WordNetSnapshot(object):
+	"""
+	WordNet lookups answered from the snapshot arrays, with the same results as NLTK's reader (which is what the
+	 snapshot is compiled from). Synsets are identified by their position in the snapshot, and are numbered in
+	 order of name, so that sorting synset ids sorts them as NLTK would.
+	"""
+
+	def __init__(self, arrays):
+		self._version = str(arrays['version'][0], 'ascii')
+		self._names = dictfile.StringTable(arrays['names'], arrays['name_offsets'])
+		self._lemmas = dictfile.StringTable(arrays['lemmas'], arrays['lemma_offsets'])
+		self._synset_lemmas = memoryview(arrays['synset_lemmas'])
+		self._relations = {relation: (memoryview(arrays[relation + '_offsets']), memoryview(arrays[relation]))
+								 for relation in _RELATIONS}
+		self._ancestor_arrays = (arrays['ancestor_offsets'], arrays['ancestors'], arrays['ancestor_distances'])
+		self._min_depth = arrays['min_depth']
+		self._max_depth = arrays['max_depth']
+		self._needs_root = arrays['needs_root']
+		self._root_rank = int(arrays['root_rank'][0])  # where the simulated root's name ('*ROOT*') sorts among the names
+		self._index_keys = dictfile.StringTable(arrays['index_keys'], arrays['index_key_offsets'])
+		self._index_offsets = memoryview(arrays['index_offsets'])
+		self._index_synsets = memoryview(arrays['index_synsets'])
+		self._exceptions = dictfile.SortedMultiMap(arrays)
+
+	def version(self):
+		return self._version
+
+	def name(self, synset):
+		return self._names[synset]
+
+	def synsets(self, word):
+		""" Returns the ids of the synsets of the given word, in any of its inflected forms (as wn.synsets, though not necessarily in the same order). """
+
+		word = word.lower()
+		return [synset for pos in _POS for form in self.morphy(word, pos) for synset in self._index(form, pos)]
+
+	def morphy(self, form, pos):
+		""" Returns the base forms of the given word form in WordNet, for the given part of speech (as wn._morphy). """
+
+		key = '%s.%s' % (form, pos)
+		if key in self._exceptions:
+			forms = sorted(self._exceptions[key])
+		else:
+			forms = [form[:-len(old)] + new for old, new in _SUBSTITUTIONS[pos] if form.endswith(old)]
+		return [f for f in dict.fromkeys([form] + forms) if len(self._index(f, pos))]
+
+	def isPlural(self, word):
+		lemmas = self.morphy(word, 'n')
+		return bool(lemmas) and min(lemmas, key=len) != word
+
+	def related(self, relation, synsets):
+		""" Returns the set of synsets that the given synsets lead to along the given relation (eg. 'hypernyms'). """
+
+		offsets, targets = self._relations[relation]
+		return {target for synset in synsets for target in targets[offsets[synset]:offsets[synset+1]]}
+
+	def lemmaNames(self, synsets):
+		return [self._lemmas[i] for synset in synsets for i in range(self._synset_lemmas[synset], self._synset_lemmas[synset+1])]
+
+	def similarity(self, synsets1, synsets2):
+		"""
+		Returns the highest Wu-Palmer similarity between a synset of each of the given lists (or 0 if there's
+		 none), taking each pair in whichever order scores higher.
+		This is NLTK's Synset.wup_similarity, computed for all pairs at once from the ancestor table. That
+		 includes its choice of subsumer (among the common hypernyms of greatest minimum depth, the first
+		 synset itself, or else the first by name) and the root it simulates for the synsets that need one,
+		 which sits a step above each synset's furthest hypernym.
+		"""
+
+		if not len(synsets1) or not len(synsets2):
+			return 0
+		synsets1, synsets2 = np.unique(synsets1), np.unique(synsets2)
+		closure, table = self._ancestorTable(np.union1d(synsets1, synsets2))
+		rows1, rows2 = np.searchsorted(closure, synsets1), np.searchsorted(closure, synsets2)
+		up1, up2 = table[rows1][:, None, :], table[rows2][None, :, :]  # pair axes, then the closure's
+		height = np.where(table < _FAR, table, -1).max(axis=1)  # the distance up to each synset's furthest hypernym
+
+		# The deepest common hypernyms (by minimum depth) of each pair, counting the simulated root at depth 0.
+		common = (up1 < _FAR) & (up2 < _FAR)
+		min_depth = self._min_depth[closure]
+		need_root = (self._needs_root[synsets1][:, None] | self._needs_root[synsets2][None, :]).astype(bool)
+		deepest = np.where(common, min_depth, -1).max(axis=2)
+		deepest = np.where(need_root, np.maximum(deepest, 0), deepest)
+		subsumers = common & (min_depth == deepest[:, :, None])
+		first = subsumers.argmax(axis=2)  # as the closure is sorted, this is the first real subsumer by name
+		root_first = need_root & (deepest == 0) & (~subsumers.any(axis=2) | (closure[first] >= self._root_rank))
+
+		best = 0
+		for own in [rows1[:, None], rows2[None, :]]:
+			# Each synset prefers itself as the subsumer, when it's one of them.
+			own = np.broadcast_to(own, deepest.shape)
+			is_own = np.take_along_axis(subsumers, own[:, :, None], axis=2)[:, :, 0]
+			subsumer = np.where(is_own, own, first)
+			at_root = ~is_own & root_first
+			depth = np.where(at_root, 0, self._max_depth[closure[subsumer]]) + 1
+			lengths = []
+			for up, rows in [(up1, rows1[:, None]), (up2, rows2[None, :])]:
+				# The shortest path from the synset to the subsumer, over any hypernym they share.
+				length = (up + table[subsumer]).min(axis=2)
+				via_root = height[rows] + 1 + np.where(at_root, 0, height[subsumer] + 1)
+				lengths.append(np.where(at_root, via_root, np.where(need_root, np.minimum(length, via_root), length)))
+			scores = (2.0 * depth) / ((lengths[0] + depth) + (lengths[1] + depth))
+			scores = scores[deepest >= 0]
+			if len(scores):
+				best = max(best, float(scores.max()))
+		return best
+
+	def _index(self, form, pos):
+		""" Returns the ids of the synsets of the given lemma name, for the given part of speech. """
+
+		keys = self._index_keys
+		key = '%s.%s' % (form, pos)
+		lo, hi = 0, len(keys)
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if keys[mid] < key:
+				lo = mid + 1
+			else:
+				hi = mid
+		if lo == len(keys) or keys[lo] != key:
+			return ()
+		return self._index_synsets[self._index_offsets[lo]:self._index_offsets[lo+1]]
+
+	def _ancestorTable(self, synsets):
+		"""
+		Returns the sorted ids of every (instance) hypernym of the given synsets, themselves included, along with
+		 the table of distances from each of them (by row) up to each of them (by column), or _FAR where there's
+		 no way up.
+		"""
+
+		offsets, ancestors, distances = self._ancestor_arrays
+		_, entries = _groupEntries(offsets, synsets)
+		closure = np.unique(ancestors[entries])
+
+		# The closure holds the hypernyms of its own members too, so a second pass over it fills in the table.
+		rows, entries = _groupEntries(offsets, closure)
+		table = np.full((len(closure), len(closure)), _FAR, dtype=np.int32)
+		table[rows, np.searchsorted(closure, ancestors[entries])] = distances[entries]
+		return closure, table
+
+class _WordNetReader(object):
+	"""
+	The same lookups as _WordNetSnapshot, answered by NLTK's WordNet corpus reader (with synsets as its Synsets).
+	"""
+
+	def version(self):
+		return wn.get_version()
+
+	def name(self, synset):
+		return synset.name()
+
+	def synsets(self, word):
+		return wn.synsets(word)
+
+	def morphy(self, form, pos):
+		return wn._morphy(form, pos)
+
+	def isPlural(self, word):
+		return word is not lemmatiser.lemmatize(word, 'n')
+
+	def related(self, relation, synsets):
+		return {target for synset in synsets for target in getattr(synset, relation)()}
+
+	def lemmaNames(self, synsets):
+		return [lemma for synset in synsets for lemma in synset.lemma_names()]
+
+	def similarity(self, synsets1, synsets2):
+		return _nmax(sim for sim in [_path_similarity(s1, s2) for (s1, s2) in product(synsets1, synsets2)])
+
+# Compiles the snapshot arrays from NLTK's reader.
+def _compileWordNetSnapshot():
+	reader = wn._resolve()
+	synsets = sorted(reader.all_synsets(), key=lambda s: s.name())
+	ids = {synset: i for i, synset in enumerate(synsets)}
+	names = [synset.name() for synset in synsets]
+
+	arrays = {'version': np.array([reader.get_version().encode('ascii')]),
+				 'root_rank': np.array([bisect_left(names, '*ROOT*')], dtype='<i8')}
+	arrays['names'], arrays['name_offsets'] = dictfile.StringTable.pack(names)
+	lemmas = [synset.lemma_names() for synset in synsets]
+	arrays['lemmas'], arrays['lemma_offsets'] = dictfile.StringTable.pack([lemma for names in lemmas for lemma in names])
+	arrays['synset_lemmas'] = _offsets(len(names) for names in lemmas)
+	for relation in _RELATIONS:
+		targets = [[ids[target] for target in getattr(synset, relation)()] for synset in synsets]
+		arrays[relation + '_offsets'] = _offsets(len(t) for t in targets)
+		arrays[relation] = np.array([target for t in targets for target in t], dtype='<i4')
+
+	# The shortest distance from each synset up to each of its (instance) hypernyms, found breadth first.
+	parents = [[ids[h] for h in synset.hypernyms() + synset.instance_hypernyms()] for synset in synsets]
+	ancestor_lists = []
+	for synset in range(len(synsets)):
+		path = {synset: 0}
+		level = [synset]
+		distance = 0
+		while level:
+			distance += 1
+			level = [parent for s in level for parent in parents[s] if parent not in path]
+			for parent in level:
+				path.setdefault(parent, distance)
+		ancestor_lists.append(sorted(path.items()))
+	arrays['ancestor_offsets'] = _offsets(len(a) for a in ancestor_lists)
+	arrays['ancestors'] = np.array([s for a in ancestor_lists for s, _ in a], dtype='<i4')
+	arrays['ancestor_distances'] = np.array([d for a in ancestor_lists for _, d in a], dtype='<i4')
+	arrays['min_depth'] = np.array([synset.min_depth() for synset in synsets], dtype='<i4')
+	arrays['max_depth'] = np.array([synset.max_depth() for synset in synsets], dtype='<i4')
+	arrays['needs_root'] = np.array([synset._needs_root() for synset in synsets], dtype=np.uint8)
+
+	# The lemma index, keyed by lemma name and part of speech (eg. 'dog.n'), and the morphological exceptions.
+	index = {'%s.%s' % (form, pos): [ids[reader.synset_from_pos_and_offset(pos, offset)] for offset in offsets]
+				for form, entries in reader._lemma_pos_offset_map.items() for pos, offsets in entries.items() if pos in _POS}
+	keys = sorted(index)
+	arrays['index_keys'], arrays['index_key_offsets'] = dictfile.StringTable.pack(keys)
+	arrays['index_offsets'] = _offsets(len(index[key]) for key in keys)
+	arrays['index_synsets'] = np.array([synset for key in keys for synset in index[key]], dtype='<i4')
+	arrays.update(dictfile.SortedMultiMap.pack({'%s.%s' % (form, pos): set(bases) for pos in _POS
+															  for form, bases in reader._exception_map[pos].items()}))
+	logger.info('Compiled WordNet snapshot: %i synsets, %i lemma index entries.' % (len(synsets), len(keys)))
+	return arrays
+
+# Returns a hash of the names, sizes and modification times of the WordNet data files the snapshot is built from.
+def _wordNetHash():
+	root = _findWordNet()
+	h = hashlib.sha1()
+	for filename in sorted(glob(os.path.join(root, '*'))) if os.path.isdir(root) else [root]:
+		st = os.stat(filename)
+		h.update(('%s:%i:%i\n' % (filename, st.st_size, st.st_mtime_ns)).encode('utf-8'))
+	return h.hexdigest()
+
+# For the entries of the given groups (in a group/entry offsets layout), returns the group each belongs to (as a
+#  position in the given list) and the entry's own position.
+def _groupEntries(offsets, groups):
+	starts, ends = offsets[groups], offsets[groups + 1]
+	sizes = ends - starts
+	rows = np.repeat(np.arange(len(groups)), sizes)
+	return rows, np.arange(len(rows)) + np.repeat(starts - (np.cumsum(sizes) - sizes), sizes)
+
+# Returns the cumulative offsets for groups of the given sizes.
+def _offsets(sizes):
+	offsets = [0]
+	offsets.extend(accumulate(sizes))
+	return np.array(offsets, dtype='<i8')
+
+dictfile.register('wordnet', 2, _compileWordNetSnapshot, _wordNetHash)
+
+
+###
+# Load a comprehensive word list on first use.
+###
+_WORDLIST_LOADED = False
+def _loadWordList():
+	try:
+		with open('dict/wordlist.dic', 'r') as wlist:
+			_setWordList([line.rstrip() for line in wlist.readlines()])
+	except FileNotFoundError:
+		logger.info('No pre-compiled word list present.. recompiling new one!')
+		recompileWordList()
+
+# Makes the wordlist available as module attributes (eg. wordnet.WORDLIST), loading it on first access.
+def __getattr__(name):
+	if name in ('WORDLIST', 'WORDLIST_SORTED'):
+		_loadWordList()
+		return globals()[name]
+	raise AttributeError('module %r has no attribute %r' % (__name__, name))
@@ -17,13 +17,15 @@ These modules generate list of solutions, and score each of them according to th
 # TODO: Implement Reversals, Containers, Deletions and Homophones.
 
 # Python libraries
-import pickle  # module for reading/writing python objects from/to files
-from itertools import chain, combinations, islice
-from bisect import bisect_left # function for performing binary search
+from itertools import accumulate, chain
+from bisect import bisect_left, bisect_right # functions for performing binary search
 import pdb  # live debugging module
+import numpy as np  # numerical module, used for the letter count matrix
 
 # Dictionary libraries
 import wordnet # custom wrapper around NLTK WordNet
+import trie # compact array-backed trie/automaton
+import dictfile # container for the precompiled dictionary structures
 
 # Other CCS modules
 import log  # module for giving runtime feedback to the user
@@ -37,25 +39,44 @@ class Wordplay(object):
 	"""
 	Abstract Wordplay subclass from which all other wordplay classes stem.
 	It focuses around the secretarial work of loading in keyword libraries and generating custom word lists.
+	Both of these are loaded lazily, the first time the 'dictionary' or 'keywords' attribute is accessed, so
+	 that wordplays which never get used never cost anything.
 	"""
 	hasCustomDict = False
+	dictVersion = 1 # bump whenever the layout of the compiled dictionary changes
 	usesKeywords = False
+	cost = 1 # rough time taken by a check (in ms), until the parser has learnt better; cheaper wordplays get tried first
 	__typ__ = None
-	keywords = set()
 
 	def __init__(self):
-		# Load custom formatted dictionary if one exists.
-		if self.hasCustomDict:
-			try:
-				self.dictionary = pickle.loads(open('dict/custom/%ss.dic' % self.__typ__, 'rb').read())
-			except FileNotFoundError:
-				logger.info('No pre-compiled %s dictionary present.. recompiling new one!' % self.__typ__)
-				self.recompileDictionary()
-			except UnicodeDecodeError:
-				logger.warn('Pre-compiled %s dictionary appears to be corrupted.. recompiling new one!' % self.__typ__)
-				self.recompileDictionary()
+		logger.debug('%s instance initialised.' % self.__class__.__name__)
+
+	def __getattr__(self, name):
+		# Only called for attributes that haven't been set yet, so each of these loads happens just once.
+		if name == 'dictionary' and self.hasCustomDict:
+			self.initDictionary()
+			return self.dictionary
+		if name == 'keywords':
+			self.initKeywords()
+			return self.keywords
+		raise AttributeError('\'%s\' object has no attribute \'%s\'' % (self.__class__.__name__, name))
+
+	def initDictionary(self):
+		""" Loads the custom formatted dictionary, recompiling it if necessary. """
 
-		# Load keyword list.
+		try:
+			self.loadDictionary()
+		except FileNotFoundError:
+			logger.info('No pre-compiled %s dictionary present.. recompiling new one!' % self.__typ__)
+			self.recompileDictionary()
+		except dictfile.StaleSectionError:
+			logger.info('Pre-compiled %s dictionary is missing or out of date.. recompiling new one!' % self.__typ__)
+			self.recompileDictionary()
+
+	def initKeywords(self):
+		""" Loads the keyword list. """
+
+		self.keywords = set()
 		if self.usesKeywords:
 			try:
 				self.keywords = {k.rstrip() for k in open('keywords/%ss.kwords' % self.__typ__, 'r').readlines()}
@@ -63,14 +84,50 @@ class Wordplay(object):
 				logger.error('Missing keywords list: \'keywords/%ss.kwords\'' % self.__typ__)
 				raise
 
-		logger.debug('%s instance initialised.' % self.__class__.__name__)
+	def preload(self):
+		""" Loads the dictionary and keywords straight away, rather than on first use. """
+
+		if self.hasCustomDict:
+			self.dictionary
+		self.keywords
 
-	def getCombinations(self,tokens):
+	def getCombinations(self, tokens, length=None, weigh=len, extend=None, start=''):
 		"""
-		Generate a list of plausible combinations of the available tokens.
+		Lazily generates the distinct combinations of the available tokens (keeping their order), as
+		 (combination, state) pairs.
+		If a length is given, only combinations whose weights (by default, their numbers of letters) add up to
+		 exactly that length are generated. The search is pruned as it goes, so combinations that overshoot the
+		 length, or can no longer reach it, aren't extended any further.
+		The state is built up along with each combination, one token at a time, by extend(state, token) starting
+		 from start. A combination therefore costs a single extend call on top of the combination it extends,
+		 rather than being built from scratch. If extend returns None, the combination is ruled out, along with
+		 every combination extending it.
 		"""
 
-		return list(set(chain(*map(lambda x: combinations(tokens, x), range(0, len(tokens)+1)))))
+		weights = [weigh(token) for token in tokens]
+		# The most weight that the tokens from each position onwards could still add.
+		remaining = list(accumulate(reversed(weights)))[::-1] + [0]
+		seen = set()
+
+		# Depth-first, with each stack entry holding a combination and the position of the next token to try adding.
+		stack = [(0, (), 0, start)]
+		while stack:
+			first, combo, weight, state = stack.pop()
+			for i in range(first, len(tokens)):
+				if length is not None and weight + remaining[i] < length:
+					break
+				total = weight + weights[i]
+				if length is not None and total > length:
+					continue
+				extended = extend(state, tokens[i]) if extend is not None else None
+				if extend is not None and extended is None:
+					continue
+				extended_combo = combo + (tokens[i],)
+				if (length is None or total == length) and extended_combo not in seen:
+					seen.add(extended_combo)
+					yield extended_combo, extended
+				if length is None or total < length:
+					stack.append((i + 1, extended_combo, total, extended))
 
 	def check(self, clue, tokens, **kwargs):
 		raise NotImplementedError  # subclass must implement this
@@ -78,43 +135,59 @@ class Wordplay(object):
 	def getPlay(self, **kwargs):
 		raise NotImplementedError  # subclass must implement this
 
-	def addToDictionary(self, word):
+	@classmethod
+	def compileDictionary(cls, wordlist=None):
+		raise NotImplementedError  # relevant subclasses must implement this (returning the dictionary's arrays)
+
+	@classmethod
+	def openDictionary(cls, arrays):
 		raise NotImplementedError  # relevant subclasses must implement this
 
-	def recompileDictionary(self, wordlist=wordnet.WORDLIST):
+	def loadDictionary(self):
+		self.dictionary = self.openDictionary(dictfile.load(self.__typ__))
+
+	def recompileDictionary(self, wordlist=None):
 		"""
-		Updates the Anagram and Run dictionaries from a given dict file.
-		See dictionaries in dict/ folder for an example of the required format.
-		The results are saved back to the dict/custom directory so that they
-		don't have to be recompiled at the start of each run.
+		Updates the Anagram and Run dictionaries from the wordlist (or a given list of words).
+		The results are saved to their section of the dictionary file in the dict/custom directory,
+		so that they don't have to be recompiled at the start of each run.
 		"""
 
-		self.dictionary = {}
-		# Add words to dictionary.
-		[self.addToDictionary(word) for word in wordlist]
-
-		# Write the results to a text file for pre-loading in the future.
-		with open('dict/custom/%ss.dic' % self.__typ__, 'wb+') as f:
-			pickle.dump(self.dictionary, f)
+		dictfile.store(self.__typ__, self.compileDictionary(wordlist))
+		self.loadDictionary()
 		logger.debug('Recompiled %s dictionary!' % self.__typ__)
 
 
 class AnagramWordplay(Wordplay):
 	"""
 	The anagram wordplay class. Generates and scores possible anagram wordplays.
+	Besides the groups of words sharing the same letters (for exact anagrams), its dictionary holds the letter
+	 counts of every word, as a matrix with a column per letter. This answers looser questions in a single
+	 vectorised pass, such as which words can be made from some of the given letters (see getPartialPlay).
 	"""
 
 	hasCustomDict = True
+	dictVersion = 3
 	usesKeywords = True
 	__typ__ = 'anagram'
 
-	def check(self, clue, token_sets, wordplays=None, **kwargs):
+	def check(self, clue, token_sets, wordplays=None, gui=None, **kwargs):
 		anagrams = []
 		# Combine all tokens that were on either side of the keyword.
 		tokens = [token for token_set in token_sets.values() for token in token_set]
+		# Any known letters have to be among the anagrammed ones.
+		known = _letterCounts((clue.known_letters or '').replace('?', ''))
 		for tv in [tokens]: #TODO: create token variations using abbreviations, initials and finals.
-			for combo in self.getCombinations(tv):
-				for soln in [s for s in self.getPlay(''.join(combo)) if clue.checkSolution(s)]:
+			# Each combination's key (its letters, sorted) is merged from its parent's key and the new token's letters,
+			#  which are sorted just once up front. Being two sorted runs, sorted() merges them in linear time (it's
+			#  quicker than heapq.merge, which does the same in pure Python).
+			token_keys = {token: ''.join(sorted(token)) for token in tv}
+			for combo, key in self.getCombinations(tv, clue.length, extend=lambda key, token: ''.join(sorted(key + token_keys[token]))):
+				if gui and gui.halt():
+					return anagrams
+				if known.any() and (_letterCounts(key) < known).any():
+					continue
+				for soln in [s for s in self.getAnagrams(key) if clue.checkSolution(s)]:
 					# TODO: Somehow append subplay to solution if one was used.
 					anagrams.append(WordplaySolution(soln, self.__typ__, combo, self.calcCertainty(len(combo),len(tokens))))
 			logger.debug('Anagram solutions found: %s' % anagrams)
@@ -135,14 +208,54 @@ class AnagramWordplay(Wordplay):
 		complexity of this problem to that of a simple lookup.
 		"""
 
+		return self.getAnagrams(''.join(sorted(string)))
+
+	def getAnagrams(self, key):
+		""" Returns the anagram group of the given key (ie. sorted letters). """
+
 		try:
-			return self.dictionary[''.join(sorted(string))]
+			return self.dictionary[key]
 		except KeyError:
 			return set()
 
-	def addToDictionary(self, word):
+	def getPartialPlay(self, letters, remove='', spare=0, extra=0, length=None):
+		"""
+		Returns the set of words that are anagrams of the given letters, once those in remove are taken out, and
+		 allowing for:
+			-up to spare of the letters to be left unused (None for any number, ie. every word that can be made
+			 from the letters)
+			-up to extra letters of the word's own to be added (None for any number)
+		If a length is given, only words of that length are considered.
+		For example, getPartialPlay('carthorse', remove='cart') finds anagrams of 'horse', and
+		 getPartialPlay('pots', extra=1, length=5) finds 'posts' and 'stoop' among others.
+		Non-letters in the given strings are ignored. If remove holds letters that aren't available, there's no anagram.
+		"""
+
+		counts = _letterCounts(letters).astype(np.int16) - _letterCounts(remove)
+		if (counts < 0).any():
+			return set()
+		return self.dictionary.match(counts, spare, extra, length)
+
+	@classmethod
+	def compileDictionary(cls, wordlist=None):
 		# Group words by common letters, sorted in alphabetical order.
-		self.dictionary.setdefault(''.join(sorted(word)), set()).add(word)
+		words = wordnet.WORDLIST if wordlist is None else wordlist
+		dictionary = {}
+		for word in words:
+			dictionary.setdefault(''.join(sorted(word)), set()).add(word)
+		arrays = dictfile.SortedMultiMap.pack(dictionary)
+
+		# Lay out the letter counts of single words, sorted by length so that each length is a contiguous block.
+		words = sorted((w for w in words if w.isalpha() and w.isascii()), key=lambda w: (len(w), w))
+		lengths = np.array([len(w) for w in words], dtype=np.int64)
+		arrays['count_words'], arrays['count_word_offsets'] = dictfile.StringTable.pack(words)
+		arrays['counts'] = np.array([_letterCounts(w) for w in words], dtype=np.uint8).reshape(len(words), 26)
+		arrays['length_offsets'] = np.searchsorted(lengths, np.arange((lengths.max() if len(words) else 0) + 2))
+		return arrays
+
+	@classmethod
+	def openDictionary(cls, arrays):
+		return _AnagramDictionary(arrays)
 
 
 class RunWordplay(Wordplay):
@@ -171,64 +284,48 @@ class RunWordplay(Wordplay):
 		# Max subtracted caps at 40%.
 		return max(0.4, (1.0 if num_tokens_used > 1 else 0.7) - max((num_tokens_available - num_tokens_used - 1), 0) * 0.08)
 
-	def findTokensUsed(self, start, end, tokens):
-		""" Determines which tokens the run passed through. """
-
-		tokenLengths = [len(t) for t in tokens]
-		i = 0
-		pos = 0
-		while i <= start:
-			i += tokenLengths[pos]
-			pos += 1
-		tokensUsed = [tokens[pos-1]]
-		while i < end:
-			i += tokenLengths[pos]
-			tokensUsed.append(tokens[pos])
-			pos += 1
-		return tokensUsed
+	def findTokensUsed(self, start, end, tokens, token_ends):
+		"""
+		Determines which tokens the run passed through.
+		token_ends holds the cumulative token lengths (ie. the offset just past each token in the joined string).
+		"""
+
+		return tokens[bisect_right(token_ends, start):bisect_left(token_ends, end) + 1]
 
 	def getPlay(self, tokens):
 		"""
 		Returns a list of all runs present in the given string.
-		Relies on a pre-made dictionary of runs, which reduces the time
-		complexity of this computation.
+		Relies on a pre-made Aho-Corasick automaton over the wordlist, which finds
+		every embedded word in a single pass over the string.
 		"""
 
 		string = ''.join(tokens)
-		runs = []
-		# For each possible starting point in string.
-		for i in range(len(string)):
-			# Traverse tree for valid words
-			pos = self.dictionary
-			for j in range(i, len(string)):
-				try:
-					pos = pos[string[j]]
-				except KeyError:
-					# No more valid words exist from hereon
-					break
-				if '~' in pos:
-					# Point up to and including current letter forms a word.
-					runs.append([string[i:j+1], self.findTokensUsed(i, j+1, tokens)])
-		return runs
+		token_ends = list(accumulate(len(t) for t in tokens))
+		return [[string[start:end], self.findTokensUsed(start, end, tokens, token_ends)]
+				  for start, end in self.dictionary.scan(string)]
+
+	@classmethod
+	def compileDictionary(cls, wordlist=None):
+		# Store words in an Aho-Corasick automaton, with a letter per node.
+		return trie.AhoCorasickAutomaton.build(wordnet.WORDLIST if wordlist is None else wordlist).toArrays()
 
-	def addToDictionary(self, word):
-		# Store words in a tree structure, with a letter per node.
-		pos = self.dictionary
-		for letter in word:
-			pos = pos.setdefault(letter, {})
-		pos['~'] = None  #store a word terminator
+	@classmethod
+	def openDictionary(cls, arrays):
+		return trie.AhoCorasickAutomaton.fromArrays(arrays)
 
 class DoubleDefinitionWordplay(Wordplay):
 	"""
 	The double definition wordplay class. Generates and scores possible double definitions wordplays.
 	"""
+	cost = 10
 	__typ__ = 'double definition'
 
 	def check(self, clue, tokens, synonym_search_depth=1, gui=None, **kwargs):
 		definitions = []
 		for combo in self.getContiguousCombinations(tokens):
 			second_definition = '_'.join(combo)
-			for soln in [s for s in wordnet.getSynonyms(second_definition, synonym_search_depth) if clue.checkSolution(s)]:
+			synonyms = wordnet.getSynonyms(second_definition, synonym_search_depth, halt=gui.halt if gui else None)
+			for soln in [s for s in synonyms if clue.checkSolution(s)]:
 				if gui and gui.halt():
 					return definitions
 				certainty = self.calcCertainty(len(combo),len(tokens)) * wordnet.calcSimilarity(second_definition, soln)
@@ -259,6 +356,7 @@ class CharadeWordplay(Wordplay):
 	This is by far the most complex class, and it consumes a huge portion of the total processing time.
 	"""
 
+	cost = 100
 	__typ__ = 'charade'
 	usesKeywords = False # Charades MAY use keywords, but don't have to, so we'll check for them internally.
 
@@ -275,6 +373,8 @@ class CharadeWordplay(Wordplay):
 		# TODO: Maybe there is a keyword here that we can use ('with', 'after', 'follwed by', etc)?
 		# Consider each possible way of breaking up the tokens into two sets.
 		for pos in range(1,num_tokens):
+			if gui and gui.halt():
+				break
 			left = tokens[:pos]
 			right = tokens[pos:]
 			play_solns = self.getPlay(left, right, clue.length, wordplays, gui)
@@ -321,12 +421,13 @@ class CharadeWordplay(Wordplay):
 		left, right = ('_'.join(left), '_'.join(right))
 		# Try synonyms too
 		if wordnet.exists(left):
-			possible_lefts.extend([(s, -1.0) for s in wordnet.getSynonyms(left) if len(s.split('_'))==1])
+			possible_lefts.extend([(s, -1.0) for s in wordnet.getSynonyms(left, halt=gui.halt if gui else None) if len(s.split('_'))==1])
 
 		for possible_left, lsim in possible_lefts:
-			for possible_right, rsim in [(pr, wordnet.calcSimilarity(pr, right))\
-					for pr in self.getPossibleRights(possible_left, length) if wordnet.exists(pr)] +\
-					[(pr, 1.0) for pr in possible_rights if wordnet.exists(possible_left + pr)]:
+			# Lazily, so that the halt flag gets polled between similarity calculations.
+			for possible_right, rsim in chain(((pr, wordnet.calcSimilarity(pr, right))
+					for pr in self.getPossibleRights(possible_left, length) if wordnet.exists(pr)),
+					((pr, 1.0) for pr in possible_rights if wordnet.exists(possible_left + pr))):
 				if gui and gui.halt():
 					return charades
 				if rsim > 0:
@@ -338,19 +439,10 @@ class CharadeWordplay(Wordplay):
 
 	def getPossibleRights(self, left, length=None):
 
-		# TODO: Find a solution to the really computation heavy requests of one- or two-letter lefts.
-
 		len_left = len(left)
-		# Traverse the RunWordplayDictionary
-		# Grab a slice of the sorted wordlist that starts from the word of interest
-		for w in islice(wordnet.WORDLIST_SORTED,bisect_left(wordnet.WORDLIST_SORTED, left), None):
-			# Output 'rights' of results until they no longer start with the desired 'left'.
-			if w[0:len_left]==left:
-				if length is not None and len(w) != length:
-					continue
-				yield w[len_left:].replace('_','')
-			else:
-				break
+		# Output the 'rights' of all words that start with the desired 'left'.
+		for w in wordnet.getWordsWithPrefix(left, length):
+			yield w[len_left:].replace('_','')
 
 class InitialWordplay(Wordplay):
 	"""
@@ -359,12 +451,15 @@ class InitialWordplay(Wordplay):
 	usesKeywords = True
 	__typ__ = 'initial'
 
-	def check(self, clue, token_sets, **kwargs):
+	def check(self, clue, token_sets, gui=None, **kwargs):
 		initials = []
 		tokens = [token for token_set in token_sets.values() for token in token_set]
-		for combo in self.getCombinations(tokens):
-			soln = self.getPlay(combo)
-			if wordnet.exists(soln) and clue.checkSolution(soln):
+		prefixes = wordnet.getPrefixTrie()
+		for combo, (soln, node) in self.getCombinations(tokens, clue.length, weigh=lambda token: 1, start=('', trie.ROOT),
+																		extend=lambda state, token: _extendLetters(clue, prefixes, state, token[0])):
+			if gui and gui.halt():
+				break
+			if prefixes.isWord(node) and clue.checkSolution(soln):
 				initials.append(WordplaySolution(soln, self.__typ__, combo, self.calcCertainty(len(combo),len(tokens))))
 		logger.debug('Initial solutions found: %s' % initials)
 		return initials
@@ -388,12 +483,15 @@ class FinalWordplay(Wordplay):
 	usesKeywords = True
 	__typ__ = 'final'
 
-	def check(self, clue, token_sets, **kwargs):
+	def check(self, clue, token_sets, gui=None, **kwargs):
 		finals = []
 		tokens = [token for token_set in token_sets.values() for token in token_set]
-		for combo in self.getCombinations(tokens):
-			soln = self.getPlay(combo)
-			if wordnet.exists(soln) and clue.checkSolution(soln):
+		prefixes = wordnet.getPrefixTrie()
+		for combo, (soln, node) in self.getCombinations(tokens, clue.length, weigh=lambda token: 1, start=('', trie.ROOT),
+																		extend=lambda state, token: _extendLetters(clue, prefixes, state, token[-1])):
+			if gui and gui.halt():
+				break
+			if prefixes.isWord(node) and clue.checkSolution(soln):
 				finals.append(WordplaySolution(soln, self.__typ__, combo, self.calcCertainty(len(combo),len(tokens))))
 		logger.debug('Final solutions found: %s' % finals)
 		return finals
@@ -408,3 +506,64 @@ class FinalWordplay(Wordplay):
 
 	def getPlay(self, tokens):
 		return ''.join([t[-1] for t in tokens])
+
+
+###
+# Some auxiliary functions.
+###
+
+# Appends a letter to those picked out so far by an initial/final wordplay, along with the node they lead to in the
+#  prefix trie, unless it contradicts the known letters or no word in the wordlist starts with the result.
+def _extendLetters(clue, prefixes, state, letter):
+	letters, node = state
+	if clue.known_letters and (len(letters) >= len(clue.known_letters) or clue.known_letters[len(letters)] not in ('?', letter)):
+		return None
+	node = prefixes.child(node, letter)
+	return (letters + letter, node) if node >= 0 else None
+
+# Returns the number of times each letter (a-z) occurs in the given string, as an array of 26 counts.
+def _letterCounts(string):
+	codes = np.frombuffer(string.lower().encode('ascii', errors='ignore'), dtype=np.uint8)
+	return np.bincount(codes[(codes >= ord('a')) & (codes <= ord('z'))] - ord('a'), minlength=26)
+
+# The anagram dictionary: exact anagram groups, plus the letter count matrix for partial anagrams.
+class _AnagramDictionary(object):
+	def __init__(self, arrays):
+		self.groups = dictfile.SortedMultiMap(arrays)
+		self.words = dictfile.StringTable(arrays['count_words'], arrays['count_word_offsets'])
+		self.counts = arrays['counts']  # one row per word, one column per letter
+		self.length_offsets = arrays['length_offsets']  # rows of words of length l are [l], ..., [l+1] - 1
+
+	def __getitem__(self, key):
+		return self.groups[key]
+
+	def __len__(self):
+		return len(self.groups)
+
+	def match(self, counts, spare, extra, length):
+		""" Returns the words whose letter counts differ from the given ones within the spare/extra allowances. """
+
+		if length is None:
+			start, end = 0, len(self.words)
+		elif 0 <= length < len(self.length_offsets) - 1:
+			start, end = self.length_offsets[length], self.length_offsets[length + 1]
+		else:
+			return set()
+		rows = self.counts[start:end]
+		if extra == 0 and spare is None:
+			# All words formable from the letters; the common case, which needs no signed arithmetic.
+			mask = (rows <= counts).all(axis=1)
+		elif extra == 0 and spare == 0:
+			mask = (rows == counts).all(axis=1)
+		else:
+			diff = rows.astype(np.int16) - counts
+			mask = np.ones(len(rows), dtype=bool)
+			if extra is not None:
+				mask &= np.clip(diff, 0, None).sum(axis=1) <= extra
+			if spare is not None:
+				mask &= np.clip(-diff, 0, None).sum(axis=1) <= spare
+		return {self.words[start + i] for i in np.flatnonzero(mask)}
+
+
+# Register the compiled wordplay dictionaries as sections of the dictionary file.
+[dictfile.register(wp.__typ__, wp.dictVersion, wp.compileDictionary) for wp in Wordplay.__subclasses__() if wp.hasCustomDict]